@@ -1,7 +1,17 @@
+import os
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from etl import load_dati_comunali, load_provincia_belluno, load_stl_data
+from etl import load_dati_comunali, load_area, catalogo_aree, file_comunali, _resolve_path
+from dmo.cube import cubo_per_versione
+from dmo.confronto import ConfrontoAnni, aggiungi_variazioni
+from dmo.periodi import indice_per_cubo, etichetta_periodo
+from dmo.filtri import indice_filtri
+from dmo.tracing import Traccia, sezione, pannello_performance
+from dmo.registry import REGISTRO
+from dmo.sorgenti import id_versione
+from dmo.risultati import RISULTATI
+from dmo.artefatti import da_artefatti
 
 # ======================
 # ⚙️ CONFIGURAZIONE BASE
@@ -9,6 +19,34 @@ from etl import load_dati_comunali, load_provincia_belluno, load_stl_data
 st.set_page_config(page_title="Dashboard Turismo Veneto", layout="wide")
 st.title("📊 Dashboard Turismo Veneto")
 
+# ======================
+# 🔥 DATASET CONDIVISI (riscaldamento all'avvio)
+# ======================
+# Dataset condivisi da tutte le sessioni (una sola copia in sola lettura). Ogni dataset è letto dalla versione
+# pubblicata dei file sorgente e viene ricaricato solo quando cambia il loro contenuto (identificativo di versione).
+# Province e STL: un dataset per area, letto dalle sole partizioni (file annuali) di quell'area.
+# Se `python -m dmo build` ha precalcolato un dataset dagli stessi file, viene letto dagli artefatti.
+REGISTRO.registra("comuni", lambda: da_artefatti(
+                      "comuni", file_comunali("dati-mensili-per-comune"),
+                      lambda: load_dati_comunali("dati-mensili-per-comune", incremental=True, compact=True)),
+                  firma=lambda: id_versione(_resolve_path("dati-mensili-per-comune"), "comunali"))
+# Elenco delle aree dall'ultima versione pubblicata (solo lettura del puntatore): a pubblicare le nuove
+# versioni sono i loader e il thread che controlla le firme, non i rerun
+catalogo = catalogo_aree(aggiorna=False)
+for ambito in ("provincia", "stl"):
+    for area in catalogo.aree(ambito):
+        REGISTRO.registra(f"{ambito}:{area}", lambda ambito=ambito, area=area: da_artefatti(
+                              f"{ambito}-{area}", [p.path for p in catalogo_aree().seleziona(ambito, [area])],
+                              lambda: load_area(ambito, area)),
+                          firma=lambda ambito=ambito, area=area: catalogo_aree().firma(ambito, [area]))
+# Riscaldamento: alla prima esecuzione dello script nel processo, prima del controllo della password, tutti
+# i dataset registrati (anche province e STL, che altrimenti sarebbero caricati alla prima richiesta) partono
+# in parallelo in background. Mentre il primo utente inserisce la password i dati sono già in caricamento:
+# nessuno attende la somma dei tempi di parsing. Poi un thread controlla le cartelle sorgente e ricarica in background i dataset modificati:
+# i rerun servono sempre la versione già in memoria.
+REGISTRO.riscalda()
+REGISTRO.osserva()
+
 # ======================
 # 🔐 ACCESSO
 # ======================
@@ -19,24 +57,38 @@ if password != "dolomiti":
     st.stop()
 st.success("✅ Accesso consentito")
 
+# Tempi delle sezioni di questo rerun (pannello "Performance" in fondo alla sidebar)
+traccia = Traccia("comuni")
+
 # ======================
 # 📥 CARICAMENTO DATI
 # ======================
 st.sidebar.header("⚙️ Filtri principali – Dati Comunali")
 
-data = load_dati_comunali("dati-mensili-per-comune")
-provincia = load_provincia_belluno("dati-provincia-annuali")
-stl_dolomiti, stl_belluno = load_stl_data("stl-presenze-arrivi")
+traccia.fase("📥 Caricamento dati")
+data = REGISTRO.get("comuni")
+
+
+def mostra_errori(*frames):
+    for df_caricato in frames:
+        for errore in df_caricato.attrs.get("errori", []):
+            st.warning(f"⚠️ File non caricato: {os.path.basename(errore['file'])} – {errore['errore']}")
+
+
+mostra_errori(data)
 
 if data.empty:
     st.error("❌ Nessun dato comunale caricato.")
+    traccia.chiudi()
     st.stop()
 else:
     st.success(f"✅ Dati comunali caricati: {len(data):,} righe, {data['anno'].nunique()} anni, {data['comune'].nunique()} comuni.")
+    st.caption(f"Versione dati: {data.attrs.get('versione', 'n/d')}")
 
 # ======================
 # FILTRI COMUNALI
 # ======================
+traccia.fase("🔎 Filtri comunali")
 anni = sorted(data["anno"].unique())
 comuni = sorted(data["comune"].unique())
 mesi = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
@@ -45,59 +97,48 @@ anno_sel = st.sidebar.multiselect("Anno (Comuni)", anni, default=anni)
 comune_sel = st.sidebar.multiselect("Comune", comuni, default=[comuni[0]])
 mesi_sel = st.sidebar.multiselect("Mese", mesi, default=mesi)
 
-df_filtered = data[(data["anno"].isin(anno_sel)) & (data["comune"].isin(comune_sel)) & (data["mese"].isin(mesi_sel))]
+# Cubo pre-aggregato anno × mese × comune: i filtri leggono solo le celle selezionate
+with sezione("cubo"):
+    cubo = cubo_per_versione(data)
+    # Somme cumulate sulla linea del tempo mensile: totali di qualunque periodo con due letture
+    periodi = indice_per_cubo(cubo)
+with sezione("selezione"):
+    df_filtered = cubo.serie(comune_sel, anno_sel, mesi_sel)
 
 # ======================
 # 📈 INDICATORI COMUNALI
 # ======================
+traccia.fase("📈 Indicatori comunali")
 st.header("📈 Analisi Presenze – Comuni")
 if df_filtered.empty:
     st.warning("Nessun dato disponibile per i filtri selezionati.")
 else:
+    # Variazione complessiva di tutti i comuni selezionati in una sola passata:
+    # per ogni comune contano solo i mesi con valore > 0 nell'anno più recente
+    confronto = ConfrontoAnni.da_cubo(cubo, comune_sel, anno_sel, mesi_sel) if len(anno_sel) == 2 else None
+
     for comune in comune_sel:
         st.subheader(f"🏙️ {comune}")
         cols = st.columns(len(anno_sel))
         for i, anno in enumerate(anno_sel):
-            tot_pres = int(
-                df_filtered[(df_filtered["anno"] == anno) & (df_filtered["comune"] == comune)]["presenze"].sum()
-            )
+            tot_pres = periodi.totale_mesi(comune, anno, mesi_sel)
             cols[i].metric(f"Presenze {anno}", f"{tot_pres:,}".replace(",", "."))
 
         # ======================
         # 📊 VARIAZIONE % COMPLESSIVA (solo se sono selezionati 2 anni)
         # ======================
-        if len(anno_sel) == 2:
+        if confronto is not None:
             anno_prev, anno_recent = sorted(anno_sel)
 
-            # dati solo di questo comune
-            df_com = df_filtered[df_filtered["comune"] == comune].copy()
-
             # mesi con valore >0 nell'anno più recente → mesi realmente alimentati
-            recent_months = (
-                df_com[df_com["anno"] == anno_recent][["mese", "presenze"]]
-                .dropna(subset=["presenze"])
-            )
-            recent_months = recent_months[recent_months["presenze"] > 0]["mese"].unique().tolist()
-
-            # Ordine dei mesi
-            mesi_ordine = ["Gen","Feb","Mar","Apr","Mag","Giu","Lug","Ago","Set","Ott","Nov","Dic"]
-            mesi_disponibili = [m for m in mesi_ordine if m in recent_months]
+            mesi_disponibili = confronto.mesi_allineati(comune) if comune in confronto.entita else []
 
             if not mesi_disponibili:
                 st.warning(
                     f"Impossibile calcolare la variazione per {comune}: nessun mese con valore > 0 nel {anno_recent}."
                 )
             else:
-                mask_prev = (df_com["anno"] == anno_prev) & (df_com["mese"].isin(mesi_disponibili))
-                mask_recent = (df_com["anno"] == anno_recent) & (df_com["mese"].isin(mesi_disponibili))
-
-                prev_val = df_com.loc[mask_prev, "presenze"].sum()
-                recent_val = df_com.loc[mask_recent, "presenze"].sum()
-
-                if prev_val and prev_val != 0:
-                    var_pct = (recent_val - prev_val) / prev_val * 100
-                else:
-                    var_pct = float("nan")
+                var_pct = confronto.variazione(anno_prev, anno_recent)[comune]
 
                 color = (
                     "green" if not pd.isna(var_pct) and var_pct > 0
@@ -123,28 +164,25 @@ else:
 # ======================
 # 📈 ANDAMENTO MENSILE (COMUNI)
 # ======================
+traccia.fase("📈 Andamento mensile (Comuni)")
 if not df_filtered.empty:
     st.subheader("📈 Andamento mensile Presenze (Comuni)")
-    fig = px.line(df_filtered, x="mese", y="presenze", color="anno", markers=True, facet_row="comune")
-    fig.update_layout(xaxis=dict(categoryorder="array", categoryarray=mesi))
-    st.plotly_chart(fig, use_container_width=True)
+    with sezione("figura Plotly"):
+        fig = px.line(df_filtered, x="mese", y="presenze", color="anno", markers=True, facet_row="comune")
+        fig.update_layout(xaxis=dict(categoryorder="array", categoryarray=mesi))
+    with sezione("render"):
+        st.plotly_chart(fig, use_container_width=True)
 
 # ======================
 # 📋 TABELLA CONFRONTO TRA ANNI E MESI – COMUNI
 # ======================
+traccia.fase("📋 Tabella confronto (Comuni)")
 st.subheader("📊 Confronto tra anni e mesi – Differenze e variazioni Presenze (Comuni)")
 
 if not df_filtered.empty:
-    tabella_com = (
-        df_filtered.groupby(["anno", "mese"])["presenze"]
-        .sum()
-        .reset_index()
-        .pivot_table(index="mese", columns="anno", values="presenze", fill_value=0)
-    )
-
-    # Ordina mesi
-    mesi_ordine = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
-    tabella_com = tabella_com.reindex(mesi_ordine)
+    # Tabella mese × anno letta dal cubo (mesi già in ordine cronologico)
+    with sezione("pivot"):
+        tabella_com = cubo.tabella_mesi(comune_sel, anno_sel, mesi_sel)
 
     # Aggiungi riga Totale
     totale = pd.DataFrame(tabella_com.sum()).T
@@ -156,8 +194,7 @@ if not df_filtered.empty:
         anni_sorted = sorted(anno_sel)
         anno_prev, anno_recent = anni_sorted
 
-        tabella_com["Differenza"] = tabella_com[anno_recent] - tabella_com[anno_prev]
-        tabella_com["Variazione %"] = (tabella_com["Differenza"] / tabella_com[anno_prev].replace(0, pd.NA)) * 100
+        aggiungi_variazioni(tabella_com, anno_prev, anno_recent)
 
         st.markdown(
             f"**Confronto tra {anno_recent} e {anno_prev}:** differenze e variazioni calcolate come *{anno_recent} − {anno_prev}*."
@@ -180,32 +217,89 @@ if not df_filtered.empty:
             else:
                 fmt[col] = "{:,.0f}".format
 
-        styled = (
-            tabella_com.style.format(fmt, thousands=".")
-            .applymap(color_var, subset=["Variazione %"])
-        )
+        with sezione("Styler"):
+            styled = (
+                tabella_com.style.format(fmt, thousands=".", na_rep="N/A")
+                .applymap(color_var, subset=["Variazione %"])
+            )
 
-        st.dataframe(styled, use_container_width=True)
+            st.dataframe(styled, use_container_width=True)
     else:
         fmt = {col: "{:,.0f}".format for col in tabella_com.columns if tabella_com[col].dtype != "O"}
-        st.dataframe(tabella_com.style.format(fmt, thousands="."), use_container_width=True)
+        with sezione("Styler"):
+            st.dataframe(tabella_com.style.format(fmt, thousands="."), use_container_width=True)
 else:
     st.info("Nessun dato disponibile per creare la tabella di confronto.")
 
 # ======================
-# 🏔️ PROVINCIA DI BELLUNO
+# 📅 CONFRONTO PER PERIODO (COMUNI)
 # ======================
+traccia.fase("📅 Confronto per periodo (Comuni)")
+if comune_sel and anno_sel:
+    st.subheader("📅 Confronto per periodo – Presenze (Comuni)")
+    st.caption("Se il mese iniziale segue quello finale il periodo scavalca l'anno (es. Dic–Mar = stagione invernale).")
+
+    # Di default: da inizio anno all'ultimo mese con dati dell'anno più recente selezionato
+    ultimo_mese = periodi.ultimo_mese(comune_sel, max(anno_sel)) or mesi[-1]
+    col_da, col_a = st.columns(2)
+    mese_da = col_da.selectbox("Dal mese", mesi, index=0)
+    mese_a = col_a.selectbox("Al mese", mesi, index=mesi.index(ultimo_mese))
+
+    with sezione("periodi"):
+        tabella_per = periodi.totali_periodo(comune_sel, mese_da, mese_a, anno_sel)
+        tabella_per.loc["Totale"] = tabella_per.sum(min_count=1)
+        tabella_per.columns = [etichetta_periodo(a, mese_da, mese_a) for a in tabella_per.columns]
+
+    fmt = {col: "{:,.0f}".format for col in tabella_per.columns}
+    if len(tabella_per.columns) >= 2:
+        periodo_prev, periodo_recent = tabella_per.columns[-2:]
+        aggiungi_variazioni(tabella_per, periodo_prev, periodo_recent)
+        fmt["Differenza"] = "{:,.0f}".format
+        fmt["Variazione %"] = "{:.2f}%"
+        st.markdown(
+            f"**{mese_da}–{mese_a} {periodo_recent} vs {periodo_prev}:** differenze e variazioni calcolate come "
+            f"*{periodo_recent} − {periodo_prev}*."
+        )
+
+    def color_var(val):
+        if pd.isna(val):
+            return "color: grey;"
+        elif val > 0:
+            return "color: green; font-weight: bold;"
+        elif val < 0:
+            return "color: red; font-weight: bold;"
+        else:
+            return "color: grey;"
+
+    with sezione("Styler"):
+        styled = tabella_per.style.format(fmt, thousands=".", na_rep="N/A")
+        if "Variazione %" in tabella_per.columns:
+            styled = styled.applymap(color_var, subset=["Variazione %"])
+        st.dataframe(styled, use_container_width=True)
+
+# ======================
+# 🏔️ PROVINCIA
+# ======================
+traccia.fase("🏔️ Provincia")
 st.sidebar.markdown("---")
-if st.sidebar.checkbox("📍 Mostra dati Provincia di Belluno"):
+aree_prov = catalogo.aree("provincia")
+if aree_prov and st.sidebar.checkbox("📍 Mostra dati Provincia"):
+    area_prov = st.sidebar.selectbox(
+        "Seleziona provincia", aree_prov, format_func=str.title,
+        index=aree_prov.index("belluno") if "belluno" in aree_prov else 0,
+    )
+    nome_prov = area_prov.title()
+    provincia = REGISTRO.get(f"provincia:{area_prov}")
+    mostra_errori(provincia)
     if not provincia.empty:
-        st.header("🏔️ Provincia di Belluno – Arrivi e Presenze mensili")
+        st.header(f"🏔️ Provincia di {nome_prov} – Arrivi e Presenze mensili")
 
         # Filtri anni
         anni_prov = sorted(provincia["anno"].unique())
         anni_sel_prov = st.sidebar.multiselect("Anno (Provincia)", anni_prov, default=[anni_prov[-1]])
 
         # Filtra dati e rimuovi righe "Totale"
-        prov_filtrata = provincia[provincia["anno"].isin(anni_sel_prov)].copy()
+        prov_filtrata = indice_filtri(provincia, ["anno"]).filtra(anno=anni_sel_prov)
         prov_filtrata["mese"] = prov_filtrata["mese"].astype(str).str.strip()
         prov_filtrata = prov_filtrata[~prov_filtrata["mese"].str.lower().str.contains(r"^tot")]
 
@@ -217,7 +311,7 @@ if st.sidebar.checkbox("📍 Mostra dati Provincia di Belluno"):
         # ======================
         # 📈 INDICATORI PRINCIPALI
         # ======================
-        st.subheader("📈 Indicatori Provincia di Belluno")
+        st.subheader(f"📈 Indicatori Provincia di {nome_prov}")
         cols = st.columns(len(anni_sel_prov))
         for i, anno in enumerate(anni_sel_prov):
             dati_anno = prov_filtrata[prov_filtrata["anno"] == anno]
@@ -246,18 +340,19 @@ if st.sidebar.checkbox("📍 Mostra dati Provincia di Belluno"):
         st.plotly_chart(fig_pre, use_container_width=True)
 
         # ======================
-        # 📋 TABELLA CONFRONTO TRA ANNI E MESI (Provincia di Belluno)
+        # 📋 TABELLA CONFRONTO TRA ANNI E MESI (Provincia)
         # ======================
         st.subheader("📊 Confronto tra anni e mesi – Differenze e variazioni (Provincia)")
 
-        tab_prov = (
-            prov_filtrata.groupby(["anno", "mese"])[["arrivi", "presenze"]]
-            .sum()
-            .reset_index()
-        )
+        with sezione("pivot"):
+            tab_prov = (
+                prov_filtrata.groupby(["anno", "mese"])[["arrivi", "presenze"]]
+                .sum()
+                .reset_index()
+            )
 
-        # Pivot per tabella comparativa
-        tabella_prov = tab_prov.pivot_table(index="mese", columns="anno", values=["arrivi", "presenze"], fill_value=0)
+            # Pivot per tabella comparativa
+            tabella_prov = tab_prov.pivot_table(index="mese", columns="anno", values=["arrivi", "presenze"], fill_value=0)
 
         # Aggiungi riga Totale
         totale = pd.DataFrame(tabella_prov.sum()).T
@@ -268,11 +363,8 @@ if st.sidebar.checkbox("📍 Mostra dati Provincia di Belluno"):
         if len(anni_sel_prov) == 2:
             anno_prev, anno_recent = sorted(anni_sel_prov)
             for met in ["arrivi", "presenze"]:
-                tabella_prov[(met, "Differenza")] = tabella_prov[(met, anno_recent)] - tabella_prov[(met, anno_prev)]
-                tabella_prov[(met, "Variazione %")] = (
-                    (tabella_prov[(met, "Differenza")] /
-                     tabella_prov[(met, anno_prev)].replace(0, pd.NA)) * 100
-                )
+                aggiungi_variazioni(tabella_prov, (met, anno_prev), (met, anno_recent),
+                                    col_diff=(met, "Differenza"), col_var=(met, "Variazione %"))
 
             st.markdown(
                 f"**Confronto tra {anno_recent} e {anno_prev}:** differenze e variazioni calcolate come *{anno_recent} − {anno_prev}*."
@@ -296,23 +388,32 @@ if st.sidebar.checkbox("📍 Mostra dati Provincia di Belluno"):
                 else:
                     fmt[col] = "{:,.0f}".format
 
-            styled = (
-                tabella_prov.style.format(fmt, thousands=".")
-                .applymap(color_var, subset=[c for c in tabella_prov.columns if c[1] == "Variazione %"])
-            )
-            st.dataframe(styled, use_container_width=True)
+            with sezione("Styler"):
+                styled = (
+                    tabella_prov.style.format(fmt, thousands=".", na_rep="N/A")
+                    .applymap(color_var, subset=[c for c in tabella_prov.columns if c[1] == "Variazione %"])
+                )
+                st.dataframe(styled, use_container_width=True)
         else:
             fmt = {col: "{:,.0f}".format for col in tabella_prov.columns}
-            st.dataframe(tabella_prov.style.format(fmt, thousands="."), use_container_width=True)
+            with sezione("Styler"):
+                st.dataframe(tabella_prov.style.format(fmt, thousands="."), use_container_width=True)
 
 # ======================
 # 🏞️ STL
 # ======================
+traccia.fase("🏞️ STL")
 st.sidebar.markdown("---")
-if st.sidebar.checkbox("📍 Mostra dati STL"):
+aree_stl = catalogo.aree("stl")
+if aree_stl and st.sidebar.checkbox("📍 Mostra dati STL"):
     st.sidebar.header("⚙️ Filtri – STL")
-    tipo = st.sidebar.selectbox("Seleziona STL", ["Dolomiti", "Belluno"])
-    stl_data = stl_dolomiti if tipo == "Dolomiti" else stl_belluno
+    area_stl = st.sidebar.selectbox(
+        "Seleziona STL", aree_stl, format_func=str.title,
+        index=aree_stl.index("dolomiti") if "dolomiti" in aree_stl else 0,
+    )
+    tipo = area_stl.title()
+    stl_data = REGISTRO.get(f"stl:{area_stl}")
+    mostra_errori(stl_data)
 
     if not stl_data.empty:
         st.header(f"🌄 STL {tipo} – Arrivi e Presenze mensili")
@@ -322,7 +423,7 @@ if st.sidebar.checkbox("📍 Mostra dati STL"):
         sel_metrica = st.sidebar.radio("Seleziona metrica", ("Presenze", "Arrivi"))
 
         # Pulizia e ordinamento dati
-        stl_filtrata = stl_data[stl_data["anno"].isin(anni_sel_stl)].copy()
+        stl_filtrata = indice_filtri(stl_data, ["anno"]).filtra(anno=anni_sel_stl)
         stl_filtrata["mese"] = stl_filtrata["mese"].astype(str).str.strip()
         stl_filtrata = stl_filtrata[~stl_filtrata["mese"].str.lower().str.contains(r"^tot")]
 
@@ -347,34 +448,16 @@ if st.sidebar.checkbox("📍 Mostra dati STL"):
             # metrica selezionata (arrivi o presenze)
             metr = sel_metrica.lower()
 
-            # Prendi i mesi dell'anno recente che hanno valore > 0 (cioè mesi con dati reali)
-            recent_months = (
-                stl_filtrata.loc[stl_filtrata["anno"] == anno_recent, ["mese", metr]]
-                .dropna(subset=[metr])
-            )
-
-            # considera solo mesi con valore strettamente positivo
-            recent_months = recent_months[recent_months[metr] > 0]["mese"].unique().tolist()
-
-            # Ordine naturale dei mesi
-            mesi_ordine = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
-            mesi_disponibili = [m for m in mesi_ordine if m in recent_months]
+            # Mesi dell'anno recente con valore > 0 (cioè mesi con dati reali) e totali dei due anni su quei mesi
+            confronto = ConfrontoAnni.da_frame(stl_filtrata, "anno", "mese", metr, mesi=mesi_validi,
+                                               anni=[anno_prev, anno_recent])
+            mesi_disponibili = confronto.mesi_allineati()
 
             if not mesi_disponibili:
                 st.warning(f"Impossibile calcolare la variazione: non ci sono mesi con dati (>0) per l'anno {anno_recent}.")
             else:
-                # Filtra entrambi gli anni solo sui mesi disponibili (con dati) del recent year
-                mask_prev = (stl_filtrata["anno"] == anno_prev) & (stl_filtrata["mese"].isin(mesi_disponibili))
-                mask_recent = (stl_filtrata["anno"] == anno_recent) & (stl_filtrata["mese"].isin(mesi_disponibili))
-
-                prev_val = stl_filtrata.loc[mask_prev, metr].sum()
-                recent_val = stl_filtrata.loc[mask_recent, metr].sum()
-
-                # calcolo variazione protetto da divisione per zero
-                if prev_val and prev_val != 0:
-                    var_pct = ((recent_val - prev_val) / prev_val) * 100
-                else:
-                    var_pct = float("nan")
+                # variazione sui soli mesi disponibili, NaN se l'anno precedente è a zero
+                var_pct = confronto.variazione(anno_prev, anno_recent).iloc[0]
 
                 # colore
                 color = "green" if (not pd.isna(var_pct) and var_pct > 0) else ("red" if (not pd.isna(var_pct) and var_pct < 0) else "grey")
@@ -407,12 +490,13 @@ if st.sidebar.checkbox("📍 Mostra dati STL"):
         # ======================
         st.subheader(f"📊 Confronto tra anni e mesi – Differenze e variazioni {sel_metrica}")
 
-        tabella_stl = (
-            stl_filtrata.groupby(["anno", "mese"])[sel_metrica.lower()]
-            .sum()
-            .reset_index()
-            .pivot_table(index="mese", columns="anno", values=sel_metrica.lower(), fill_value=0)
-        )
+        with sezione("pivot"):
+            tabella_stl = (
+                stl_filtrata.groupby(["anno", "mese"])[sel_metrica.lower()]
+                .sum()
+                .reset_index()
+                .pivot_table(index="mese", columns="anno", values=sel_metrica.lower(), fill_value=0)
+            )
 
         tabella_stl = tabella_stl.reindex(mesi_validi)
 
@@ -424,8 +508,7 @@ if st.sidebar.checkbox("📍 Mostra dati STL"):
         # Se due anni selezionati → differenze e % variazioni
         if len(anni_sel_stl) == 2:
             anno_prev, anno_recent = sorted(anni_sel_stl)
-            tabella_stl["Differenza"] = tabella_stl[anno_recent] - tabella_stl[anno_prev]
-            tabella_stl["Variazione %"] = (tabella_stl["Differenza"] / tabella_stl[anno_prev].replace(0, pd.NA)) * 100
+            aggiungi_variazioni(tabella_stl, anno_prev, anno_recent)
 
             def color_var(val):
                 if pd.isna(val):
@@ -441,19 +524,26 @@ if st.sidebar.checkbox("📍 Mostra dati STL"):
             fmt["Variazione %"] = "{:.2f}%"
 
             styled = (
-                tabella_stl.style.format(fmt, thousands=".")
+                tabella_stl.style.format(fmt, thousands=".", na_rep="N/A")
                 .applymap(color_var, subset=["Variazione %"])
             )
 
             st.markdown(
                 f"**Confronto tra {anno_recent} e {anno_prev}:** differenze e variazioni calcolate come *{anno_recent} − {anno_prev}*."
             )
-            st.dataframe(styled, use_container_width=True)
+            with sezione("Styler"):
+                st.dataframe(styled, use_container_width=True)
         else:
             fmt = {col: "{:,.0f}".format for col in tabella_stl.columns if tabella_stl[col].dtype != "O"}
-            st.dataframe(tabella_stl.style.format(fmt, thousands="."), use_container_width=True)
+            with sezione("Styler"):
+                st.dataframe(tabella_stl.style.format(fmt, thousands="."), use_container_width=True)
 
 # ======================
 # 🧾 FOOTER
 # ======================
 st.caption("© 2025 Dashboard Fondazione D.M.O. Dolomiti Bellunesi – Uso interno")
+
+# ======================
+# ⏱️ PERFORMANCE
+# ======================
+pannello_performance(st, traccia, registro=REGISTRO, risultati=RISULTATI)
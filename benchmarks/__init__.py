@@ -0,0 +1,5 @@
+"""
+Benchmark dei loader e delle analisi su dati sintetici scalabili.
+
+    python -m benchmarks.run --comuni 500 --anni 10 --paesi 120
+"""
@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+
+MESI_BREVI = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
+MESI_ESTESI = [
+    "Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio", "Giugno",
+    "Luglio", "Agosto", "Settembre", "Ottobre", "Novembre", "Dicembre"
+]
+
+# Profilo stagionale tipico delle Dolomiti: picco invernale e picco estivo
+_PROFILO = np.array([1.3, 1.5, 1.0, 0.3, 0.2, 0.6, 1.6, 2.0, 0.8, 0.2, 0.2, 1.0])
+
+# Intestazioni esatte dei file ISTAT/Regione Veneto
+_HEADER_COMUNI = ["progressivo", "anno", "provenienza", "Comuni"] + [f"{m} Presenze" for m in MESI_BREVI] \
+    + ["Totale presenze"]
+_HEADER_AREE = ["progressivo", "anno", "ambito territoriale", "dettaglio", "Mese", "Arrivi italiani",
+                "Arrivi stranieri", "Presenze italiani", "Presenze stranieri", "Totale arrivi", "Totale presenze"]
+
+
+def _scrivi(path, righe):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("\r\n".join(righe) + "\r\n")
+
+
+def _serie(rng, n, anni, scala):
+    """
+    Presenze mensili [n, anni, 12]: scala per entità × profilo stagionale × trend × rumore.
+    """
+    base = rng.lognormal(np.log(scala), 1.0, size=(n, 1, 1))
+    forma = _PROFILO[None, None, :] * rng.uniform(0.6, 1.4, size=(n, 1, 12))
+    trend = (1 + rng.normal(0.03, 0.05, size=(n, 1, 1))) ** np.arange(anni)[None, :, None]
+    rumore = rng.lognormal(0.0, 0.15, size=(n, anni, 12))
+    return np.rint(base * forma * trend * rumore).astype(np.int64)
+
+
+# =========================
+# 🏭 Generatori per formato
+# =========================
+def genera_comuni(dest, n_comuni, anni, rng):
+    """
+    File `turismo-per-mese-comune-<anno>-presenze.txt` nel formato largo dei Comuni.
+    """
+    valori = _serie(rng, n_comuni, len(anni), 5000)
+    for a, anno in enumerate(anni):
+        righe = [";".join(_HEADER_COMUNI)]
+        for c in range(n_comuni):
+            mensili = valori[c, a]
+            righe.append(";".join(
+                [str(c + 1), str(anno), "Italiani + stranieri", f"{25001 + c} - Comune {c + 1}"]
+                + [str(v) for v in mensili] + [str(mensili.sum())]
+            ))
+        _scrivi(os.path.join(dest, f"turismo-per-mese-comune-{anno}-presenze.txt"), righe)
+
+
+def genera_paesi(dest, n_paesi, anni, rng, prefix="presenze-dolomiti-estero", quota_vuoti=0.05):
+    """
+    File `<prefix>-<anno>.txt`: riga iniziale di soli separatori, intestazione "<Paese> Paese"
+    alla seconda riga, righe "01Gennaio", … e celle vuote per i valori assenti.
+    """
+    valori = _serie(rng, n_paesi, len(anni), 800)
+    vuoti = rng.random(valori.shape) < quota_vuoti
+    paesi = [f"Paese {p + 1:03d}" for p in range(n_paesi)]
+    for a, anno in enumerate(anni):
+        colonne = paesi + ["Totale stranieri"]
+        righe = [";" * len(colonne), ";" + ";".join(f"{p} Paese" for p in colonne)]
+        for m, mese in enumerate(MESI_ESTESI):
+            celle = ["" if vuoti[p, a, m] else str(valori[p, a, m]) for p in range(n_paesi)]
+            totale = int(np.where(vuoti[:, a, m], 0, valori[:, a, m]).sum())
+            righe.append(f"{m + 1:02d}{mese};" + ";".join(celle) + f";{totale}")
+        _scrivi(os.path.join(dest, f"{prefix}-{anno}.txt"), righe)
+
+
+def genera_area(dest, nome_file, ambito, dettaglio, anni, rng):
+    """
+    File annuali provinciali / STL: una riga per mese con arrivi e presenze.
+    """
+    presenze = _serie(rng, 1, len(anni), 200000)[0]
+    for a, anno in enumerate(anni):
+        righe = [";".join(_HEADER_AREE)]
+        for m, mese in enumerate(MESI_ESTESI):
+            p_tot = int(presenze[a, m])
+            p_ita = int(p_tot * 0.6)
+            arr_tot = max(p_tot // 4, 1)
+            arr_ita = int(arr_tot * 0.6)
+            righe.append(";".join(map(str, [
+                m + 1, anno, ambito, dettaglio, mese, arr_ita, arr_tot - arr_ita, p_ita, p_tot - p_ita,
+                arr_tot, p_tot,
+            ])))
+        _scrivi(os.path.join(dest, f"{nome_file}-{anno}.txt"), righe)
+
+
+PROVINCE_VENETO = ["Belluno", "Padova", "Rovigo", "Treviso", "Venezia", "Verona", "Vicenza"]
+
+
+def genera_dataset(dest, n_comuni=56, n_anni=4, n_paesi=55, ultimo_anno=2025, seed=0, n_province=1) -> dict:
+    """
+    Scrive in `dest` un albero di dati sintetici con la stessa struttura del repository
+    e restituisce i percorsi delle cartelle generate. Con `n_province` > 1 la cartella provinciale
+    contiene anche le altre province venete (Belluno è sempre la prima).
+    """
+    rng = np.random.default_rng(seed)
+    anni = list(range(ultimo_anno - n_anni + 1, ultimo_anno + 1))
+    cartelle = {
+        "comuni": os.path.join(dest, "dati-mensili-per-comune"),
+        "provincia": os.path.join(dest, "dati-provincia-annuali"),
+        "stl": os.path.join(dest, "stl-presenze-arrivi"),
+        "paesi": os.path.join(dest, "dati-paesi-di-provenienza"),
+    }
+    genera_comuni(cartelle["comuni"], n_comuni, anni, rng)
+    genera_paesi(cartelle["paesi"], n_paesi, anni, rng)
+    for provincia in PROVINCE_VENETO[:n_province]:
+        genera_area(cartelle["provincia"], f"presenze-arrivi-provincia-{provincia.lower()}", "PROVINCIA",
+                    provincia, anni, rng)
+    genera_area(os.path.join(cartelle["stl"], "stl-dolomiti"), "stl-dolomiti", "STL", "01 Dolomiti", anni, rng)
+    genera_area(os.path.join(cartelle["stl"], "stl-belluno"), "stl-belluno", "STL", "02 Belluno", anni, rng)
+    return cartelle
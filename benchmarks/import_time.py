@@ -0,0 +1,111 @@
+import os
+import re
+import ast
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Punti di ingresso: nome → (file sorgente, cartella da mettere in testa a sys.path); budget in secondi
+ENTRY_POINTS = {
+    "app.py": ("app.py", "."),
+    "paesi-di-provenienza/app.py": ("paesi-di-provenienza/app.py", "paesi-di-provenienza"),
+    "pattern_analysis": ("pattern_analysis.py", "."),
+    "etl": ("etl.py", "."),
+}
+BUDGET_S = {
+    "app.py": 2.5,
+    "paesi-di-provenienza/app.py": 2.5,
+    "pattern_analysis": 2.0,
+    "etl": 1.5,
+}
+
+_RIGA_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_di_testa(path: str) -> str:
+    """
+    Solo le istruzioni import a livello di modulo di un file (gli script Streamlit non si possono importare:
+    eseguirebbero l'interfaccia).
+    """
+    with open(path, encoding="utf-8") as f:
+        albero = ast.parse(f.read(), filename=path)
+    return "\n".join(ast.unparse(n) for n in albero.body if isinstance(n, (ast.Import, ast.ImportFrom)))
+
+
+def _moduli_avvio() -> set:
+    """
+    Moduli importati da un interprete vuoto (site, encodings, …): non dipendono dall'entry point.
+    """
+    esito = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    return {m.group(4) for m in map(_RIGA_IMPORTTIME.match, esito.stderr.splitlines()) if m}
+
+
+def misura_entry(nome: str, escludi=frozenset()) -> dict:
+    """
+    Esegue gli import dell'entry point in un interprete nuovo e restituisce il tempo totale
+    e i pacchetti di primo livello più pesanti (da `python -X importtime`).
+    """
+    file, cartella = ENTRY_POINTS[nome]
+    codice = import_di_testa(os.path.join(ROOT_DIR, file))
+    cartella = os.path.abspath(os.path.join(ROOT_DIR, cartella))
+    script = (
+        "import sys, time\n"
+        f"sys.path[:0] = [{cartella!r}, {ROOT_DIR!r}]\n"
+        "t0 = time.perf_counter()\n"
+        f"{codice}\n"
+        "print(time.perf_counter() - t0)\n"
+    )
+    esito = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=cartella,
+                           capture_output=True, text=True)
+    if esito.returncode != 0:
+        raise RuntimeError(f"Import fallito per {nome}: {esito.stderr.strip().splitlines()[-1]}")
+
+    pacchetti = []
+    for riga in esito.stderr.splitlines():
+        m = _RIGA_IMPORTTIME.match(riga)
+        # livello 0 = import richiesto direttamente (non una dipendenza annidata)
+        if m and len(m.group(3)) == 1 and m.group(4) not in escludi:
+            pacchetti.append((m.group(4), int(m.group(2)) / 1e6))
+    pacchetti.sort(key=lambda p: p[1], reverse=True)
+    return {"totale_s": float(esito.stdout.strip().splitlines()[-1]), "pacchetti": pacchetti}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo di import a freddo di ogni entry point, con budget.")
+    parser.add_argument("entry", nargs="*", default=list(ENTRY_POINTS), help="Entry point da misurare")
+    parser.add_argument("--ripetizioni", type=int, default=3, help="Interpreti nuovi per entry (si tiene il minimo)")
+    parser.add_argument("--budget", type=float, help="Budget unico in secondi (sostituisce quelli predefiniti)")
+    parser.add_argument("--top", type=int, default=5, help="Pacchetti più pesanti da mostrare")
+    parser.add_argument("--output", help="File JSON dei risultati")
+    args = parser.parse_args(argv)
+
+    risultati, sforati = [], []
+    avvio = _moduli_avvio()
+    for nome in args.entry:
+        misure = [misura_entry(nome, avvio) for _ in range(args.ripetizioni)]
+        migliore = min(misure, key=lambda m: m["totale_s"])
+        budget = args.budget if args.budget is not None else BUDGET_S.get(nome)
+        ok = budget is None or migliore["totale_s"] <= budget
+        if not ok:
+            sforati.append(nome)
+
+        print(f"{'✅' if ok else '❌'} {nome:<30} {migliore['totale_s']:.3f} s  (budget {budget} s)")
+        for pacchetto, secondi in migliore["pacchetti"][:args.top]:
+            print(f"     {pacchetto:<35} {secondi:.3f} s")
+        risultati.append({"entry": nome, "totale_s": migliore["totale_s"], "budget_s": budget,
+                          "pacchetti": migliore["pacchetti"][:args.top]})
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(risultati, f, ensure_ascii=False, indent=2)
+
+    if sforati:
+        print(f"⚠️ Budget di import superato: {', '.join(sforati)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
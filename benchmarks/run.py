@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+import importlib.util
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RISULTATI_DIR = os.path.join(ROOT_DIR, "benchmarks", "risultati")
+
+
+# =========================
+# ⏱️ Misura dei tempi
+# =========================
+def misura(nome, funzione, ripetizioni=3, prima=None):
+    """
+    Esegue `funzione` `ripetizioni` volte (dopo `prima()`, se indicata, fuori dal tempo misurato)
+    e restituisce tempi minimo e mediano in secondi e il numero di righe del risultato.
+    """
+    tempi, risultato = [], None
+    for _ in range(ripetizioni):
+        if prima is not None:
+            prima()
+        t0 = time.perf_counter()
+        risultato = funzione()
+        tempi.append(time.perf_counter() - t0)
+
+    righe = len(risultato) if hasattr(risultato, "__len__") else None
+    voce = {"fase": nome, "min_s": min(tempi), "mediana_s": statistics.median(tempi), "righe": righe}
+    print(f"  {nome:<50} {voce['min_s'] * 1000:>10.1f} ms  (mediana {voce['mediana_s'] * 1000:.1f} ms)")
+    return voce, risultato
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "sconosciuto"
+
+
+def _carica_etl_paesi():
+    spec = importlib.util.spec_from_file_location(
+        "paesi_etl", os.path.join(ROOT_DIR, "paesi-di-provenienza", "etl.py"))
+    modulo = importlib.util.module_from_spec(spec)
+    # Registrato in sys.modules perché il parser sia serializzabile verso i worker dei processi
+    sys.modules["paesi_etl"] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+# =========================
+# 🏁 Suite
+# =========================
+def esegui(args) -> dict:
+    from benchmarks.genera import genera_dataset
+
+    lavoro = args.dati or tempfile.mkdtemp(prefix="dmo-bench-")
+    cache_dir = os.path.join(lavoro, ".cache")
+    # Le cartelle di cache dei moduli dmo sono lette all'import: vanno impostate prima
+    for var, sotto in [("DMO_CACHE_DIR", "etl"), ("DMO_STORE_DIR", "store"),
+                       ("DMO_RISULTATI_PATH", "risultati.sqlite"), ("DMO_SORGENTI_DIR", "sorgenti")]:
+        os.environ[var] = os.path.join(cache_dir, sotto)
+    # I file sintetici vengono modificati e riletti subito: nessuna attesa prima di pubblicarne la versione
+    os.environ["DMO_SORGENTI_QUIETE_S"] = "0"
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+
+    import numpy as np
+    import pandas as pd
+    import etl
+    from dmo import cache, stagionalita, clustering
+    from dmo.cube import Cubo
+    from dmo.filtri import IndiceFiltri
+    from dmo.mercati import MotoreMercati, MESI_ESTESI
+    from dmo.incremental import IncrementalStore
+    from dmo.risultati import RISULTATI
+    from dmo.schema import memory_report
+
+    paesi_etl = _carica_etl_paesi()
+    rip = args.ripetizioni
+
+    print(f"🏭 Generazione dati: {args.comuni} comuni × {args.anni} anni × {args.paesi} paesi"
+          f" × {args.province} province → {lavoro}")
+    t0 = time.perf_counter()
+    cartelle = genera_dataset(lavoro, args.comuni, args.anni, args.paesi, seed=args.seed,
+                              n_province=args.province)
+    print(f"  generati in {time.perf_counter() - t0:.2f} s")
+
+    def svuota_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        stagionalita._DECOMPOSIZIONI.clear()
+        clustering._PROFILI.clear()
+        clustering._ASSEGNAZIONI.clear()
+
+    risultati = []
+
+    def fase(nome, funzione, prima=None):
+        voce, risultato = misura(nome, funzione, rip, prima)
+        risultati.append(voce)
+        return risultato
+
+    print("📥 Loader")
+    svuota_cache()
+    fase("comuni: load_dati_comunali (cache fredda)",
+         lambda: etl.load_dati_comunali(cartelle["comuni"]), prima=lambda: cache.purge_cache())
+    comuni = fase("comuni: load_dati_comunali (cache calda)", lambda: etl.load_dati_comunali(cartelle["comuni"]))
+    etl.load_dati_comunali(cartelle["comuni"], incremental=True)  # primo refresh: costruisce lo store
+    fase("comuni: incrementale (store caldo)",
+         lambda: etl.load_dati_comunali(cartelle["comuni"], incremental=True))
+    if args.jobs != 1:
+        fase(f"comuni: load_dati_comunali jobs={args.jobs} (cache fredda)",
+             lambda: etl.load_dati_comunali(cartelle["comuni"], jobs=args.jobs), prima=lambda: cache.purge_cache())
+    fase("provincia: load_provincia_belluno (cache fredda)",
+         lambda: etl.load_provincia_belluno(cartelle["provincia"]), prima=lambda: cache.purge_cache())
+    fase("provincia: catalogo partizioni", lambda: etl.catalogo_aree({"provincia": cartelle["provincia"]}))
+    fase("stl: load_stl_data (cache fredda)",
+         lambda: etl.load_stl_data(cartelle["stl"])[0], prima=lambda: cache.purge_cache())
+
+    prefix = "presenze-dolomiti-estero"
+    paesi = fase("paesi: load_data", lambda: paesi_etl.load_data(cartelle["paesi"], prefix))
+    matrice = fase("paesi: load_data formato largo", lambda: paesi_etl.load_data(cartelle["paesi"], prefix,
+                                                                              formato="largo"))
+    if args.jobs != 1:
+        fase(f"paesi: load_data jobs={args.jobs}", lambda: paesi_etl.load_data(cartelle["paesi"], prefix,
+                                                                               jobs=args.jobs))
+    fase("paesi: incrementale (store freddo)",
+         lambda: paesi_etl.load_data(cartelle["paesi"], prefix, incremental=True),
+         prima=lambda: IncrementalStore(prefix, cartelle["paesi"], paesi_etl._parse_file_paesi).purge())
+
+    print("🧮 Memoria (schema compatto)")
+    memoria = {}
+    for nome, lungo, compatto in [
+        ("comuni", comuni, etl.load_dati_comunali(cartelle["comuni"], compact=True)),
+        ("paesi", paesi, paesi_etl.load_data(cartelle["paesi"], prefix, compact=True)),
+    ]:
+        report = memory_report(lungo, compatto)
+        prima, dopo = report.loc["Totale", ["prima (byte)", "dopo (byte)"]]
+        memoria[nome] = {"prima_byte": int(prima), "dopo_byte": int(dopo),
+                         "risparmio_pct": float(report.loc["Totale", "risparmio %"])}
+        print(f"  {nome:<50} {prima / 1024:>10.1f} KB → {dopo / 1024:.1f} KB"
+              f"  (−{memoria[nome]['risparmio_pct']:.1f}%)")
+
+    print("📊 Analisi")
+    comuni_pa = comuni.rename(columns={"comune": "Comune"})
+    cubo = fase("cubo: Cubo.from_frame", lambda: Cubo.from_frame(comuni))
+    rng = np.random.default_rng(args.seed)
+    selezioni = [
+        (list(rng.choice(cubo.entita, size=min(5, len(cubo.entita)), replace=False)), list(cubo.anni),
+         list(rng.choice(cubo.mesi, size=6, replace=False)))
+        for _ in range(100)
+    ]
+    fase("cubo: 100 totali + tabelle mesi",
+         lambda: [(cubo.totale(*s), cubo.tabella_mesi(*s)) for s in selezioni])
+
+    def mercati():
+        motore = MotoreMercati.from_frame(paesi)
+        return motore.tabella_potenziale(), motore.tabella_pattern()
+
+    fase("paesi: indicatori per mercato (MotoreMercati)", lambda: mercati()[0])
+    fase("paesi: pivot Mese × Paese + classifica (formato lungo)",
+         lambda: (paesi.pivot_table(index=["Mese", "Paese"], columns="Anno", values="Presenze", aggfunc="sum",
+                                    observed=False).fillna(0).reset_index(),
+                  paesi.groupby(["Anno", "Paese"], as_index=False)["Presenze"].sum()))
+    fase("paesi: pivot Mese × Paese + classifica (matrice)",
+         lambda: (matrice.tabella_mesi_entita(), matrice.totali_anno()))
+
+    nomi_paesi = paesi["Paese"].unique()
+    filtri_paesi = [
+        (list(rng.choice(nomi_paesi, size=min(3, len(nomi_paesi)), replace=False)),
+         list(rng.choice(paesi["Anno"].unique(), size=2, replace=False)), list(paesi["Mese"].cat.categories))
+        for _ in range(100)
+    ]
+    fase("paesi: 100 filtri isin",
+         lambda: [paesi[paesi["Paese"].isin(p) & paesi["Anno"].isin(a) & paesi["Mese"].isin(m)]
+                  for p, a, m in filtri_paesi])
+    indice = IndiceFiltri(paesi, ["Paese", "Anno", "Mese"])
+    fase("paesi: 100 filtri indice invertito (LRU vuota)",
+         lambda: [indice.filtra(Paese=p, Anno=a, Mese=m) for p, a, m in filtri_paesi], prima=indice._memo.clear)
+
+    def pulisci_stagionalita():
+        stagionalita._DECOMPOSIZIONI.clear()
+        RISULTATI.svuota("stagionalita.decomposizione")
+
+    fase("stagionalità: decomposizione comuni (fredda)",
+         lambda: stagionalita.decomposizione_per_versione(comuni_pa, "Comune", nome="bench").entita,
+         prima=pulisci_stagionalita)
+    fase("stagionalità: decomposizione paesi (fredda)",
+         lambda: stagionalita.decomposizione_per_versione(paesi, "Paese", "Anno", "Mese", "Presenze",
+                                                          MESI_ESTESI, nome="bench-paesi").entita,
+         prima=pulisci_stagionalita)
+    fase("stagionalità: decomposizione comuni (cache risultati)",
+         lambda: stagionalita.decomposizione_per_versione(comuni_pa, "Comune", nome="bench").entita,
+         prima=stagionalita._DECOMPOSIZIONI.clear)
+
+    def pulisci_cluster():
+        clustering._PROFILI.clear()
+        clustering._ASSEGNAZIONI.clear()
+        RISULTATI.svuota("clustering.cluster")
+
+    k = min(4, max(2, comuni_pa["Comune"].nunique() - 1))
+    fase(f"clustering: KMeans k={k} (freddo)",
+         lambda: clustering.cluster_per_versione(comuni_pa, k, nome="bench").cluster, prima=pulisci_cluster)
+    fase(f"clustering: KMeans k={k} (persistito)",
+         lambda: clustering.cluster_per_versione(comuni_pa, k, nome="bench").cluster,
+         prima=clustering._ASSEGNAZIONI.clear)
+    fase(f"clustering: sweep k=2..8 jobs={args.jobs}",
+         lambda: clustering.sweep_k(clustering.profili_per_versione(comuni_pa), range(2, 9), jobs=args.jobs))
+
+    if not args.dati:
+        shutil.rmtree(lavoro, ignore_errors=True)
+
+    return {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpu": os.cpu_count(),
+            "scala": {"comuni": args.comuni, "anni": args.anni, "paesi": args.paesi, "province": args.province},
+            "ripetizioni": rip,
+            "jobs": args.jobs,
+        },
+        "risultati": risultati,
+        "memoria": memoria,
+    }
+
+
+def confronta(attuale: dict, precedente: dict, soglia=1.2):
+    """
+    Stampa il rapporto dei tempi minimi rispetto a un'esecuzione precedente, segnalando le regressioni.
+    """
+    prima = {r["fase"]: r["min_s"] for r in precedente["risultati"]}
+    print(f"🔎 Confronto con {precedente['meta'].get('commit')} ({precedente['meta'].get('data')})")
+    if precedente["meta"].get("scala") != attuale["meta"]["scala"]:
+        print(f"⚠️ Scala diversa ({precedente['meta'].get('scala')} → {attuale['meta']['scala']}): "
+              "i rapporti non indicano regressioni")
+    for r in attuale["risultati"]:
+        if r["fase"] not in prima or not prima[r["fase"]]:
+            continue
+        rapporto = r["min_s"] / prima[r["fase"]]
+        segno = "⚠️" if rapporto > soglia else "  "
+        print(f"  {segno} {r['fase']:<50} ×{rapporto:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dei loader e delle analisi su dati sintetici.")
+    parser.add_argument("--comuni", type=int, default=56)
+    parser.add_argument("--anni", type=int, default=4)
+    parser.add_argument("--paesi", type=int, default=55)
+    parser.add_argument("--province", type=int, default=1,
+                        help="Province venete nella cartella provinciale (Belluno + altre, max 7)")
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dati", help="Cartella in cui generare (e conservare) i dati sintetici")
+    parser.add_argument("--output", help="File JSON dei risultati (default: benchmarks/risultati/<data>-<commit>.json)")
+    parser.add_argument("--confronta", help="File JSON di un'esecuzione precedente da confrontare")
+    args = parser.parse_args(argv)
+
+    risultati = esegui(args)
+
+    output = args.output or os.path.join(
+        RISULTATI_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{risultati['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(risultati, f, ensure_ascii=False, indent=2)
+    print(f"💾 Risultati salvati in {output}")
+
+    if args.confronta:
+        with open(args.confronta, encoding="utf-8") as f:
+            confronta(risultati, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
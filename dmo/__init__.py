@@ -0,0 +1,3 @@
+"""
+Infrastruttura condivisa dalle dashboard DMO Dolomiti (cache, storage, analisi).
+"""
@@ -0,0 +1,115 @@
+import os
+import sys
+import argparse
+import importlib.util
+
+from dmo.cache import ROOT_DIR
+
+# Il modulo etl dei dati comunali è nella radice del repository
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+PAESI_DIR = os.path.join(ROOT_DIR, "paesi-di-provenienza", "dati-paesi-di-provenienza")
+PAESI_PREFIX = "presenze-dolomiti-estero"
+
+
+def _carica_etl_paesi():
+    spec = importlib.util.spec_from_file_location(
+        "paesi_etl", os.path.join(ROOT_DIR, "paesi-di-provenienza", "etl.py"))
+    modulo = importlib.util.module_from_spec(spec)
+    # Registrato in sys.modules perché il parser sia serializzabile verso i worker dei processi
+    sys.modules["paesi_etl"] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+# =========================
+# 📋 Piano degli artefatti delle dashboard
+# =========================
+def piano(comuni_dir="dati-mensili-per-comune", paesi_dir=PAESI_DIR, k_cluster=4) -> list:
+    """
+    Tutti gli artefatti letti dalle dashboard:
+    - dataset: dati comunali (store consolidato), una voce per provincia/STL, matrice dei paesi;
+    - derivati: cubo dei comuni, cluster e decomposizione stagionale dei comuni, tabelle dei mercati,
+      classifiche top 10 (Paesi per presenze in ogni anno, mercati per indice potenziale).
+    I derivati passano dalle stesse funzioni per versione usate dalle app, quindi la costruzione
+    popola anche la cache dei risultati che le app consultano.
+    """
+    import etl
+    from dmo.artefatti import Artefatto
+    from dmo.cube import Cubo
+    from dmo.clustering import cluster_per_versione
+    from dmo.stagionalita import decomposizione_per_versione
+    from dmo.mercati import tabelle_per_versione, classifica_presenze, migliori_mercati
+
+    paesi_etl = _carica_etl_paesi()
+
+    voci = [Artefatto("comuni", lambda: etl.load_dati_comunali(comuni_dir, incremental=True, compact=True),
+                      sorgenti=etl.file_comunali(comuni_dir))]
+
+    catalogo = etl.catalogo_aree()
+    for ambito in catalogo.ambiti():
+        for area in catalogo.aree(ambito):
+            voci.append(Artefatto(
+                f"{ambito}-{area}", lambda ambito=ambito, area=area: etl.load_area(ambito, area, catalogo=catalogo),
+                sorgenti=[p.path for p in catalogo.seleziona(ambito, [area])],
+            ))
+
+    if os.path.isdir(paesi_dir):
+        voci.append(Artefatto("paesi", lambda: paesi_etl.load_data(paesi_dir, PAESI_PREFIX, formato="largo"),
+                              sorgenti=paesi_etl.file_paesi(paesi_dir, PAESI_PREFIX)))
+        voci += [
+            Artefatto("mercati-potenziale", lambda m: tabelle_per_versione(m)[1], dipende=["paesi"]),
+            # le due tabelle sono calcolate insieme: dopo il potenziale, il pattern arriva dalla cache dei risultati
+            Artefatto("mercati-pattern", lambda m, _: tabelle_per_versione(m)[2],
+                      dipende=["paesi", "mercati-potenziale"]),
+            Artefatto("classifica-paesi", lambda m: classifica_presenze(m, n=10, escludi="Totale"),
+                      dipende=["paesi"]),
+            Artefatto("classifica-mercati", lambda p: migliori_mercati(p, n=10)[0], dipende=["mercati-potenziale"]),
+        ]
+    else:
+        print(f"⚠️ Cartella dei paesi non trovata, artefatti dei mercati saltati: {paesi_dir}")
+
+    def per_comune(df):
+        return df.rename(columns={"comune": "Comune"})
+
+    voci += [
+        Artefatto("cubo-comuni", lambda df: Cubo.from_frame(df), dipende=["comuni"]),
+        Artefatto("cluster-comuni", lambda df: cluster_per_versione(per_comune(df), k_cluster).to_dict(),
+                  dipende=["comuni"]),
+        Artefatto("decomposizione-comuni",
+                  lambda df: decomposizione_per_versione(per_comune(df), "Comune", nome="comuni"),
+                  dipende=["comuni"]),
+    ]
+    return voci
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m dmo", description="Strumenti delle dashboard DMO Dolomiti.")
+    comandi = parser.add_subparsers(dest="comando", required=True)
+
+    # La cartella degli artefatti è solo DMO_ARTEFATTI_DIR (default .cache/artefatti): è la stessa letta dalle app
+    build = comandi.add_parser("build", help="Precalcola gli artefatti delle dashboard in una cartella versionata")
+    build.add_argument("--jobs", type=int, default=1, help="Artefatti indipendenti in parallelo (-1 = tutti i core)")
+    build.add_argument("--forza", action="store_true", help="Ricostruisce anche se la versione esiste già")
+
+    comandi.add_parser("stato", help="Mostra la versione corrente degli artefatti")
+    args = parser.parse_args(argv)
+
+    from dmo.artefatti import costruisci, Artefatti
+
+    if args.comando == "build":
+        manifest = costruisci(piano(), jobs=args.jobs, forza=args.forza)
+        return 1 if manifest["errori"] else 0
+
+    artefatti = Artefatti.corrente()
+    if artefatti is None:
+        print("⚠️ Nessuna versione degli artefatti: eseguire `python -m dmo build`.")
+        return 1
+    print(f"📦 Versione {artefatti.versione} ({artefatti.manifest['creato']}): {artefatti.path}")
+    print(artefatti.tabella().to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
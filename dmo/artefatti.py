@@ -0,0 +1,339 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from dmo.cache import (ROOT_DIR, PARQUET_DISPONIBILE, content_hash, versione_frame, impronta_modulo,
+                       _scrivi_atomico, _leggi_meta)
+from dmo.cube import Cubo
+from dmo.largo import MatriceMensile
+from dmo.stagionalita import DecomposizioneBatch
+from dmo.parallel import num_jobs
+
+ARTEFATTI_DIR = os.environ.get("DMO_ARTEFATTI_DIR", os.path.join(ROOT_DIR, ".cache", "artefatti"))
+PUNTATORE = "CORRENTE"     # file con l'identificativo della versione pubblicata
+# Da incrementare quando cambia il formato su disco degli artefatti (vedi `_FORMATI`)
+VERSIONE_FORMATO = 2
+
+
+def impronta_sorgenti(paths) -> str:
+    """
+    Impronta del contenuto di un insieme di file sorgente: hash dei (nome file, sha1) ordinati.
+    Non dipende da percorso né da mtime, quindi resta valida dopo una copia o un checkout.
+    """
+    h = hashlib.sha1()
+    for nome, sha1 in sorted((os.path.basename(p), content_hash(p)) for p in paths):
+        h.update(f"{nome}|{sha1}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def impronta_codice() -> str:
+    """
+    Versione del codice che costruisce gli artefatti: `VERSIONE_FORMATO` e hash del sorgente di tutti
+    i moduli del repository importati (pacchetto `dmo` e loader `etl` caricati dal piano).
+    """
+    moduli = sorted(
+        nome for nome, modulo in list(sys.modules.items())
+        if os.path.abspath(getattr(modulo, "__file__", None) or "/").startswith(ROOT_DIR + os.sep)
+    )
+    h = hashlib.sha1(f"formato|{VERSIONE_FORMATO}\n".encode("utf-8"))
+    for nome in moduli:
+        h.update(f"{nome}|{impronta_modulo(nome)}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+# =========================
+# 💾 Formati degli artefatti
+# =========================
+def _scrivi_frame(df, path):
+    if not PARQUET_DISPONIBILE:
+        raise RuntimeError("pyarrow è necessario per salvare i DataFrame (pip install pyarrow).")
+    df.to_parquet(path)
+
+
+def _scrivi_json(valore, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(valore, f, ensure_ascii=False)
+
+
+# tipo → (estensione, scrittura, lettura)
+_FORMATI = {
+    "frame": (".parquet", _scrivi_frame, pd.read_parquet),
+    "matrice": ("", lambda v, p: v.salva(p), MatriceMensile.carica),     # archivio memory-mapped (cartella)
+    "cubo": ("", lambda v, p: v.salva(p), Cubo.carica),                  # archivio memory-mapped (cartella)
+    "decomposizione": (".npz", lambda v, p: v.salva(p), DecomposizioneBatch.carica),
+    "json": (".json", _scrivi_json, _leggi_meta),
+}
+
+
+def _tipo(valore) -> str:
+    if isinstance(valore, pd.DataFrame):
+        return "frame"
+    if isinstance(valore, MatriceMensile):
+        return "matrice"
+    if isinstance(valore, Cubo):
+        return "cubo"
+    if isinstance(valore, DecomposizioneBatch):
+        return "decomposizione"
+    if isinstance(valore, dict):
+        return "json"
+    raise TypeError(f"Tipo di artefatto non supportato: {type(valore).__name__}")
+
+
+def _dimensione(path) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _versione_dati(valore):
+    if isinstance(valore, pd.DataFrame):
+        return versione_frame(valore)
+    if isinstance(valore, MatriceMensile):
+        return valore.versione
+    return None
+
+
+# =========================
+# 🏗️ Costruzione
+# =========================
+class Artefatto:
+    """
+    Un elemento da costruire: `calcola(*valori_delle_dipendenze)` produce il valore da salvare.
+    Gli artefatti senza dipendenze leggono file sorgente (`sorgenti`), di cui si registra l'impronta;
+    i derivati ereditano le impronte delle loro dipendenze.
+    """
+
+    def __init__(self, nome: str, calcola, dipende=(), sorgenti=None):
+        self.nome = nome
+        self.calcola = calcola
+        self.dipende = tuple(dipende)
+        self.sorgenti = list(sorgenti or [])
+
+
+def costruisci(piano, base_dir: str = None, jobs: int = 1, forza: bool = False) -> dict:
+    """
+    Costruisce tutti gli artefatti del piano in una nuova cartella `<base_dir>/<versione>`, dove la
+    versione è l'hash del contenuto di tutte le sorgenti e della versione del codice (`impronta_codice`):
+    con gli stessi dati ma codice o formato cambiati si costruisce una versione nuova. Gli artefatti indipendenti girano in parallelo
+    (`jobs` thread, -1 = tutti i core); ognuno parte appena le sue dipendenze sono pronte.
+
+    La cartella è scritta a parte e pubblicata con un rename atomico, poi il puntatore `CORRENTE` viene
+    aggiornato: i lettori vedono la versione precedente completa o la nuova completa. Se un artefatto
+    fallisce la versione non viene pubblicata. Restituisce il manifest.
+    """
+    base_dir = base_dir or ARTEFATTI_DIR
+    per_nome = {a.nome: a for a in piano}
+
+    # Impronte delle sorgenti (i derivati ereditano quelle delle dipendenze)
+    impronte = {}
+    for a in piano:
+        if not a.dipende:
+            impronte[a.nome] = impronta_sorgenti(a.sorgenti)
+    for a in piano:
+        if a.dipende:
+            impronte[a.nome] = "-".join(dict.fromkeys(impronte[d] for d in a.dipende))
+    codice = impronta_codice()
+    h = hashlib.sha1(f"codice|{codice}\n".encode("utf-8"))
+    for nome in sorted(impronte):
+        h.update(f"{nome}|{impronte[nome]}\n".encode("utf-8"))
+    versione = h.hexdigest()[:16]
+
+    dest = os.path.join(base_dir, versione)
+    manifest = _leggi_meta(os.path.join(dest, "manifest.json"))
+    if manifest is not None and not forza:
+        print(f"✅ Versione {versione} già costruita: {dest}")
+        pubblica(versione, base_dir)
+        return manifest
+
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    valori, voci, errori = {}, {}, {}
+    lock = threading.Lock()
+
+    def esegui(a: Artefatto):
+        t0 = time.perf_counter()
+        valore = a.calcola(*[valori[d] for d in a.dipende])
+        tipo = _tipo(valore)
+        estensione, scrivi, _ = _FORMATI[tipo]
+        file = f"{a.nome}{estensione}"
+        scrivi(valore, os.path.join(tmp, file))
+        durata = time.perf_counter() - t0
+        with lock:
+            valori[a.nome] = valore
+            voci[a.nome] = {
+                "file": file, "tipo": tipo, "durata_s": durata,
+                "byte": _dimensione(os.path.join(tmp, file)),
+                "sorgenti": impronte[a.nome],
+                # versione dei dati da cui deriva (per i derivati: quella della prima dipendenza)
+                "versione_dati": next((v for v in map(_versione_dati, [valore] + [valori[d] for d in a.dipende])
+                                       if v), None),
+                "dipende": list(a.dipende),
+            }
+            print(f"  ✅ {a.nome:<32} {durata * 1000:>9.0f} ms")
+            # file sorgente non letti dal loader (raccolti da `parse_files`)
+            for errore in getattr(valore, "attrs", {}).get("errori", []):
+                print(f"     ⚠️ {os.path.basename(errore['file'])}: {errore['errore']}")
+
+    t0 = time.perf_counter()
+    print(f"🏗️ Costruzione artefatti {versione} ({len(piano)} artefatti, jobs={num_jobs(jobs, len(piano))})")
+    in_attesa = list(piano)
+    in_corso = {}
+    with ThreadPoolExecutor(max_workers=num_jobs(jobs, len(piano))) as pool:
+        while in_attesa or in_corso:
+            # avvia gli artefatti con le dipendenze pronte; salta quelli con una dipendenza fallita
+            for a in list(in_attesa):
+                if any(d in errori for d in a.dipende):
+                    errori[a.nome] = "dipendenza non disponibile"
+                    in_attesa.remove(a)
+                elif all(d in valori for d in a.dipende):
+                    in_corso[pool.submit(esegui, a)] = a
+                    in_attesa.remove(a)
+            if not in_corso:
+                break
+            fatti, _ = wait(in_corso, return_when=FIRST_COMPLETED)
+            for f in fatti:
+                a = in_corso.pop(f)
+                if f.exception() is not None:
+                    with lock:
+                        errori[a.nome] = str(f.exception())
+                        print(f"  ❌ {a.nome:<32} {f.exception()}")
+
+    mancanti = [nome for nome in per_nome if nome not in voci and nome not in errori]
+    for nome in mancanti:
+        errori[nome] = "dipendenze cicliche o mancanti"
+
+    manifest = {
+        "versione": versione,
+        "codice": codice,
+        "creato": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "durata_s": time.perf_counter() - t0,
+        "artefatti": voci,
+        "errori": errori,
+    }
+    if errori:
+        shutil.rmtree(tmp, ignore_errors=True)
+        print(f"❌ Versione {versione} non pubblicata: {len(errori)} artefatti non costruiti")
+        return manifest
+
+    _scrivi_json(manifest, os.path.join(tmp, "manifest.json"))
+    try:
+        os.rename(tmp, dest)
+    except OSError:
+        # già pubblicata da un'altra costruzione (o ricostruzione forzata): si sostituisce
+        vecchia = f"{dest}.{os.getpid()}.old"
+        os.rename(dest, vecchia)
+        os.rename(tmp, dest)
+        shutil.rmtree(vecchia, ignore_errors=True)
+    pubblica(versione, base_dir)
+    print(f"📦 Versione {versione} pubblicata in {time.perf_counter() - t0:.2f} s: {dest}")
+    return manifest
+
+
+def pubblica(versione: str, base_dir: str = None):
+    """
+    Rende `versione` quella corrente (scrittura atomica del puntatore).
+    """
+    base_dir = base_dir or ARTEFATTI_DIR
+
+    def scrivi(p):
+        with open(p, "w", encoding="utf-8") as f:
+            f.write(versione + "\n")
+
+    _scrivi_atomico(os.path.join(base_dir, PUNTATORE), scrivi)
+
+
+# =========================
+# 📖 Lettura
+# =========================
+class Artefatti:
+    """
+    Una versione costruita: manifest e lettura dei singoli artefatti.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        manifest = _leggi_meta(os.path.join(path, "manifest.json"))
+        if manifest is None:
+            raise FileNotFoundError(f"Manifest non trovato in {path}")
+        self.versione = manifest["versione"]
+        self.voci = manifest["artefatti"]
+        self.manifest = manifest
+
+    @classmethod
+    def corrente(cls, base_dir: str = None):
+        """
+        Versione puntata da `CORRENTE`, o None se non è mai stata costruita.
+        """
+        base_dir = base_dir or ARTEFATTI_DIR
+        try:
+            with open(os.path.join(base_dir, PUNTATORE), encoding="utf-8") as f:
+                versione = f.read().strip()
+            return cls(os.path.join(base_dir, versione))
+        except (OSError, ValueError):
+            return None
+
+    def leggi(self, nome: str):
+        voce = self.voci[nome]
+        _, _, leggi = _FORMATI[voce["tipo"]]
+        return leggi(os.path.join(self.path, voce["file"]))
+
+    def leggi_se_valido(self, nome: str, sorgenti):
+        """
+        L'artefatto `nome` se è stato costruito da file con lo stesso contenuto di `sorgenti`, altrimenti None.
+        """
+        voce = self.voci.get(nome)
+        if voce is None or not sorgenti or voce["sorgenti"] != impronta_sorgenti(sorgenti):
+            return None
+        return self.leggi(nome)
+
+    def tabella(self) -> pd.DataFrame:
+        return pd.DataFrame([
+            {"artefatto": nome, "tipo": v["tipo"], "ms": round(v["durata_s"] * 1000, 1),
+             "KB": round(v["byte"] / 1024, 1), "sorgenti": v["sorgenti"]}
+            for nome, v in self.voci.items()
+        ])
+
+
+def da_artefatti(nome: str, sorgenti, carica, base_dir: str = None):
+    """
+    Valore dell'artefatto `nome` della versione corrente se è stato costruito da sorgenti identiche
+    a quelle attuali; altrimenti (nessuna build, sorgenti cambiate, artefatto illeggibile) `carica()`.
+    """
+    artefatti = Artefatti.corrente(base_dir)
+    if artefatti is not None:
+        try:
+            valore = artefatti.leggi_se_valido(nome, sorgenti)
+        except Exception as e:
+            print(f"⚠️ Artefatto '{nome}' non leggibile, ricarico dalle sorgenti: {e}")
+            valore = None
+        if valore is not None:
+            return valore
+    return carica()
+
+
+
+def artefatto_per_versione(tipo: str, versione: str, base_dir: str = None):
+    """
+    Un artefatto di tipo `tipo` (es. "cubo") della versione corrente calcolato dai dati con versione
+    `versione`, o None: permette di riusare un derivato senza sapere con che nome è stato costruito.
+    """
+    artefatti = Artefatti.corrente(base_dir)
+    if artefatti is None or not versione:
+        return None
+    for nome, voce in artefatti.voci.items():
+        if voce["tipo"] == tipo and voce.get("versione_dati") == versione:
+            try:
+                return artefatti.leggi(nome)
+            except Exception as e:
+                print(f"⚠️ Artefatto '{nome}' non leggibile: {e}")
+                return None
+    return None
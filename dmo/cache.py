@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import shutil
+import inspect
+import hashlib
+import threading
+import functools
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (necessario per to_parquet / read_parquet)
+    PARQUET_DISPONIBILE = True
+except ImportError:
+    PARQUET_DISPONIBILE = False
+
+# =========================
+# 📁 Cartella della cache
+# =========================
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get("DMO_CACHE_DIR", os.path.join(ROOT_DIR, ".cache", "etl"))
+CACHE_MAX_MB = float(os.environ.get("DMO_CACHE_MAX_MB", "256"))
+# Da incrementare quando cambia il formato dei frame in cache senza che cambi il modulo del parser
+VERSIONE_PARSER = 1
+
+_SFOLTISCI_OGNI_S = 60      # pulizia della cache al massimo una volta al minuto per processo
+
+_HASH_CHUNK = 1 << 20
+
+
+# =========================
+# 🔑 Impronta dei file sorgente
+# =========================
+def content_hash(path: str) -> str:
+    """
+    Restituisce lo SHA-1 del contenuto del file (letto a blocchi).
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(path: str, sha1: str = None) -> dict:
+    """
+    Impronta di un file sorgente: percorso assoluto, dimensione, mtime e hash del contenuto.
+    """
+    st = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha1": sha1 or content_hash(path),
+    }
+
+
+def versione_frame(df: pd.DataFrame) -> str:
+    """
+    Versione di un DataFrame: quella del loader (`attrs["versione"]`) se presente,
+    altrimenti un hash del contenuto.
+    """
+    versione = df.attrs.get("versione")
+    if versione:
+        return versione
+    h = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    h.update("|".join(map(str, df.columns)).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+_IMPRONTE_MODULI = {}
+_LOCK = threading.Lock()
+
+
+def impronta_modulo(modulo: str) -> str:
+    """
+    Hash del sorgente di un modulo importato (calcolato una volta per processo): cambia con
+    qualunque modifica al modulo. Stringa vuota se il sorgente non è disponibile.
+    """
+    with _LOCK:
+        impronta = _IMPRONTE_MODULI.get(modulo)
+    if impronta is None:
+        try:
+            testo = inspect.getsource(sys.modules[modulo])
+            impronta = hashlib.sha1(testo.encode("utf-8")).hexdigest()[:16]
+        except (KeyError, OSError, TypeError):
+            impronta = ""
+        with _LOCK:
+            _IMPRONTE_MODULI[modulo] = impronta
+    return impronta
+
+
+def modulo_di(funzione) -> str:
+    while isinstance(funzione, functools.partial):
+        funzione = funzione.func
+    return getattr(funzione, "__module__", None) or ""
+
+
+def impronta_parser(parser) -> str:
+    """
+    Identità del codice di un parser: nome qualificato, `VERSIONE_PARSER` e hash del sorgente del modulo
+    che lo definisce (una modifica a qualunque funzione del modulo, es. un helper del parser, la cambia).
+    Se il sorgente non è disponibile si usa solo il nome.
+    """
+    modulo = modulo_di(parser)
+    while isinstance(parser, functools.partial):
+        parser = parser.func
+    nome = f"{modulo}.{getattr(parser, '__qualname__', type(parser).__name__)}"
+    return f"{nome}|{VERSIONE_PARSER}|{impronta_modulo(modulo)}"
+
+
+def _chiave(path: str, namespace: str, parser: str) -> str:
+    return hashlib.sha1(f"{namespace}|{parser}|{os.path.abspath(path)}".encode("utf-8")).hexdigest()
+
+
+def _leggi_meta(meta_path: str):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _scrivi_atomico(path: str, scrivi):
+    """
+    Scrive su un file temporaneo e lo rinomina: i lettori non vedono mai file parziali.
+    Il temporaneo è unico per processo e thread: più writer sullo stesso file non si sovrascrivono a vicenda.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        scrivi(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# =========================
+# 📦 Lettura con cache colonnare
+# =========================
+def load_cached(path: str, parser, namespace: str, cache_dir: str = None):
+    """
+    Restituisce il DataFrame prodotto da `parser(path)`, servendolo dalla cache Parquet
+    se il file sorgente non è cambiato (dimensione + mtime, poi hash del contenuto).
+
+    La chiave comprende l'identità del codice del parser (`impronta_parser`): se il parser cambia
+    le voci vecchie non vengono più lette. Le voci obsolete vengono ricostruite automaticamente,
+    quelle orfane eliminate da `sfoltisci_cache`. Se il parser restituisce None (file non conforme)
+    il risultato non viene memorizzato.
+    """
+    if not PARQUET_DISPONIBILE:
+        return parser(path)
+
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+
+    impronta = impronta_parser(parser)
+    chiave = _chiave(path, namespace, impronta)
+    meta_path = os.path.join(cache_dir, f"{chiave}.json")
+    meta = _leggi_meta(meta_path)
+    st = os.stat(path)
+
+    if meta is not None:
+        data_path = os.path.join(cache_dir, meta["file"])
+        if os.path.exists(data_path):
+            # Fast path: dimensione e mtime invariati → nessuna lettura del sorgente
+            if meta["size"] == st.st_size and meta["mtime_ns"] == st.st_mtime_ns:
+                df = _leggi_voce(data_path)
+                if df is not None:
+                    return df
+            # mtime cambiato ma contenuto identico (es. file ricopiato): aggiorna solo i metadati
+            elif meta["sha1"] == content_hash(path):
+                df = _leggi_voce(data_path)
+                if df is not None:
+                    meta.update(fingerprint(path, sha1=meta["sha1"]))
+                    _scrivi_atomico(meta_path, lambda p: _dump_json(meta, p))
+                    return df
+
+    df = parser(path)
+    if df is None:
+        return None
+
+    fp = fingerprint(path)
+    nome_file = f"{chiave}-{fp['sha1'][:16]}.parquet"
+    data_path = os.path.join(cache_dir, nome_file)
+    try:
+        _scrivi_atomico(data_path, lambda p: df.to_parquet(p, index=True))
+    except Exception as e:
+        print(f"⚠️ Impossibile salvare in cache {os.path.basename(path)}: {e}")
+        return df
+
+    if meta is not None and meta.get("file") != nome_file:
+        vecchio = os.path.join(cache_dir, meta["file"])
+        if os.path.exists(vecchio):
+            os.remove(vecchio)
+
+    fp.update({"namespace": namespace, "parser": impronta, "file": nome_file})
+    _scrivi_atomico(meta_path, lambda p: _dump_json(fp, p))
+    _sfoltisci_se_scaduto(cache_dir)
+    return df
+
+
+def _leggi_voce(data_path: str):
+    """
+    Legge una voce della cache segnandola come usata di recente (per l'LRU di `sfoltisci_cache`);
+    None se nel frattempo è stata eliminata.
+    """
+    try:
+        df = pd.read_parquet(data_path)
+        os.utime(data_path)
+    except OSError:
+        return None
+    return df
+
+
+def _dump_json(obj, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+
+
+# =========================
+# 🧹 Pulizia della cache
+# =========================
+def purge_cache(namespace: str = None, cache_dir: str = None) -> int:
+    """
+    Svuota la cache. Se `namespace` è indicato rimuove solo le voci di quel loader.
+    Restituisce il numero di voci eliminate.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    if not os.path.exists(cache_dir):
+        return 0
+
+    if namespace is None:
+        n = len([f for f in os.listdir(cache_dir) if f.endswith(".json")])
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return n
+
+    n = 0
+    for file in os.listdir(cache_dir):
+        if not file.endswith(".json"):
+            continue
+        meta_path = os.path.join(cache_dir, file)
+        meta = _leggi_meta(meta_path)
+        if meta is None or meta.get("namespace") != namespace:
+            continue
+        data_path = os.path.join(cache_dir, meta["file"])
+        for p in (data_path, meta_path):
+            if os.path.exists(p):
+                os.remove(p)
+        n += 1
+    return n
+
+
+def sfoltisci_cache(cache_dir: str = None, max_mb: float = None) -> int:
+    """
+    Elimina le voci orfane e poi le meno usate di recente finché la cache supera `max_mb`.
+    Sono orfane le voci il cui file sorgente non esiste più (es. una versione dei sorgenti già rimossa
+    da `dmo.sorgenti`) e quelle sostituite da una voce più recente dello stesso file e loader
+    scritta da un'altra versione del parser. Restituisce il numero di voci eliminate.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_byte = (CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    if not os.path.exists(cache_dir):
+        return 0
+
+    voci, recenti = [], {}
+    for file in os.listdir(cache_dir):
+        if not file.endswith(".json"):
+            continue
+        meta_path = os.path.join(cache_dir, file)
+        meta = _leggi_meta(meta_path)
+        try:
+            scritta = os.path.getmtime(meta_path)
+            st = os.stat(os.path.join(cache_dir, meta["file"])) if meta is not None else None
+        except OSError:
+            meta, st, scritta = None, None, 0
+        voce = {"meta_path": meta_path, "meta": meta, "st": st, "scritta": scritta}
+        voci.append(voce)
+        if st is not None:
+            sorgente = (meta.get("namespace"), meta["path"])
+            if sorgente not in recenti or recenti[sorgente]["scritta"] < scritta:
+                recenti[sorgente] = voce
+
+    for voce in voci:
+        meta = voce["meta"]
+        voce["orfana"] = (voce["st"] is None or not os.path.exists(meta["path"])
+                          or recenti[(meta.get("namespace"), meta["path"])] is not voce)
+
+    eliminate = 0
+    totale = sum(v["st"].st_size for v in voci if not v["orfana"])
+    # prima le orfane, poi le meno usate di recente (la lettura aggiorna l'mtime del Parquet)
+    for voce in sorted(voci, key=lambda v: (not v["orfana"], v["st"].st_mtime if v["st"] else 0)):
+        if not voce["orfana"]:
+            if totale <= max_byte:
+                break
+            totale -= voce["st"].st_size
+        percorsi = [voce["meta_path"]]
+        if voce["meta"] is not None:
+            percorsi.append(os.path.join(cache_dir, voce["meta"]["file"]))
+        for p in percorsi:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        eliminate += 1
+    return eliminate
+
+
+_ULTIMA_PULIZIA = {}
+
+
+def _sfoltisci_se_scaduto(cache_dir: str):
+    adesso = time.monotonic()
+    with _LOCK:
+        if adesso - _ULTIMA_PULIZIA.get(cache_dir, -_SFOLTISCI_OGNI_S) < _SFOLTISCI_OGNI_S:
+            return
+        _ULTIMA_PULIZIA[cache_dir] = adesso
+    try:
+        sfoltisci_cache(cache_dir)
+    except OSError as e:
+        print(f"⚠️ Pulizia della cache non riuscita: {e}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "sfoltisci":
+        print(f"🧹 Voci orfane o meno usate rimosse dalla cache: {sfoltisci_cache()}")
+    else:
+        ns = sys.argv[1] if len(sys.argv) > 1 else None
+        print(f"🧹 Voci rimosse dalla cache: {purge_cache(ns)}")
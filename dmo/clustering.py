@@ -0,0 +1,193 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dmo.cache import versione_frame, impronta_modulo
+from dmo.cube import MESI
+from dmo.parallel import num_jobs
+from dmo.lazy import importa_differito
+from dmo.risultati import RISULTATI
+
+# scikit-learn serve solo per calcolare i cluster: le assegnazioni persistite si leggono senza importarlo
+sk_preprocessing = importa_differito("sklearn.preprocessing")
+sk_cluster = importa_differito("sklearn.cluster")
+sk_metrics = importa_differito("sklearn.metrics")
+
+
+# =========================
+# 🧬 Profili mensili standardizzati
+# =========================
+class ProfiliStagionali:
+    """
+    Profilo mensile medio di ogni entità (entità × 12 mesi, mesi mancanti = 0)
+    e la sua versione standardizzata per colonna, calcolati una volta per versione del dataset.
+    """
+
+    def __init__(self, profili: pd.DataFrame, versione: str):
+        self.profili = profili
+        self.versione = versione
+        self.scaler = sk_preprocessing.StandardScaler().fit(profili)
+        self.X = self.scaler.transform(profili)
+
+    @classmethod
+    def from_frame(cls, df, col_entita="Comune", col_mese="mese", col_misura="presenze", mesi=MESI):
+        profili = df.pivot_table(index=col_entita, columns=col_mese, values=col_misura, aggfunc="mean",
+                                 observed=False).fillna(0)
+        profili = profili.reindex(columns=mesi, fill_value=0)
+        profili.columns = pd.Index(list(mesi), name=col_mese)
+        return cls(profili, versione_frame(df))
+
+
+_PROFILI = {}
+_LOCK = threading.Lock()
+
+
+def profili_per_versione(df, col_entita="Comune", col_mese="mese", col_misura="presenze",
+                         mesi=MESI) -> ProfiliStagionali:
+    """
+    Profili standardizzati di `df`, ricostruiti solo quando cambia la versione del dataset.
+    """
+    versione = versione_frame(df)
+    chiave = (col_entita, col_mese, col_misura)
+    with _LOCK:
+        voce = _PROFILI.get(chiave)
+    if voce is not None and voce.versione == versione:
+        return voce
+
+    voce = ProfiliStagionali.from_frame(df, col_entita, col_mese, col_misura, mesi)
+    with _LOCK:
+        _PROFILI[chiave] = voce
+    return voce
+
+
+# =========================
+# 🔍 Scelta del numero di cluster
+# =========================
+def _valuta_k(X, k, random_state):
+    model = sk_cluster.KMeans(n_clusters=k, random_state=random_state, n_init=10).fit(X)
+    return {"k": k, "inerzia": float(model.inertia_), "silhouette": float(sk_metrics.silhouette_score(X, model.labels_))}
+
+
+def sweep_k(profili: ProfiliStagionali, ks=range(2, 9), jobs=1, random_state=42) -> pd.DataFrame:
+    """
+    Inerzia e silhouette di KMeans per ogni k di `ks` (valori non validi per il numero di entità
+    vengono scartati). I k sono valutati in parallelo su un pool di thread.
+    """
+    X = profili.X
+    ks = [k for k in ks if 2 <= k < len(X)]
+    if not ks:
+        return pd.DataFrame(columns=["k", "inerzia", "silhouette"])
+
+    n = num_jobs(jobs, len(ks))
+    if n <= 1:
+        righe = [_valuta_k(X, k, random_state) for k in ks]
+    else:
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            righe = list(pool.map(lambda k: _valuta_k(X, k, random_state), ks))
+    return pd.DataFrame(righe)
+
+
+# =========================
+# 🧩 Assegnazione dei cluster persistita per versione
+# =========================
+class AssegnazioneCluster:
+    """
+    Cluster di ogni entità per una versione del dataset, con i centroidi e i parametri
+    di standardizzazione usati (servono all'aggiornamento incrementale).
+    """
+
+    def __init__(self, cluster: pd.Series, centroidi, media, scala, versione, k, metodo):
+        self.cluster = cluster
+        self.centroidi = np.asarray(centroidi, dtype=float)
+        self.media = np.asarray(media, dtype=float)
+        self.scala = np.asarray(scala, dtype=float)
+        self.versione = versione
+        self.k = k
+        self.metodo = metodo
+
+    def to_dict(self) -> dict:
+        return {
+            "versione": self.versione,
+            "k": self.k,
+            "metodo": self.metodo,
+            "entita": [str(e) for e in self.cluster.index],
+            "cluster": [int(c) for c in self.cluster],
+            "centroidi": self.centroidi.tolist(),
+            "media": self.media.tolist(),
+            "scala": self.scala.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict, nome_indice=None):
+        cluster = pd.Series(d["cluster"], index=pd.Index(d["entita"], name=nome_indice), name="Cluster")
+        return cls(cluster, d["centroidi"], d["media"], d["scala"], d["versione"], d["k"], d["metodo"])
+
+
+def _adatta(profili: ProfiliStagionali, k, metodo, random_state, precedente=None) -> AssegnazioneCluster:
+    if metodo == "kmeans":
+        model = sk_cluster.KMeans(n_clusters=k, random_state=random_state, n_init=10).fit(profili.X)
+        media, scala = profili.scaler.mean_, profili.scaler.scale_
+        etichette = model.labels_
+
+    elif metodo == "minibatch":
+        if precedente is not None and len(precedente["centroidi"][0]) == profili.X.shape[1]:
+            # Aggiornamento incrementale: parte dai centroidi della versione precedente
+            # e li sposta con un passo di mini-batch sui profili nuovi, senza rifare il fit da zero
+            media, scala = np.asarray(precedente["media"]), np.asarray(precedente["scala"])
+            X = (profili.profili.to_numpy(dtype=float) - media) / scala
+            model = sk_cluster.MiniBatchKMeans(n_clusters=k, init=np.asarray(precedente["centroidi"]), n_init=1,
+                                               random_state=random_state)
+            model.partial_fit(X)
+        else:
+            media, scala = profili.scaler.mean_, profili.scaler.scale_
+            X = profili.X
+            model = sk_cluster.MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3).fit(X)
+        etichette = model.predict(X)
+
+    else:
+        raise ValueError(f"Metodo di clustering non supportato: {metodo}")
+
+    cluster = pd.Series(etichette, index=profili.profili.index, name="Cluster")
+    return AssegnazioneCluster(cluster, model.cluster_centers_, media, scala, profili.versione, k, metodo)
+
+
+_ASSEGNAZIONI = {}
+
+
+def cluster_per_versione(df, k, col_entita="Comune", col_mese="mese", col_misura="presenze", mesi=MESI,
+                         metodo="kmeans", nome="comuni", random_state=42) -> AssegnazioneCluster:
+    """
+    Assegnazione dei cluster di `df`: calcolata una sola volta per versione del dataset e salvata
+    nella cache dei risultati, così la dashboard non rifà il fit durante l'interazione.
+
+    `metodo="kmeans"` replica il fit completo (KMeans, n_init=10); `metodo="minibatch"` aggiorna
+    in modo incrementale i centroidi dell'ultima versione calcolata (es. dopo l'aggiunta di un anno).
+    """
+    versione = versione_frame(df)
+    chiave = (nome, k, metodo)
+    with _LOCK:
+        voce = _ASSEGNAZIONI.get(chiave)
+    if voce is not None and voce.versione == versione:
+        return voce
+
+    parametri = {"nome": nome, "k": k, "metodo": metodo, "entita": col_entita, "misura": col_misura,
+                 "random_state": random_state}
+    # Versione del codice di questo modulo: i centroidi di partenza devono venire dallo stesso algoritmo
+    codice = impronta_modulo(__name__)
+
+    def calcola():
+        profili = profili_per_versione(df, col_entita, col_mese, col_misura, mesi)
+        if len(profili.profili) < k:
+            raise ValueError("Numero di cluster troppo alto rispetto al numero di entità disponibili.")
+        precedente = RISULTATI.ultimo("clustering.cluster", parametri, versione,
+                                      versione_codice=codice) if metodo == "minibatch" else None
+        return _adatta(profili, k, metodo, random_state, precedente).to_dict()
+
+    d = RISULTATI.ricorda("clustering.cluster", versione, parametri, calcola, versione_codice=codice)
+    voce = AssegnazioneCluster.from_dict(d, nome_indice=col_entita)
+
+    with _LOCK:
+        _ASSEGNAZIONI[chiave] = voce
+    return voce
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from dmo.cube import MESI, densifica
+
+
+def variazione_pct(nuovo, base):
+    """
+    Variazione % elemento per elemento, NaN dove la base è 0.
+    """
+    nuovo = np.asarray(nuovo, dtype=float)
+    base = np.asarray(base, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(base != 0, (nuovo - base) / base * 100, np.nan)
+
+
+# =========================
+# ⚖️ Confronto tra anni sui mesi allineati
+# =========================
+class ConfrontoAnni:
+    """
+    Confronto tra anni di una misura [entità, anno, mese], per tutte le entità in una sola passata.
+
+    Come nella dashboard, per ogni entità si considerano solo i mesi "alimentati" dell'anno di
+    riferimento (valore > 0, di default l'anno più recente): i totali di tutti gli anni sono sommati
+    su quegli stessi mesi, quindi i confronti sono omogenei anche con l'anno in corso incompleto.
+    Le differenze e le variazioni % sono calcolate per ogni coppia di anni.
+    """
+
+    def __init__(self, valori, entita, anni, mesi, anno_riferimento=None):
+        self.valori = np.asarray(valori)
+        self.entita = pd.Index(entita)
+        self.anni = pd.Index(anni)
+        self.mesi = pd.Index(mesi)
+        self.anno_riferimento = self.anni.max() if anno_riferimento is None else anno_riferimento
+
+        if len(self.anni):
+            rif = self.anni.get_loc(self.anno_riferimento)
+            self.allineati = self.valori[:, rif, :] > 0                                  # [E, M]
+        else:
+            self.allineati = np.zeros((len(self.entita), len(self.mesi)), dtype=bool)
+        self.somme = np.where(self.allineati[:, None, :], self.valori, 0).sum(axis=2)    # [E, A]
+
+        # Tutte le coppie (base, confronto): differenza[e, i, j] = somme[e, j] − somme[e, i]
+        self.differenze = self.somme[:, None, :] - self.somme[:, :, None]
+        self.variazioni = variazione_pct(self.somme[:, None, :], self.somme[:, :, None])
+
+    @classmethod
+    def da_frame(cls, df, col_anno, col_mese, col_misura, col_entita=None, mesi=None, anni=None,
+                 anno_riferimento=None):
+        """
+        Confronto da un frame in formato lungo; senza `col_entita` tutte le righe formano un'unica entità ("Totale").
+        Con `anni` si confrontano solo gli anni indicati (anche se assenti dai dati).
+        """
+        if col_entita is None:
+            col_entita = "_entita"
+            df = df.assign(_entita="Totale")
+        mesi = MESI if mesi is None else mesi
+        somme, _, entita, anni_dati, mesi = densifica(df, col_entita, col_anno, col_mese, col_misura, mesi)
+        if anni is not None:
+            anni = pd.Index(sorted(anni))
+            pos = anni_dati.get_indexer(anni)
+            piena = np.zeros((len(entita), len(anni), len(mesi)), dtype=somme.dtype)
+            piena[:, pos >= 0, :] = somme[:, pos[pos >= 0], :]
+            somme, anni_dati = piena, anni
+        return cls(somme, entita, anni_dati, mesi, anno_riferimento)
+
+    @classmethod
+    def da_cubo(cls, cubo, entita=None, anni=None, mesi=None, anno_riferimento=None):
+        """
+        Confronto sulle celle selezionate di un `Cubo` (None = tutti i membri), senza ripassare le righe.
+        """
+        ie = cubo._indici_espliciti(cubo.entita, entita)
+        ia = cubo._indici_espliciti(cubo.anni, anni)
+        im = cubo._indici_espliciti(cubo.mesi, mesi)
+        return cls(cubo.valori[np.ix_(ie, ia, im)], cubo.entita[ie], cubo.anni[ia], cubo.mesi[im], anno_riferimento)
+
+    def _pos(self, anno):
+        return self.anni.get_loc(anno)
+
+    def mesi_allineati(self, entita=None) -> list:
+        """
+        Mesi usati per il confronto (di un'entità; senza indicarla, della prima).
+        """
+        ie = 0 if entita is None else self.entita.get_loc(entita)
+        return list(self.mesi[self.allineati[ie]])
+
+    def totali(self) -> pd.DataFrame:
+        """
+        Tabella entità × anno dei totali sui mesi allineati.
+        """
+        return pd.DataFrame(self.somme, index=self.entita, columns=self.anni)
+
+    def differenza(self, anno_base, anno=None) -> pd.Series:
+        anno = self.anno_riferimento if anno is None else anno
+        return pd.Series(self.differenze[:, self._pos(anno_base), self._pos(anno)], index=self.entita)
+
+    def variazione(self, anno_base, anno=None) -> pd.Series:
+        anno = self.anno_riferimento if anno is None else anno
+        return pd.Series(self.variazioni[:, self._pos(anno_base), self._pos(anno)], index=self.entita)
+
+    def tabella(self) -> pd.DataFrame:
+        """
+        Tutte le coppie di anni (base < confronto) per ogni entità, in formato lungo.
+        """
+        E, A = self.somme.shape
+        e, i, j = np.nonzero(np.broadcast_to(np.triu(np.ones((A, A), dtype=bool), k=1), (E, A, A)))
+        return pd.DataFrame({
+            "entita": self.entita[e],
+            "anno_base": self.anni[i],
+            "anno": self.anni[j],
+            "totale_base": self.somme[e, i],
+            "totale": self.somme[e, j],
+            "differenza": self.differenze[e, i, j],
+            "variazione_pct": self.variazioni[e, i, j],
+        })
+
+
+def aggiungi_variazioni(tabella: pd.DataFrame, col_base, col_nuovo,
+                        col_diff="Differenza", col_var="Variazione %") -> pd.DataFrame:
+    """
+    Aggiunge (in place) a una tabella di confronto le colonne differenza e variazione %
+    tra due colonne (es. due anni), riga per riga.
+
+    Se le due colonne sono intere e senza valori mancanti la differenza resta intera
+    (nel tipo comune delle due misure); altrimenti è float con NaN dove manca un valore.
+    """
+    col_b, col_n = tabella[col_base], tabella[col_nuovo]
+    base = col_b.to_numpy(dtype=float, na_value=np.nan)
+    nuovo = col_n.to_numpy(dtype=float, na_value=np.nan)
+    if (pd.api.types.is_integer_dtype(col_b) and pd.api.types.is_integer_dtype(col_n)
+            and not (col_b.isna().any() or col_n.isna().any())):
+        b = col_b.to_numpy(dtype=np.int64)
+        n = col_n.to_numpy(dtype=np.int64)
+        tipo = np.result_type(col_b.to_numpy().dtype, col_n.to_numpy().dtype)
+        # tipi senza segno (la differenza può essere negativa) → int64
+        tabella[col_diff] = n - b if tipo.kind != "i" else (n - b).astype(tipo)
+    else:
+        tabella[col_diff] = nuovo - base
+    tabella[col_var] = variazione_pct(nuovo, base)
+    return tabella
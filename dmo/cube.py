@@ -0,0 +1,209 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dmo.npystore import ArchivioMensile, scrivi_archivio
+
+MESI = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
+
+
+# =========================
+# 🔢 Da formato lungo a array denso
+# =========================
+def densifica(df, col_entita, col_anno, col_mese, col_misura, mesi=MESI):
+    """
+    Somma la misura in un array denso int64 [entità, anno, mese] in una sola passata vettoriale.
+    Restituisce (somme, osservato, entita, anni, mesi): `osservato` marca le celle con almeno una riga.
+    """
+    entita = pd.Index(sorted(df[col_entita].dropna().unique()))
+    anni = pd.Index(sorted(df[col_anno].dropna().unique()))
+    mesi = pd.Index(mesi)
+
+    ie = entita.get_indexer(df[col_entita])
+    ia = anni.get_indexer(df[col_anno])
+    im = mesi.get_indexer(df[col_mese].astype(str))
+    ok = (ie >= 0) & (ia >= 0) & (im >= 0)
+    ie, ia, im = ie[ok], ia[ok], im[ok]
+
+    somme = np.zeros((len(entita), len(anni), len(mesi)), dtype=np.int64)
+    np.add.at(somme, (ie, ia, im), df[col_misura].to_numpy()[ok].astype(np.int64))
+    osservato = np.zeros(somme.shape, dtype=bool)
+    osservato[ie, ia, im] = True
+    return somme, osservato, entita, anni, mesi
+
+
+# =========================
+# 🧊 Cubo pre-aggregato entità × anno × mese
+# =========================
+class Cubo:
+    """
+    Somme pre-calcolate di una misura su ogni combinazione entità × anno × mese.
+
+    L'array `valori` ha forma (E+1, A+1, M+1): l'ultimo indice di ogni asse è il
+    membro "Tutti" (roll-up), quindi qualunque totale marginale è una sola cella.
+    Una selezione parziale costa O(celle selezionate), non O(righe del frame).
+
+    Il cubo precalcolato da `python -m dmo build` è un archivio memory-mapped (`dmo.npystore`):
+    gli array sono letti senza copie e le pagine sono condivise da tutti i processi.
+    """
+
+    def __init__(self, valori, osservato, entita, anni, mesi=MESI,
+                 col_entita="comune", col_anno="anno", col_mese="mese", col_misura="presenze"):
+        self.valori = valori
+        self.osservato = osservato
+        self.entita = pd.Index(entita)
+        self.anni = pd.Index(anni)
+        self.mesi = pd.Index(mesi)
+        self.colonne = (col_entita, col_anno, col_mese, col_misura)
+
+    @classmethod
+    def from_frame(cls, df, col_entita="comune", col_anno="anno", col_mese="mese", col_misura="presenze",
+                   mesi=MESI):
+        """
+        Costruisce il cubo da un frame in formato lungo (una sola passata vettoriale).
+        """
+        somme, osservato, entita, anni, mesi = densifica(df, col_entita, col_anno, col_mese, col_misura, mesi)
+
+        E, A, M = somme.shape
+        valori = np.zeros((E + 1, A + 1, M + 1), dtype=np.int64)
+        valori[:E, :A, :M] = somme
+
+        # Roll-up: asse per asse, ogni somma include i totali già calcolati sugli assi precedenti
+        valori[E, :, :] = valori[:E].sum(axis=0)
+        valori[:, A, :] = valori[:, :A].sum(axis=1)
+        valori[:, :, M] = valori[:, :, :M].sum(axis=2)
+
+        return cls(valori, osservato, entita, anni, mesi, col_entita, col_anno, col_mese, col_misura)
+
+    # -------------------------
+    # Selezioni
+    # -------------------------
+    @staticmethod
+    def _indici(dim: pd.Index, selezione):
+        """
+        Indici sull'asse per la selezione; None o "tutti i membri" → solo il roll-up.
+        """
+        if selezione is None:
+            return np.array([len(dim)])
+        idx = dim.get_indexer(list(selezione))
+        idx = np.unique(idx[idx >= 0])
+        if len(idx) == len(dim):
+            return np.array([len(dim)])
+        return idx
+
+    @staticmethod
+    def _indici_espliciti(dim: pd.Index, selezione):
+        if selezione is None:
+            return np.arange(len(dim))
+        idx = dim.get_indexer(list(selezione))
+        return np.sort(np.unique(idx[idx >= 0]))
+
+    def totale(self, entita=None, anni=None, mesi=None) -> int:
+        """
+        Somma della misura sulla selezione (None = tutti i membri).
+        """
+        ie = self._indici(self.entita, entita)
+        ia = self._indici(self.anni, anni)
+        im = self._indici(self.mesi, mesi)
+        return int(self.valori[np.ix_(ie, ia, im)].sum())
+
+    def totali_per_entita_anno(self, entita, anni, mesi=None) -> pd.DataFrame:
+        """
+        Tabella entità × anno dei totali sui mesi selezionati.
+        """
+        ie = self._indici_espliciti(self.entita, entita)
+        ia = self._indici_espliciti(self.anni, anni)
+        im = self._indici(self.mesi, mesi)
+        blocco = self.valori[np.ix_(ie, ia, im)].sum(axis=2)
+        return pd.DataFrame(blocco, index=self.entita[ie], columns=self.anni[ia])
+
+    def tabella_mesi(self, entita=None, anni=None, mesi=None) -> pd.DataFrame:
+        """
+        Tabella mese × anno (somma sulle entità selezionate), nell'ordine dei mesi.
+        Compaiono solo gli anni con almeno una cella osservata; i mesi non selezionati valgono 0.
+        """
+        ia = self._indici_espliciti(self.anni, anni)
+        im = self._indici_espliciti(self.mesi, mesi)
+        presenti = self.osservato[np.ix_(self._indici_espliciti(self.entita, entita), ia, im)].any(axis=(0, 2))
+        ia = ia[presenti]
+        ie = self._indici(self.entita, entita)
+        blocco = self.valori[np.ix_(ie, ia, im)].sum(axis=0).T.astype(float)
+
+        tabella = pd.DataFrame(0.0, index=self.mesi, columns=self.anni[ia])
+        tabella.iloc[im, :] = blocco
+        tabella.index.name = self.colonne[2]
+        tabella.columns.name = self.colonne[1]
+        return tabella
+
+    def serie(self, entita=None, anni=None, mesi=None) -> pd.DataFrame:
+        """
+        Celle osservate della selezione in formato lungo (per i grafici),
+        ordinate per anno, entità e mese.
+        """
+        col_entita, col_anno, col_mese, col_misura = self.colonne
+        ie = self._indici_espliciti(self.entita, entita)
+        ia = self._indici_espliciti(self.anni, anni)
+        im = self._indici_espliciti(self.mesi, mesi)
+
+        # ordine (anno, entità, mese)
+        oss = self.osservato[np.ix_(ie, ia, im)].transpose(1, 0, 2)
+        va = self.valori[np.ix_(ie, ia, im)].transpose(1, 0, 2)
+        a, e, m = np.nonzero(oss)
+        return pd.DataFrame({
+            col_mese: pd.Categorical(self.mesi[im[m]], categories=self.mesi, ordered=True),
+            col_misura: va[a, e, m].astype(np.int64),
+            col_anno: self.anni[ia[a]],
+            col_entita: self.entita[ie[e]],
+        })
+
+    # -------------------------
+    # Persistenza
+    # -------------------------
+    def salva(self, path: str):
+        """
+        Scrive il cubo (roll-up compresi) come archivio memory-mapped nella cartella `path`.
+        """
+        scrivi_archivio(path, self.valori, self.osservato, self.entita, self.anni, self.mesi, colonne=self.colonne)
+
+    @classmethod
+    def carica(cls, path: str):
+        archivio = ArchivioMensile(path)
+        return cls(archivio.valori, archivio.osservato, archivio.entita, archivio.anni, archivio.mesi,
+                   *archivio.colonne)
+
+
+# =========================
+# 🗂️ Cubi memorizzati per versione del dataset
+# =========================
+_CUBI = {}
+_LOCK = threading.Lock()
+
+
+def _cubo_precalcolato(versione):
+    from dmo.artefatti import artefatto_per_versione   # import locale: artefatti dipende da questo modulo
+    return artefatto_per_versione("cubo", versione)
+
+
+def cubo_per_versione(df, **kwargs) -> Cubo:
+    """
+    Restituisce il cubo di `df`, costruito una sola volta per versione del dataset
+    (`df.attrs["versione"]`); si tiene solo l'ultima versione. Senza versione il cubo viene ricostruito.
+    Con le colonne di default si usa, se c'è, il cubo precalcolato per la stessa versione (`python -m dmo build`).
+    """
+    versione = df.attrs.get("versione")
+    if versione is None:
+        return Cubo.from_frame(df, **kwargs)
+
+    chiave = tuple(sorted(kwargs.items()))
+    with _LOCK:
+        voce = _CUBI.get(chiave)
+    if voce is not None and voce[0] == versione:
+        return voce[1]
+
+    cubo = None if kwargs else _cubo_precalcolato(versione)
+    if cubo is None:
+        cubo = Cubo.from_frame(df, **kwargs)
+    with _LOCK:
+        _CUBI[chiave] = (versione, cubo)
+    return cubo
@@ -0,0 +1,126 @@
+import weakref
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# 🔎 Indice invertito per i filtri della sidebar
+# =========================
+class IndiceFiltri:
+    """
+    Indice invertito delle righe di un frame per alcune colonne (es. anno, comune/Paese, mese):
+    per ogni valore, l'elenco ordinato delle righe che lo contengono.
+
+    Una selezione parte dalla colonna più selettiva (meno righe candidate) e verifica le altre
+    colonne solo su quelle righe, con una tabella di lookup sui codici: il costo dipende dalle
+    righe selezionate, non dalla dimensione del frame. Le selezioni recenti restano in una piccola LRU.
+    """
+
+    def __init__(self, df: pd.DataFrame, colonne, max_memo: int = 64):
+        self._df = weakref.ref(df)     # l'indice non deve tenere in vita il frame
+        self.colonne = list(colonne)
+        self.n = len(df)
+        self.codici, self.valori, self._posizioni, self._ordine, self._inizi = {}, {}, {}, {}, {}
+        for col in self.colonne:
+            serie = df[col]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                codici, valori = serie.cat.codes.to_numpy(), serie.cat.categories
+            else:
+                codici, valori = pd.factorize(serie, sort=True)
+            # NaN (codice -1) in coda, mai selezionabile
+            codici = np.where(codici < 0, len(valori), codici).astype(np.int32)
+            ordine = np.argsort(codici, kind="stable").astype(np.int64)
+            self.codici[col] = codici
+            self.valori[col] = pd.Index(valori)
+            self._posizioni[col] = {v: i for i, v in enumerate(valori)}
+            self._ordine[col] = ordine
+            self._inizi[col] = np.searchsorted(codici[ordine], np.arange(len(valori) + 2))
+
+        self._memo = OrderedDict()
+        self._max_memo = max_memo
+        self._lock = threading.Lock()
+
+    def _codici_selezionati(self, col, selezione):
+        posizioni = self._posizioni[col]
+        return np.unique(np.array([posizioni[v] for v in selezione if v in posizioni], dtype=np.int64))
+
+    def righe(self, **selezione) -> np.ndarray:
+        """
+        Posizioni (ordinate) delle righe che soddisfano tutte le selezioni, es.
+        `righe(Paese=["Germania"], Anno=[2024, 2025])`. Una colonna assente o None non filtra.
+        """
+        selezione = {c: v for c, v in selezione.items() if v is not None}
+        chiave = tuple(sorted((c, tuple(sorted(map(repr, v)))) for c, v in selezione.items()))
+        with self._lock:
+            if chiave in self._memo:
+                self._memo.move_to_end(chiave)
+                return self._memo[chiave]
+
+        codici = {c: self._codici_selezionati(c, v) for c, v in selezione.items()}
+        if not codici:
+            risultato = np.arange(self.n)
+        elif any(len(k) == 0 for k in codici.values()):
+            risultato = np.array([], dtype=np.int64)
+        else:
+            # colonna più selettiva: la si legge dall'indice invertito
+            conteggi = {c: int((self._inizi[c][k + 1] - self._inizi[c][k]).sum()) for c, k in codici.items()}
+            prima = min(conteggi, key=conteggi.get)
+            inizi = self._inizi[prima]
+            risultato = np.concatenate([self._ordine[prima][inizi[k]:inizi[k + 1]] for k in codici[prima]])
+            # le altre colonne: lookup dei codici solo sulle righe candidate
+            for col, k in codici.items():
+                if col == prima:
+                    continue
+                ammessi = np.zeros(len(self.valori[col]) + 1, dtype=bool)
+                ammessi[k] = True
+                risultato = risultato[ammessi[self.codici[col][risultato]]]
+            risultato.sort()
+
+        risultato.flags.writeable = False
+        with self._lock:
+            self._memo[chiave] = risultato
+            while len(self._memo) > self._max_memo:
+                self._memo.popitem(last=False)
+        return risultato
+
+    def filtra(self, **selezione) -> pd.DataFrame:
+        """
+        Sottoinsieme del frame per la selezione, con le righe nell'ordine originale
+        (equivalente alla catena di `isin` combinati con `&`).
+        """
+        return self._df().take(self.righe(**selezione))
+
+
+# =========================
+# 🗂️ Indici memorizzati per frame
+# =========================
+_INDICI = {}     # id(frame) → (weakref al frame, {colonne: indice}); la voce sparisce col frame
+_LOCK = threading.Lock()
+
+
+def _rimuovi(chiave):
+    with _LOCK:
+        _INDICI.pop(chiave, None)
+
+
+def indice_filtri(df: pd.DataFrame, colonne) -> IndiceFiltri:
+    """
+    Indice dei filtri di `df`, costruito una sola volta per oggetto frame e liberato insieme a esso.
+    Pensato per i dataset condivisi del registro, che sono in sola lettura: un frame modificato
+    in place dopo la costruzione dell'indice restituirebbe righe non aggiornate.
+    """
+    colonne = tuple(colonne)
+    with _LOCK:
+        voce = _INDICI.get(id(df))
+        if voce is None or voce[0]() is not df:
+            voce = (weakref.ref(df, lambda _, k=id(df): _rimuovi(k)), {})
+            _INDICI[id(df)] = voce
+        indice = voce[1].get(colonne)
+    if indice is None:
+        indice = IndiceFiltri(df, colonne)
+        with _LOCK:
+            voce[1][colonne] = indice
+    return indice
@@ -0,0 +1,163 @@
+import os
+import hashlib
+
+import pandas as pd
+
+from dmo.cache import (ROOT_DIR, PARQUET_DISPONIBILE, fingerprint, impronta_parser, _scrivi_atomico, _dump_json,
+                       _leggi_meta)
+from dmo.parallel import parse_files
+from dmo.tracing import tracciato
+
+STORE_DIR = os.environ.get("DMO_STORE_DIR", os.path.join(ROOT_DIR, ".cache", "store"))
+
+COL_PARTIZIONE = "__partizione__"
+
+
+def versione_da_impronte(impronte: dict) -> str:
+    """
+    Identificativo di versione di un insieme di file: hash dei (percorso, sha1) ordinati.
+    """
+    h = hashlib.sha1()
+    for path in sorted(impronte):
+        h.update(f"{path}|{impronte[path]['sha1']}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+# =========================
+# 🔄 Store consolidato con aggiornamento incrementale
+# =========================
+class IncrementalStore:
+    """
+    Mantiene su disco il DataFrame consolidato di un dataset, partizionato per file sorgente.
+
+    A ogni `refresh(paths)` confronta le impronte dei file con il manifest salvato e
+    rilegge solo le partizioni aggiunte o modificate, scartando quelle rimosse.
+    Il risultato coincide con `finalize(concat(parser(p) for p in paths))`.
+    Se cambia il codice del parser (`impronta_parser`) lo store viene ricostruito da zero.
+    """
+
+    def __init__(self, nome: str, sorgente: str, parser, finalize=None, store_dir: str = None):
+        chiave = hashlib.sha1(os.path.abspath(sorgente).encode("utf-8")).hexdigest()[:10]
+        self.nome = nome
+        self.parser = parser
+        self.finalize = finalize
+        self.dir = os.path.join(store_dir or STORE_DIR, f"{nome}-{chiave}")
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+        self.dati_path = os.path.join(self.dir, "dati.parquet")
+        # Statistiche dell'ultimo refresh (partizioni rilette / scartate / invariate)
+        self.ultimo_refresh = {}
+        self.errori = []
+
+    def _confronta(self, paths, manifest):
+        """
+        Classifica i file in invariati / aggiunti / modificati / rimossi rispetto al manifest.
+        """
+        precedenti = manifest.get("partizioni", {})
+        impronte, invariati, aggiunti, modificati = {}, [], [], []
+
+        for path in paths:
+            path = os.path.abspath(path)
+            st = os.stat(path)
+            prec = precedenti.get(path)
+            if prec and prec["size"] == st.st_size and prec["mtime_ns"] == st.st_mtime_ns:
+                impronte[path] = prec
+                invariati.append(path)
+                continue
+            fp = fingerprint(path)
+            impronte[path] = fp
+            if prec is None:
+                aggiunti.append(path)
+            elif prec["sha1"] == fp["sha1"]:
+                invariati.append(path)
+            else:
+                modificati.append(path)
+
+        rimossi = [p for p in precedenti if p not in impronte]
+        return impronte, invariati, aggiunti, modificati, rimossi
+
+    @tracciato("IncrementalStore.refresh")
+    def refresh(self, paths, jobs=1, executor="process") -> pd.DataFrame:
+        """
+        Aggiorna lo store sui file `paths` (nell'ordine dato) e restituisce il DataFrame finale.
+        Le partizioni da rileggere sono analizzate con `parse_files` (vedi `jobs`/`executor`);
+        i file in errore restano fuori dal manifest e vengono ritentati al refresh successivo.
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        manifest = _leggi_meta(self.manifest_path) or {}
+        if not os.path.exists(self.dati_path) or manifest.get("parser") != impronta_parser(self.parser):
+            manifest = {}
+
+        impronte, invariati, aggiunti, modificati, rimossi = self._confronta(paths, manifest)
+        da_leggere = [p for p in paths if p in aggiunti or p in modificati]
+        self.ultimo_refresh = {
+            "aggiunti": len(aggiunti), "modificati": len(modificati),
+            "rimossi": len(rimossi), "invariati": len(invariati),
+        }
+        self.errori = []
+
+        if manifest and not da_leggere and not rimossi:
+            data = pd.read_parquet(self.dati_path)
+            if impronte != manifest.get("partizioni"):
+                self._salva_manifest(impronte)
+            return self._finalizza(data, impronte)
+
+        # Righe delle partizioni invariate (i file non conformi non hanno righe)
+        parti = []
+        if manifest:
+            data = pd.read_parquet(self.dati_path)
+            data = data[data[COL_PARTIZIONE].isin(invariati)]
+            parti.append(data)
+
+        risultati, self.errori = parse_files(da_leggere, self.parser, jobs=jobs, executor=executor)
+        for path, df in zip(da_leggere, risultati):
+            if df is None:
+                continue
+            df = df.copy()
+            df[COL_PARTIZIONE] = path
+            parti.append(df)
+        for errore in self.errori:
+            impronte.pop(errore["file"], None)
+
+        parti = [p for p in parti if not p.empty]
+        if not parti:
+            self.purge()
+            return self._con_errori(pd.DataFrame())
+
+        data = pd.concat(parti, ignore_index=True)
+        # Ordine canonico delle partizioni = ordine di `paths` (sort stabile)
+        ordine = {p: i for i, p in enumerate(paths)}
+        data = data.iloc[data[COL_PARTIZIONE].map(ordine).argsort(kind="stable")].reset_index(drop=True)
+        data[COL_PARTIZIONE] = data[COL_PARTIZIONE].astype(str)
+
+        if PARQUET_DISPONIBILE:
+            os.makedirs(self.dir, exist_ok=True)
+            _scrivi_atomico(self.dati_path, lambda p: data.to_parquet(p, index=False))
+            self._salva_manifest(impronte)
+
+        return self._finalizza(data, impronte)
+
+    def _salva_manifest(self, impronte):
+        if not PARQUET_DISPONIBILE:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        manifest = {"nome": self.nome, "parser": impronta_parser(self.parser), "partizioni": impronte}
+        _scrivi_atomico(self.manifest_path, lambda p: _dump_json(manifest, p))
+
+    def _finalizza(self, data, impronte):
+        data = data.drop(columns=[COL_PARTIZIONE]).reset_index(drop=True)
+        if self.finalize is not None:
+            data = self.finalize(data)
+        data.attrs["versione"] = versione_da_impronte(impronte)
+        return self._con_errori(data)
+
+    def _con_errori(self, data):
+        data.attrs["errori"] = list(self.errori)
+        return data
+
+    def purge(self):
+        """
+        Elimina lo store consolidato: il prossimo refresh ricostruisce tutto.
+        """
+        for p in (self.dati_path, self.manifest_path):
+            if os.path.exists(p):
+                os.remove(p)
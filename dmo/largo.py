@@ -0,0 +1,230 @@
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dmo.cube import densifica
+from dmo.confronto import ConfrontoAnni
+from dmo.registry import congela
+from dmo.npystore import ArchivioMensile, scrivi_archivio
+
+
+# =========================
+# 🧮 Dati mensili in forma larga [entità, anno, mese]
+# =========================
+class MatriceMensile:
+    """
+    Una misura mensile come array 3-D [entità, anno, mese] (intero: int64 se costruita dai file,
+    int32 se aperta dall'archivio memory-mapped) con la maschera delle celle presenti nei file
+    sorgente. Le analisi lavorano direttamente sugli array, senza il giro melt → pivot; il formato lungo resta disponibile come vista calcolata al primo accesso (`lungo`).
+
+    Gli array sono in sola lettura: l'oggetto può essere condiviso tra sessioni dal registro.
+    Array interi (anche int32 memory-mapped, vedi `da_archivio`) sono usati così come sono, senza copie.
+    """
+
+    def __init__(self, valori, osservato, entita, anni, mesi, colonne=("Paese", "Anno", "Mese", "Presenze")):
+        valori = np.asarray(valori)
+        self.valori = valori if valori.dtype.kind in "iu" else valori.astype(np.int64)
+        self.osservato = np.asarray(osservato, dtype=bool)
+        self.valori.flags.writeable = False
+        self.osservato.flags.writeable = False
+        self.entita = pd.Index(entita)
+        self.anni = pd.Index(anni)
+        self.mesi = pd.Index(mesi)
+        self.colonne = tuple(colonne)
+        self.attrs = {}
+        self._pos_entita = {e: i for i, e in enumerate(self.entita)}
+        self._lungo = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def da_blocchi(cls, blocchi, mesi, colonne=("Paese", "Anno", "Mese", "Presenze")):
+        """
+        Impila i blocchi annuali (anno, etichette entità, codici dei mesi, valori [mesi × entità])
+        sull'unione ordinata delle entità. Più blocchi dello stesso anno vengono sommati.
+        """
+        entita = pd.Index(sorted({e for _, etichette, _, _ in blocchi for e in etichette}))
+        anni = pd.Index(sorted({int(anno) for anno, _, _, _ in blocchi}))
+        valori = np.zeros((len(entita), len(anni), len(mesi)), dtype=np.int64)
+        osservato = np.zeros(valori.shape, dtype=bool)
+
+        for anno, etichette, codici_mesi, blocco in blocchi:
+            ie = entita.get_indexer(etichette)
+            ia = anni.get_loc(int(anno))
+            im = np.asarray(codici_mesi)
+            ok = im >= 0
+            # righe = mesi, colonne = entità → [entità, mese]
+            np.add.at(valori, (ie[None, :], ia, im[ok][:, None]), blocco[ok])
+            osservato[ie[None, :], ia, im[ok][:, None]] = True
+        return cls(valori, osservato, entita, anni, mesi, colonne)
+
+    @classmethod
+    def da_frame(cls, df, col_entita="Paese", col_anno="Anno", col_mese="Mese", col_misura="Presenze", mesi=None):
+        mesi = list(df[col_mese].cat.categories) if mesi is None else mesi
+        somme, osservato, entita, anni, mesi = densifica(df, col_entita, col_anno, col_mese, col_misura, mesi)
+        matrice = cls(somme, osservato, entita, anni, mesi, (col_entita, col_anno, col_mese, col_misura))
+        matrice.attrs = dict(df.attrs)
+        return matrice
+
+    @property
+    def versione(self) -> str:
+        """
+        Versione dei dati: quella del loader (`attrs["versione"]`) se presente, altrimenti
+        un hash di valori, celle presenti ed etichette (calcolato una volta).
+        """
+        if not self.attrs.get("versione"):
+            h = hashlib.sha1(self.valori.tobytes())
+            h.update(np.packbits(self.osservato).tobytes())
+            for etichette in (self.entita, self.anni, self.mesi):
+                h.update("|".join(map(str, etichette)).encode("utf-8"))
+            self.attrs["versione"] = h.hexdigest()[:16]
+        return self.attrs["versione"]
+
+    # -------------------------
+    # Vista lunga (per i grafici)
+    # -------------------------
+    @property
+    def lungo(self) -> pd.DataFrame:
+        """
+        Formato lungo [Mese, Anno, Paese, Presenze] delle sole celle presenti, ordinato per anno,
+        entità e mese; calcolato al primo accesso e poi riusato (in sola lettura).
+        """
+        if self._lungo is None:
+            with self._lock:
+                if self._lungo is None:
+                    col_entita, col_anno, col_mese, col_misura = self.colonne
+                    a, e, m = np.nonzero(self.osservato.transpose(1, 0, 2))
+                    df = pd.DataFrame({
+                        col_mese: pd.Categorical.from_codes(m, categories=self.mesi, ordered=True),
+                        col_anno: self.anni.to_numpy(dtype=np.int64)[a],
+                        col_entita: self.entita.to_numpy(dtype=object)[e],
+                        col_misura: self.valori[e, a, m].astype(np.int64),
+                    })
+                    df.attrs = dict(self.attrs)
+                    self._lungo = congela(df)
+        return self._lungo
+
+    # -------------------------
+    # Selezioni
+    # -------------------------
+    def indici_entita(self, entita=None) -> np.ndarray:
+        if entita is None:
+            return np.arange(len(self.entita))
+        return np.array([self._pos_entita[e] for e in entita if e in self._pos_entita], dtype=int)
+
+    def indici_anni(self, anni=None) -> np.ndarray:
+        if anni is None:
+            return np.arange(len(self.anni))
+        idx = self.anni.get_indexer(list(anni))
+        return np.sort(idx[idx >= 0])
+
+    def indici_mesi(self, mesi=None) -> np.ndarray:
+        if mesi is None:
+            return np.arange(len(self.mesi))
+        idx = self.mesi.get_indexer(list(mesi))
+        return np.sort(idx[idx >= 0])
+
+    def sottoinsieme(self, entita=None, escludi=None) -> "MatriceMensile":
+        """
+        Stessa matrice ristretta ad alcune entità (o senza quelle che contengono `escludi`).
+        """
+        ie = self.indici_entita(entita)
+        if escludi is not None:
+            ie = ie[~self.entita[ie].str.contains(escludi, case=False, na=False)]
+        sotto = MatriceMensile(self.valori[ie], self.osservato[ie], self.entita[ie], self.anni, self.mesi, self.colonne)
+        sotto.attrs = {k: v for k, v in self.attrs.items() if k != "versione"}   # altri dati, altra versione
+        return sotto
+
+    def mesi_presenti(self) -> list:
+        return list(self.mesi[self.osservato.any(axis=(0, 1))])
+
+    def confronto(self, entita=None, anni=None, aggrega=False) -> ConfrontoAnni:
+        """
+        Confronto tra anni sui mesi allineati; con `aggrega=True` le entità selezionate sono sommate in una ("Totale").
+        """
+        ie, ia = self.indici_entita(entita), self.indici_anni(anni)
+        blocco = self.valori[np.ix_(ie, ia)]
+        if aggrega:
+            return ConfrontoAnni(blocco.sum(axis=0, keepdims=True), ["Totale"], self.anni[ia], self.mesi)
+        return ConfrontoAnni(blocco, self.entita[ie], self.anni[ia], self.mesi)
+
+    # -------------------------
+    # Tabelle
+    # -------------------------
+    def totali_anno(self, entita=None, anni=None, escludi=None) -> pd.DataFrame:
+        """
+        Totale annuo (tutti i mesi) per anno ed entità, solo per le coppie presenti nei dati
+        (come `groupby([anno, entità]).sum()` sul formato lungo).
+        """
+        col_entita, col_anno, _, col_misura = self.colonne
+        ie = self.indici_entita(entita)
+        if escludi is not None:
+            ie = ie[~self.entita[ie].str.contains(escludi, case=False, na=False)]
+        ia = self.indici_anni(anni)
+        somme = self.valori[np.ix_(ie, ia)].sum(axis=2)
+        presenti = self.osservato[np.ix_(ie, ia)].any(axis=2)
+        a, e = np.nonzero(presenti.T)
+        return pd.DataFrame({
+            col_anno: self.anni[ia[a]],
+            col_entita: self.entita[ie[e]],
+            col_misura: somme[e, a],
+        })
+
+    def tabella_mesi_entita(self, entita=None, anni=None, mesi=None) -> pd.DataFrame:
+        """
+        Tabella (mese, entità) × anno delle celle selezionate, come
+        `pivot_table(index=[mese, entità], columns=anno, aggfunc="sum").fillna(0).reset_index()`
+        sul formato lungo filtrato: entità e anni presenti nella selezione; il mese è categorico
+        (observed=False), quindi compaiono tutti i mesi, a 0 quelli non selezionati.
+        """
+        col_entita, col_anno, col_mese, _ = self.colonne
+        ie = self.indici_entita(entita)
+        ia = self.indici_anni(anni)
+        im = self.indici_mesi(mesi)
+        presenti = self.osservato[np.ix_(ie, ia, im)]
+        valori = np.where(presenti, self.valori[np.ix_(ie, ia, im)], 0)
+
+        righe = presenti.any(axis=(1, 2))
+        colonne = np.flatnonzero(presenti.any(axis=(0, 2)))
+        ordine = np.argsort(self.entita[ie[righe]])
+        ie, valori = ie[righe][ordine], valori[righe][ordine]
+
+        pieno = np.zeros((len(ie), len(ia), len(self.mesi)), dtype=np.int64)
+        pieno[:, :, im] = valori
+        m = np.repeat(np.arange(len(self.mesi)), len(ie))
+        e = np.tile(np.arange(len(ie)), len(self.mesi))
+
+        tabella = pd.DataFrame({
+            col_mese: pd.Categorical.from_codes(m, categories=self.mesi, ordered=True),
+            col_entita: self.entita[ie[e]],
+        })
+        for j in colonne:
+            tabella[self.anni[ia[j]]] = pieno[e, j, m]
+        tabella.columns.name = col_anno
+        return tabella
+
+    # -------------------------
+    # Persistenza
+    # -------------------------
+    def salva(self, path: str):
+        """
+        Scrive la matrice come archivio memory-mapped (cartella `path`, vedi `dmo.npystore`).
+        """
+        scrivi_archivio(path, self.valori, self.osservato, self.entita, self.anni, self.mesi,
+                        versione=self.versione, colonne=self.colonne, attrs=self.attrs)
+
+    @classmethod
+    def carica(cls, path: str) -> "MatriceMensile":
+        return cls.da_archivio(ArchivioMensile(path))
+
+    @classmethod
+    def da_archivio(cls, archivio: ArchivioMensile) -> "MatriceMensile":
+        """
+        Matrice sugli array memory-mapped dell'archivio: nessuna copia, le pagine sono condivise
+        da tutti i processi che aprono lo stesso archivio.
+        """
+        matrice = cls(archivio.valori, archivio.osservato, archivio.entita, archivio.anni, archivio.mesi,
+                      archivio.colonne or ("Paese", "Anno", "Mese", "Presenze"))
+        matrice.attrs = dict(archivio.attrs)
+        return matrice
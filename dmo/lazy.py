@@ -0,0 +1,49 @@
+import types
+import importlib
+import threading
+
+from dmo.tracing import sezione
+
+_LOCK = threading.Lock()
+
+
+# =========================
+# 💤 Import differiti
+# =========================
+class ModuloDifferito(types.ModuleType):
+    """
+    Segnaposto di un modulo pesante: l'import vero avviene al primo accesso a un attributo
+    (es. `plt.subplots`), e il suo tempo compare come sezione nella traccia attiva.
+    """
+
+    def __init__(self, nome: str):
+        super().__init__(nome)
+        self.__dict__["_modulo"] = None
+
+    def _carica(self):
+        modulo = self.__dict__["_modulo"]
+        if modulo is None:
+            with _LOCK:
+                modulo = self.__dict__["_modulo"]
+                if modulo is None:
+                    with sezione(f"import {self.__name__}"):
+                        modulo = importlib.import_module(self.__name__)
+                    self.__dict__["_modulo"] = modulo
+        return modulo
+
+    def __getattr__(self, attr):
+        return getattr(self._carica(), attr)
+
+    def __dir__(self):
+        return dir(self._carica())
+
+    def __repr__(self):
+        stato = "caricato" if self.__dict__["_modulo"] is not None else "non ancora caricato"
+        return f"<modulo differito '{self.__name__}' ({stato})>"
+
+
+def importa_differito(nome: str) -> ModuloDifferito:
+    """
+    `plt = importa_differito("matplotlib.pyplot")` al posto di `import matplotlib.pyplot as plt`.
+    """
+    return ModuloDifferito(nome)
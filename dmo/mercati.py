@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+
+from dmo.cube import densifica
+from dmo.risultati import RISULTATI
+
+MESI_ESTESI = [
+    "Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio", "Giugno",
+    "Luglio", "Agosto", "Settembre", "Ottobre", "Novembre", "Dicembre"
+]
+
+
+def _posizioni(presente):
+    """
+    Per ogni riga: indice del primo, dell'ultimo e del penultimo anno presente (-1 se assente).
+    """
+    A = presente.shape[1]
+    idx = np.where(presente, np.arange(A), -1)
+    ultimo = idx.max(axis=1)
+    penultimo = np.where(idx < ultimo[:, None], idx, -1).max(axis=1)
+    primo = np.where(presente, np.arange(A), A).min(axis=1)
+    return primo, ultimo, penultimo
+
+
+# =========================
+# 📈 Motore vettoriale dei trend per mercato
+# =========================
+class MotoreMercati:
+    """
+    Calcola in un'unica passata, per tutti i Paesi, gli indicatori delle sezioni
+    "mercati promettenti" e "pattern turistici" su una matrice Paese × anno × mese.
+
+    Le formule replicano quelle della dashboard (regressione lineare presenze ~ anno,
+    variazione % ultimo anno, CAGR, indice di stagionalità, continuità di crescita),
+    considerando solo i mesi alimentati nell'ultimo anno disponibile.
+    """
+
+    def __init__(self, valori, osservato, paesi, anni, mesi=MESI_ESTESI):
+        valori = np.asarray(valori)
+        self.valori = valori if valori.dtype.kind in "iu" else valori.astype(np.int64)
+        self.osservato = np.asarray(osservato, dtype=bool)
+        self.paesi = pd.Index(paesi)
+        self.anni = pd.Index(anni)
+        self.mesi = pd.Index(mesi)
+
+        # Mesi attivi: totale > 0 (su tutti i Paesi) nell'ultimo anno disponibile; senza anni
+        # (dataset vuoto o tutti i Paesi esclusi) nessun mese è attivo e le tabelle sono vuote
+        if len(self.anni):
+            self.ultimo_anno = int(self.anni.max())
+            tot_ultimo = self.valori[:, -1, :].sum(axis=0)
+        else:
+            self.ultimo_anno = None
+            tot_ultimo = np.zeros(len(self.mesi), dtype=np.int64)
+        self.attivi = tot_ultimo > 0
+        self.mesi_attivi = list(self.mesi[self.attivi])
+
+        self._indicatori = None
+
+    @classmethod
+    def from_frame(cls, df, col_paese="Paese", col_anno="Anno", col_mese="Mese", col_misura="Presenze",
+                   mesi=MESI_ESTESI):
+        somme, osservato, paesi, anni, mesi = densifica(df, col_paese, col_anno, col_mese, col_misura, mesi)
+        return cls(somme, osservato, paesi, anni, mesi)
+
+    @classmethod
+    def from_archivio(cls, archivio):
+        return cls(archivio.valori, archivio.osservato, archivio.entita, archivio.anni, archivio.mesi)
+
+    # -------------------------
+    # Indicatori per Paese
+    # -------------------------
+    def indicatori(self) -> pd.DataFrame:
+        """
+        Tutti gli indicatori per i Paesi con almeno 3 anni di dati nei mesi attivi
+        (in ordine alfabetico di Paese, come il groupby originale); frame vuoto se non ce ne sono.
+        """
+        if self._indicatori is not None:
+            return self._indicatori
+
+        att = self.attivi
+        y = self.valori[:, :, att].sum(axis=2).astype(float)           # [P, A]
+        presente = self.osservato[:, :, att].any(axis=2)                # [P, A]
+        n = presente.sum(axis=1)
+        validi = n >= 3
+        if not validi.any():
+            self._indicatori = pd.DataFrame({
+                "Paese": pd.Series(dtype=object), "slope": pd.Series(dtype=float),
+                "var_recente": pd.Series(dtype=float), "y_ultimo": pd.Series(dtype=np.int64),
+                "cagr": pd.Series(dtype=float), "stagionalita": pd.Series(dtype=float),
+                "continuita": pd.Series(dtype=float),
+            })
+            return self._indicatori
+        y, presente, n = y[validi], presente[validi], n[validi]
+        x = self.anni.to_numpy(dtype=float)[None, :]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # OLS in forma chiusa: pendenza = Σ(x-x̄)(y-ȳ) / Σ(x-x̄)²
+            xm = (presente * x).sum(axis=1) / n
+            ym = (presente * y).sum(axis=1) / n
+            dx = np.where(presente, x - xm[:, None], 0.0)
+            dy = np.where(presente, y - ym[:, None], 0.0)
+            slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+            righe = np.arange(len(y))
+            primo, ultimo, penultimo = _posizioni(presente)
+            y_primo, y_ultimo, y_penultimo = y[righe, primo], y[righe, ultimo], y[righe, penultimo]
+
+            var_recente = np.where(y_penultimo != 0, (y_ultimo - y_penultimo) / y_penultimo * 100, np.nan)
+            cagr = ((y_ultimo / y_primo) ** (1 / (n - 1)) - 1) * 100
+
+            # Continuità: quota di anni (tra quelli presenti) in crescita sul precedente presente
+            idx = np.where(presente, np.arange(presente.shape[1]), -1)
+            prec = np.maximum.accumulate(np.concatenate([np.full((len(y), 1), -1), idx[:, :-1]], axis=1), axis=1)
+            y_prec = np.take_along_axis(y, np.maximum(prec, 0), axis=1)
+            crescite = (presente & (prec >= 0) & (y > y_prec)).sum(axis=1)
+            continuita = crescite / np.maximum(n - 1, 1)
+
+            # Stagionalità: CV% dei 12 mesi (i mesi non attivi contano come 0), media sugli anni presenti
+            mensili = np.where(att[None, None, :], self.valori[validi], 0).astype(float)
+            cv = mensili.std(axis=2, ddof=1) / mensili.mean(axis=2) * 100
+            validi_cv = presente & ~np.isnan(cv)
+            stagionalita = np.where(validi_cv, cv, 0.0).sum(axis=1) / validi_cv.sum(axis=1)
+
+        self._indicatori = pd.DataFrame({
+            "Paese": self.paesi[validi],
+            "slope": slope,
+            "var_recente": var_recente,
+            "y_ultimo": y_ultimo.astype(np.int64),
+            "cagr": cagr,
+            "stagionalita": stagionalita,
+            "continuita": continuita,
+        })
+        return self._indicatori
+
+    # -------------------------
+    # Tabelle della dashboard
+    # -------------------------
+    def tabella_potenziale(self) -> pd.DataFrame:
+        """
+        Tabella "Valutazione quantitativa dei mercati" con Indice potenziale, ordinata per indice.
+        """
+        ind = self.indicatori()
+        df = pd.DataFrame({
+            "Paese": ind["Paese"].to_numpy(),
+            "Trend medio (mesi attivi)": ind["slope"].to_numpy(),
+            "Variazione % ultimo anno": ind["var_recente"].to_numpy(),
+            "Presenze ultimo anno (mesi attivi)": ind["y_ultimo"].to_numpy(),
+        })
+        if df.empty:
+            df["Indice potenziale"] = pd.Series(dtype=float)
+            return df
+        df["Indice potenziale"] = (
+            (df["Trend medio (mesi attivi)"].rank(pct=True) * 0.5) +
+            (df["Variazione % ultimo anno"].rank(pct=True) * 0.5)
+        ) * 100
+        return df.sort_values("Indice potenziale", ascending=False)
+
+    def tabella_pattern(self) -> pd.DataFrame:
+        """
+        Tabella "Classificazione dei pattern turistici" (ordine alfabetico di Paese).
+        """
+        ind = self.indicatori()
+        slope = ind["slope"].to_numpy()
+        ratio = ind["continuita"].to_numpy()
+        categoria = np.select(
+            [(slope > 0) & (ratio > 0.7), (slope > 0) & (ratio <= 0.7), slope < 0],
+            ["📈 Crescita costante", "🔁 Ciclico / variabile", "📉 In calo o stagnante"],
+            default="🆕 Nuovo mercato",
+        )
+        return pd.DataFrame({
+            "Paese": ind["Paese"].to_numpy(),
+            "Trend medio": slope,
+            "Crescita % media annua (CAGR)": ind["cagr"].to_numpy(),
+            "Indice di stagionalità (%)": ind["stagionalita"].to_numpy(),
+            "Continuità crescita": [f"{r*100:.1f}%" for r in ratio],
+            "Pattern rilevato": categoria,
+        })
+
+
+# =========================
+# 🗄️ Tabelle per versione dei dati
+# =========================
+def tabelle_per_versione(matrice, escludi="Totale stranieri"):
+    """
+    Motore dei mercati di una `MatriceMensile` (senza le voci che contengono `escludi`) e le sue tabelle
+    "potenziale" e "pattern", servite dalla cache dei risultati per versione dei dati.
+    Restituisce (motore, tabella_potenziale, tabella_pattern).
+    """
+    motore = MotoreMercati.from_archivio(matrice.sottoinsieme(escludi=escludi))
+    parametri = {"escludi": escludi}
+    potenziale = RISULTATI.ricorda("mercati.tabella_potenziale", matrice.versione, parametri,
+                                   motore.tabella_potenziale)
+    pattern = RISULTATI.ricorda("mercati.tabella_pattern", matrice.versione, parametri, motore.tabella_pattern)
+    return motore, potenziale, pattern
+
+
+def classifica_presenze(matrice, n=10, escludi="Totale") -> pd.DataFrame:
+    """
+    Classifica dei `n` Paesi con più presenze di ogni anno (senza le voci che contengono `escludi`),
+    servita dalla cache dei risultati per versione dei dati.
+    Colonne [Anno, Paese, Presenze, Posizione], per anno e presenze decrescenti.
+    """
+    col_entita, col_anno, _, col_misura = matrice.colonne
+
+    def calcola():
+        df = (
+            matrice.totali_anno(escludi=escludi)
+            .sort_values([col_anno, col_misura], ascending=[True, False])
+        )
+        df["Posizione"] = df.groupby(col_anno)[col_misura].rank(method="first", ascending=False).astype(int)
+        return df.groupby(col_anno).head(n)
+
+    return RISULTATI.ricorda("mercati.classifica_presenze", matrice.versione, {"n": n, "escludi": escludi}, calcola)
+
+
+def migliori_mercati(potenziale: pd.DataFrame, n=10, aggregati="Altri"):
+    """
+    Dalla tabella del potenziale (già ordinata): i primi `n` mercati reali e, a parte,
+    i primi 5 gruppi aggregati (Paesi che contengono `aggregati`, es. "Altri Paesi d'Europa").
+    """
+    aggregato = potenziale["Paese"].str.contains(aggregati, case=False, na=False)
+    return potenziale[~aggregato].head(n), potenziale[aggregato].head(5)
@@ -0,0 +1,76 @@
+import os
+import json
+import shutil
+import threading
+
+import numpy as np
+
+
+# =========================
+# 🧱 Archivio denso [entità, anno, mese] in .npy memory-mapped
+# =========================
+class ArchivioMensile:
+    """
+    Serie mensili di un dataset come array intero [entità, anno, mese] aperto in sola lettura
+    con memory-map: tutti i processi condividono le stesse pagine della page cache del sistema.
+    È il formato su disco degli artefatti di `python -m dmo build` letti dalle dashboard:
+    la matrice dei paesi (`MatriceMensile`) e il cubo dei comuni (`Cubo`, con i roll-up).
+
+    Gli array non vengono copiati: le selezioni (es. `valori[i]`, un'entità su tutti gli anni)
+    sono viste sulle pagine condivise, senza allocazioni.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "dimensioni.json"), encoding="utf-8") as f:
+            dim = json.load(f)
+        self.nome = dim["nome"]
+        self.versione = dim["versione"]
+        self.entita = dim["entita"]
+        self.anni = dim["anni"]
+        self.mesi = dim["mesi"]
+        self.colonne = dim.get("colonne")
+        self.attrs = dim.get("attrs", {})
+        self.valori = np.load(os.path.join(path, "valori.npy"), mmap_mode="r")
+        self.osservato = np.load(os.path.join(path, "osservato.npy"), mmap_mode="r")
+
+
+def scrivi_archivio(path: str, valori, osservato, entita, anni, mesi, nome: str = None, versione: str = None,
+                    colonne=None, attrs=None) -> ArchivioMensile:
+    """
+    Scrive l'archivio denso nella cartella `path` e lo apre in sola lettura. La cartella è scritta
+    a parte e pubblicata con un rename atomico; se esiste già (stessa versione scritta da un altro
+    processo) viene solo aperta. I valori sono salvati in int32 se ci stanno, altrimenti in int64.
+    """
+    if os.path.exists(os.path.join(path, "dimensioni.json")):
+        return ArchivioMensile(path)
+
+    valori = np.asarray(valori)
+    info = np.iinfo(np.int32)
+    if valori.size == 0 or (valori.max() <= info.max and valori.min() >= info.min):
+        valori = valori.astype(np.int32)
+    dimensioni = {
+        "nome": nome or os.path.basename(path),
+        "versione": versione,
+        "entita": [str(e) for e in entita],
+        "anni": [int(a) for a in anni],
+        "mesi": [str(m) for m in mesi],
+        "colonne": list(colonne) if colonne is not None else None,
+        "attrs": attrs or {},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "valori.npy"), valori)
+    np.save(os.path.join(tmp, "osservato.npy"), np.asarray(osservato, dtype=bool))
+    with open(os.path.join(tmp, "dimensioni.json"), "w", encoding="utf-8") as f:
+        json.dump(dimensioni, f, ensure_ascii=False, default=str)
+
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Un altro processo ha pubblicato la stessa versione nel frattempo
+        shutil.rmtree(tmp, ignore_errors=True)
+    return ArchivioMensile(path)
@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from dmo.tracing import tracciato
+
+
+def num_jobs(jobs: int, n_task: int) -> int:
+    """
+    Numero effettivo di worker: `jobs=-1` (o None) usa tutti i core, mai più dei task.
+    """
+    if jobs is None or jobs < 0:
+        jobs = os.cpu_count() or 1
+    return max(1, min(jobs, n_task))
+
+
+def _esegui(parser, path):
+    """
+    Esegue il parser su un file catturando l'eccezione (come stringa, sempre serializzabile).
+    """
+    try:
+        return parser(path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+# =========================
+# ⚡ Parsing parallelo dei file
+# =========================
+@tracciato("parse_files")
+def parse_files(paths, parser, jobs=1, executor="process"):
+    """
+    Applica `parser` a ogni file di `paths`, in sequenza o su un pool di processi/thread.
+
+    Restituisce (risultati, errori): `risultati` è nell'ordine di `paths` (None per i file
+    saltati o in errore), `errori` una lista di {"file": ..., "errore": ...}: gli errori non vengono
+    stampati, li mostra il chiamante (le app dai `attrs["errori"]` dei dati caricati).
+    Con `executor="process"` il parser deve essere una funzione di modulo (serializzabile).
+    """
+    paths = list(paths)
+    n = num_jobs(jobs, len(paths))
+
+    if n <= 1:
+        esiti = [_esegui(parser, p) for p in paths]
+    else:
+        pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool_cls(max_workers=n) as pool:
+            # map conserva l'ordine dei file → concat deterministico
+            esiti = list(pool.map(_esegui, [parser] * len(paths), paths))
+
+    risultati, errori = [], []
+    for path, (df, errore) in zip(paths, esiti):
+        if errore is not None:
+            errori.append({"file": path, "errore": errore})
+        risultati.append(df)
+    return risultati, errori
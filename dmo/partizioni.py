@@ -0,0 +1,221 @@
+import os
+import re
+import hashlib
+
+import pandas as pd
+
+# "<qualcosa>-<anno>.txt", es. presenze-arrivi-provincia-belluno-2024.txt, stl-dolomiti-2024.txt
+_RE_FILE = re.compile(r"^(?P<nome>.+?)[-_](?P<anno>\d{4})\.txt$", re.IGNORECASE)
+
+
+# =========================
+# 🧩 Partizioni (ambito, area, anno)
+# =========================
+class Partizione:
+    """
+    Un file sorgente annuale di una provincia o di un'STL. Le informazioni vengono dal solo
+    percorso: costruire il catalogo non apre né legge i file. Per le partizioni di una versione
+    pubblicata dei sorgenti (`dmo.sorgenti`) è noto anche lo sha1 del contenuto.
+    """
+
+    __slots__ = ("ambito", "area", "anno", "path", "sha1")
+
+    def __init__(self, ambito: str, area: str, anno: int, path: str, sha1: str = None):
+        self.ambito = ambito
+        self.area = area
+        self.anno = anno
+        self.path = path
+        self.sha1 = sha1
+
+    def __repr__(self):
+        return f"Partizione({self.ambito}/{self.area}/{self.anno})"
+
+
+def _area_da_nome(nome: str, ambito: str) -> str:
+    """
+    "presenze-arrivi-provincia-belluno" → "belluno", "stl-dolomiti" → "dolomiti":
+    quello che segue l'ultimo "<ambito>-" nel nome (o il nome intero se manca).
+    """
+    nome = nome.lower()
+    prefisso = f"{ambito.lower()}-"
+    pos = nome.rfind(prefisso)
+    return nome[pos + len(prefisso):] if pos >= 0 else nome
+
+
+def _partizione(ambito: str, rel: str, path: str, sha1: str = None):
+    """
+    Partizione dal percorso `rel` relativo alla radice dell'ambito, o None se non è un file annuale.
+    Sono riconosciuti entrambi i layout del repository:
+    - file piatti nella radice:            <radice>/...-<ambito>-<area>-<anno>.txt
+    - una sottocartella per ogni area:     <radice>/<ambito>-<area>/...-<anno>.txt
+    """
+    parti = rel.replace(os.sep, "/").split("/")
+    m = _RE_FILE.match(parti[-1])
+    if m is None or len(parti) > 2:
+        return None
+    area = _area_da_nome(parti[0] if len(parti) == 2 else m["nome"], ambito)
+    return Partizione(ambito, area, int(m["anno"]), path, sha1)
+
+
+def _scartato(ambito: str, rel: str, path: str):
+    """
+    (ambito, area, path) di un file .txt che non è un file annuale riconosciuto (es. senza anno
+    nel nome), o None per gli altri file. L'area è quella della sottocartella o del nome, se si
+    ricava ("<ambito>-<area>"), altrimenti None: il file riguarda tutte le aree dell'ambito.
+    """
+    parti = rel.replace(os.sep, "/").split("/")
+    if not parti[-1].lower().endswith(".txt"):
+        return None
+    if len(parti) > 1:
+        return ambito, _area_da_nome(parti[0], ambito), path
+    nome = os.path.splitext(parti[-1])[0]
+    area = _area_da_nome(nome, ambito) if f"{ambito.lower()}-" in nome.lower() else None
+    return ambito, area, path
+
+
+def _partizioni_cartella(ambito: str, radice: str) -> tuple:
+    """
+    Partizioni di un ambito sotto `radice` (file piatti o una sottocartella per area) e file .txt
+    non riconosciuti (vedi `_scartato`).
+    """
+    if not os.path.isdir(radice):
+        return [], []
+
+    partizioni, scartati = [], []
+    for voce in sorted(os.scandir(radice), key=lambda v: v.name):
+        if voce.is_dir():
+            relativi = [f"{voce.name}/{file}" for file in sorted(os.listdir(voce.path))]
+        else:
+            relativi = [voce.name]
+        for rel in relativi:
+            path = os.path.join(radice, rel)
+            p = _partizione(ambito, rel, path)
+            if p is not None:
+                partizioni.append(p)
+                continue
+            scarto = _scartato(ambito, rel, path)
+            if scarto is not None:
+                scartati.append(scarto)
+    return partizioni, scartati
+
+
+# =========================
+# 📚 Catalogo delle partizioni
+# =========================
+class Catalogo:
+    """
+    Elenco delle partizioni (ambito, area, anno) → file, ottenuto dai nomi di file e cartelle.
+
+    Le query della dashboard selezionano prima le partizioni dal catalogo (`seleziona`) e leggono
+    solo quei file: il costo di caricare un'area non dipende da quante altre aree sono su disco.
+    I file .txt che non si riesce ad assegnare a un'area e un anno restano in `scartati`
+    (ambito, area o None, path) e vengono segnalati da `non_riconosciuti`.
+    """
+
+    def __init__(self, partizioni, radici=None, scartati=None):
+        self.partizioni = sorted(partizioni, key=lambda p: (p.ambito, p.area, p.anno, p.path))
+        self.radici = dict(radici or {})
+        self.scartati = sorted(scartati or [], key=lambda s: (s[0], s[2]))
+
+    @classmethod
+    def scansiona(cls, radici: dict) -> "Catalogo":
+        """
+        Catalogo delle cartelle `radici` (ambito → cartella), es. {"provincia": ..., "stl": ...}.
+        """
+        partizioni, scartati = [], []
+        for ambito, radice in radici.items():
+            trovate, non_riconosciuti = _partizioni_cartella(ambito, radice)
+            partizioni += trovate
+            scartati += non_riconosciuti
+        return cls(partizioni, radici, scartati)
+
+    @classmethod
+    def da_versioni(cls, versioni: dict, radici=None) -> "Catalogo":
+        """
+        Catalogo di versioni pubblicate dei sorgenti (ambito → `dmo.sorgenti.Versione`): i percorsi
+        delle partizioni sono i file immutabili della versione, non quelli della cartella originale.
+        """
+        partizioni, scartati = [], []
+        for ambito, versione in versioni.items():
+            for rel in versione.relativi():
+                p = _partizione(ambito, rel, versione.path(rel), versione.file[rel]["sha1"])
+                if p is not None:
+                    partizioni.append(p)
+                    continue
+                scarto = _scartato(ambito, rel, versione.path(rel))
+                if scarto is not None:
+                    scartati.append(scarto)
+        return cls(partizioni, radici, scartati)
+
+    def ambiti(self) -> list:
+        return sorted({p.ambito for p in self.partizioni})
+
+    def aree(self, ambito: str) -> list:
+        return sorted({p.area for p in self.partizioni if p.ambito == ambito})
+
+    def anni(self, ambito: str, aree=None) -> list:
+        return sorted({p.anno for p in self.seleziona(ambito, aree)})
+
+    def seleziona(self, ambito: str, aree=None, anni=None) -> list:
+        """
+        Partizioni di un ambito ristrette alle aree e agli anni indicati (None = tutti), nell'ordine (area, anno).
+        """
+        aree = None if aree is None else {a.lower() for a in aree}
+        anni = None if anni is None else {int(a) for a in anni}
+        return [
+            p for p in self.partizioni
+            if p.ambito == ambito
+            and (aree is None or p.area in aree)
+            and (anni is None or p.anno in anni)
+        ]
+
+    def non_riconosciuti(self, ambito: str, aree=None) -> list:
+        """
+        File .txt dell'ambito non letti perché il nome non è "...-<area>-<anno>.txt": quelli delle
+        `aree` indicate e quelli di cui non si ricava l'area (None = tutti).
+        """
+        aree = None if aree is None else {a.lower() for a in aree}
+        return [
+            path for amb, area, path in self.scartati
+            if amb == ambito and (aree is None or area is None or area in aree)
+        ]
+
+    def firma(self, ambito: str, aree=None, anni=None) -> tuple:
+        """
+        Firma (percorso, dimensione, mtime) delle sole partizioni selezionate: cambia quando uno di
+        quei file viene aggiunto, rimosso o modificato, non quando cambiano le altre aree.
+        Per un catalogo costruito da versioni pubblicate la firma è l'identificativo del contenuto (`versione`).
+        """
+        versione = self.versione(ambito, aree, anni)
+        if versione is not None:
+            return versione
+        voci = []
+        for p in self.seleziona(ambito, aree, anni):
+            try:
+                st = os.stat(p.path)
+            except OSError:
+                continue
+            voci.append((p.path, st.st_size, st.st_mtime_ns))
+        return tuple(voci)
+
+    def versione(self, ambito: str, aree=None, anni=None):
+        """
+        Identificativo del contenuto delle partizioni selezionate (None se il catalogo non viene
+        da una versione pubblicata dei sorgenti): cambia solo se cambiano quei file.
+        """
+        selezione = self.seleziona(ambito, aree, anni)
+        if any(p.sha1 is None for p in selezione):
+            return None
+        h = hashlib.sha1()
+        for p in selezione:
+            h.update(f"{p.area}|{p.anno}|{os.path.basename(p.path)}|{p.sha1}\n".encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    def tabella(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [(p.ambito, p.area, p.anno, p.path) for p in self.partizioni],
+            columns=["ambito", "area", "anno", "path"],
+        )
+
+    def __len__(self):
+        return len(self.partizioni)
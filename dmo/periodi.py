@@ -0,0 +1,165 @@
+import weakref
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dmo.cube import MESI
+
+
+# =========================
+# 📅 Indice a somme prefisse sulla linea del tempo mensile
+# =========================
+class IndicePeriodi:
+    """
+    Somme cumulate di una misura per entità lungo una linea del tempo mensile continua
+    (gennaio del primo anno → dicembre dell'ultimo, mesi mancanti = 0).
+
+    Il totale di qualunque intervallo contiguo di mesi (anche a cavallo d'anno, es. la stagione
+    invernale Dic–Mar) è la differenza di due celle: O(1) per entità, indipendentemente dalle righe.
+    La riga in più in fondo è il roll-up di tutte le entità (`entita=None`).
+    """
+
+    def __init__(self, valori, entita, anni, mesi=MESI):
+        valori = np.asarray(valori, dtype=np.int64)
+        E, A, M = valori.shape
+        self.entita = pd.Index(entita)
+        self.anni = pd.Index(anni)
+        self.mesi = pd.Index(mesi)
+        self._pos_entita = {e: i for i, e in enumerate(self.entita)}
+        self._pos_mese = {m: i for i, m in enumerate(self.mesi)}
+        self.primo_anno = int(self.anni[0]) if A else 0
+
+        # Gli anni assenti dai dati restano buchi nella linea del tempo: la si costruisce continua
+        n_anni = int(self.anni[-1]) - self.primo_anno + 1 if A else 0
+        serie = np.zeros((E + 1, n_anni, M), dtype=np.int64)
+        serie[:E, self.anni.to_numpy(dtype=int) - self.primo_anno, :] = valori
+        serie[E] = serie[:E].sum(axis=0)
+        self.serie = serie.reshape(E + 1, n_anni * M)
+
+        self.cumulate = np.zeros((E + 1, n_anni * M + 1), dtype=np.int64)
+        np.cumsum(self.serie, axis=1, out=self.cumulate[:, 1:])
+
+    @classmethod
+    def from_cubo(cls, cubo):
+        E, A, M = len(cubo.entita), len(cubo.anni), len(cubo.mesi)
+        return cls(cubo.valori[:E, :A, :M], cubo.entita, cubo.anni, cubo.mesi)
+
+    # -------------------------
+    # Posizioni sulla linea del tempo
+    # -------------------------
+    @property
+    def n_mesi(self) -> int:
+        return self.serie.shape[1]
+
+    def _t(self, anno, mese):
+        """
+        Posizione (anche vettoriale) del mese sulla linea del tempo; può cadere fuori dall'intervallo coperto.
+        """
+        return (np.asarray(anno, dtype=int) - self.primo_anno) * len(self.mesi) + self._pos_mese[mese]
+
+    def _righe(self, entita):
+        if entita is None:
+            return np.array([len(self.entita)])
+        if isinstance(entita, (str, int, np.integer)):
+            entita = [entita]
+        return np.array([self._pos_entita[e] for e in entita if e in self._pos_entita], dtype=int)
+
+    def _tra(self, righe, t0, t1):
+        """
+        Somma sulle righe dei mesi [t0, t1] (estremi inclusi, ritagliati sulla linea del tempo).
+        """
+        t0 = np.clip(t0, 0, self.n_mesi)
+        t1 = np.clip(np.asarray(t1) + 1, 0, self.n_mesi)
+        cumulate = self.cumulate[righe]
+        return np.atleast_1d(cumulate[:, t1].sum(axis=0) - cumulate[:, t0].sum(axis=0))
+
+    # -------------------------
+    # Totali
+    # -------------------------
+    def totale(self, entita, da, a) -> int:
+        """
+        Totale dal mese `da` al mese `a` inclusi, entrambi come (anno, mese), es. ((2024, "Dic"), (2025, "Mar")).
+        """
+        return int(self._tra(self._righe(entita), self._t(*da), self._t(*a)).sum())
+
+    def ytd(self, entita, anno, fino_a_mese) -> int:
+        """
+        Totale da inizio anno fino a `fino_a_mese` incluso.
+        """
+        return self.totale(entita, (anno, self.mesi[0]), (anno, fino_a_mese))
+
+    def totale_mesi(self, entita, anno, mesi) -> int:
+        """
+        Totale di un anno su un insieme qualsiasi di mesi: due letture per ogni blocco di mesi consecutivi.
+        """
+        pos = np.unique([self._pos_mese[m] for m in mesi if m in self._pos_mese]).astype(int)
+        if not len(pos):
+            return 0
+        tagli = np.flatnonzero(np.diff(pos) > 1) + 1
+        inizi = np.r_[pos[0], pos[tagli]]
+        fini = np.r_[pos[tagli - 1], pos[-1]]
+        base = (int(anno) - self.primo_anno) * len(self.mesi)
+        return int(self._tra(self._righe(entita), base + inizi, base + fini).sum())
+
+    def totali_periodo(self, entita, mese_da, mese_a, anni=None) -> pd.DataFrame:
+        """
+        Tabella entità × anno dei totali del periodo `mese_da`–`mese_a` per ogni anno di fine periodo.
+        Se `mese_da` segue `mese_a` il periodo scavalca l'anno (Dic–Mar 2025 = dicembre 2024 → marzo 2025).
+        I periodi che iniziano prima dei dati disponibili valgono NaN.
+        """
+        anni = self.anni if anni is None else pd.Index(sorted(anni))
+        righe = self._righe(entita)
+        a = anni.to_numpy(dtype=int)
+        scavalca = self._pos_mese[mese_da] > self._pos_mese[mese_a]
+        t0 = self._t(a - 1 if scavalca else a, mese_da)
+        t1 = self._t(a, mese_a)
+
+        t0c = np.clip(t0, 0, self.n_mesi)
+        t1c = np.clip(t1 + 1, 0, self.n_mesi)
+        blocco = (self.cumulate[np.ix_(righe, t1c)] - self.cumulate[np.ix_(righe, t0c)]).astype(float)
+        blocco[:, (t0 < 0) | (t1 >= self.n_mesi)] = np.nan
+
+        indice = self.entita[righe] if entita is not None else pd.Index(["Totale"])
+        return pd.DataFrame(blocco, index=indice, columns=anni)
+
+    def ultimo_mese(self, entita, anno):
+        """
+        Ultimo mese con valore > 0 nell'anno (per i confronti "da inizio anno"); None se l'anno è vuoto.
+        """
+        base = (int(anno) - self.primo_anno) * len(self.mesi)
+        if not 0 <= base < self.n_mesi:
+            return None
+        valori = self.serie[self._righe(entita), base:base + len(self.mesi)].sum(axis=0)
+        pos = np.flatnonzero(valori > 0)
+        return self.mesi[pos[-1]] if len(pos) else None
+
+
+def etichetta_periodo(anno, mese_da, mese_a, mesi=MESI) -> str:
+    """
+    "2025" per un periodo nell'anno, "2024/25" per uno a cavallo d'anno.
+    """
+    if mesi.index(mese_da) > mesi.index(mese_a):
+        return f"{int(anno) - 1}/{str(anno)[-2:]}"
+    return str(anno)
+
+
+# =========================
+# 🗂️ Indice memorizzato per cubo
+# =========================
+_INDICI = weakref.WeakKeyDictionary()
+_LOCK = threading.Lock()
+
+
+def indice_per_cubo(cubo) -> IndicePeriodi:
+    """
+    Indice dei periodi di un `Cubo`, costruito una sola volta per cubo (quindi per versione del dataset)
+    e liberato insieme al cubo.
+    """
+    with _LOCK:
+        indice = _INDICI.get(cubo)
+    if indice is None:
+        indice = IndicePeriodi.from_cubo(cubo)
+        with _LOCK:
+            _INDICI[cubo] = indice
+    return indice
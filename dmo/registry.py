@@ -0,0 +1,355 @@
+import os
+import time
+import logging
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from dmo.tracing import sezione
+
+# Intervallo (s) del controllo delle sorgenti; 0 disattiva l'osservatore
+OSSERVA_INTERVALLO_S = float(os.environ.get("DMO_OSSERVA_S", "5"))
+# Caricamenti contemporanei (riscaldamento, prefetch, ricariche dell'osservatore)
+REGISTRO_WORKERS = int(os.environ.get("DMO_REGISTRO_WORKERS", "4"))
+
+_log = logging.getLogger(__name__)
+
+
+def firma_cartella(path: str) -> tuple:
+    """
+    Firma economica di una cartella (ricorsiva): nome, dimensione e mtime di ogni file.
+    Cambia quando un file viene aggiunto, rimosso o modificato.
+    """
+    voci = []
+    for radice, _, files in os.walk(path):
+        for f in files:
+            p = os.path.join(radice, f)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            voci.append((os.path.relpath(p, path), st.st_size, st.st_mtime_ns))
+    return tuple(sorted(voci))
+
+
+# =========================
+# 🧊 Dataset in sola lettura
+# =========================
+def congela(valore):
+    """
+    Versione in sola lettura di un DataFrame (o di una tupla/lista di DataFrame): le colonne NumPy
+    diventano array non scrivibili, senza copie successive. Qualunque scrittura sul dataset condiviso
+    solleva "assignment destination is read-only"; filtri e copie restano scrivibili.
+
+    Le categoriche (es. le dimensioni di `compact_frame`) sono ricostruite su codici non scrivibili;
+    le categorie sono un Index, già immutabile. Gli altri tipi estensione (interi nullable, stringhe
+    Arrow) non sono prodotti dai loader e vengono condivisi così come sono, senza protezione.
+    """
+    if isinstance(valore, (tuple, list)):
+        return type(valore)(congela(v) for v in valore)
+    if not isinstance(valore, pd.DataFrame):
+        return valore
+
+    colonne = {}
+    for col in valore.columns:
+        serie = valore[col]
+        if isinstance(serie.dtype, np.dtype):
+            arr = serie.to_numpy(copy=True)
+            arr.flags.writeable = False
+            colonne[col] = arr
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            codici = serie.cat.codes.to_numpy(copy=True)
+            codici.flags.writeable = False
+            colonne[col] = pd.Categorical.from_codes(codici, dtype=serie.dtype, validate=False)
+        else:
+            # altri tipi estensione: condivisi così come sono (vedi sopra)
+            colonne[col] = serie.array
+    congelato = pd.DataFrame(colonne, index=valore.index, columns=valore.columns, copy=False)
+    congelato.attrs = dict(valore.attrs)
+    return congelato
+
+
+def _riferibili(valore):
+    """
+    Oggetti di cui seguire la vita con weakref (i DataFrame, anche dentro tuple/liste).
+    """
+    if isinstance(valore, (tuple, list)):
+        return [o for v in valore for o in _riferibili(v)]
+    try:
+        return [weakref.ref(valore)]
+    except TypeError:
+        return []
+
+
+class _Istantanea:
+    """
+    Valore immutabile di un dataset con la firma delle sorgenti da cui è stato costruito.
+    """
+
+    def __init__(self, valore, firma, durata_s):
+        self.valore = valore
+        self.firma = firma
+        self.caricato_il = time.time()
+        self.durata_s = durata_s
+
+
+class _Voce:
+    def __init__(self, loader, firma, sola_lettura):
+        self.loader = loader
+        self.firma = firma
+        self.sola_lettura = sola_lettura
+        self.istantanea = None          # sostituita in blocco: i lettori vedono la vecchia o la nuova
+        self.lock = threading.Lock()    # un solo (ri)caricamento per volta
+        self.future = None
+        self.errore = None              # ultimo caricamento in background fallito
+        self.ritirate = []              # weakref dei valori delle versioni precedenti
+
+
+# =========================
+# 🗂️ Registro dei dataset condivisi dal processo
+# =========================
+class RegistroDataset:
+    """
+    Dataset caricati solo al primo utilizzo e condivisi da tutte le sessioni del processo:
+    ogni sessione riceve lo stesso oggetto immutabile (una sola copia in memoria).
+
+    Ogni voce ha un loader e, opzionalmente, una funzione di firma (es. `firma_cartella`).
+    Se la firma cambia, il nuovo valore viene costruito a parte e pubblicato con uno scambio
+    atomico: durante il ricaricamento le altre sessioni continuano a leggere la versione
+    precedente, che viene liberata quando l'ultima sessione smette di usarla.
+    `prefetch` avvia il caricamento in background, così la prima richiesta non attende;
+    `riscalda` carica in parallelo tutti i dataset registrati all'avvio del processo.
+
+    Con `osserva()` un thread controlla periodicamente le firme dei dataset già caricati e li
+    ricostruisce in background quando cambiano: le richieste non calcolano più la firma e non
+    pagano mai il ricaricamento, servono la versione corrente finché la nuova non è pronta.
+    """
+
+    def __init__(self, max_workers: int = None):
+        max_workers = REGISTRO_WORKERS if max_workers is None else max_workers
+        self._voci = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="registro")
+        self._osservatore = None
+        self._ferma = threading.Event()
+        self.intervallo_s = None
+        self.ultimo_controllo = None
+        self._riscaldati = set()
+
+    def registra(self, nome: str, loader, firma=None, sola_lettura=True):
+        """
+        Registra (o aggiorna) un dataset. Idempotente: il valore già caricato viene conservato.
+        """
+        with self._lock:
+            voce = self._voci.get(nome)
+            if voce is None:
+                self._voci[nome] = _Voce(loader, firma, sola_lettura)
+            else:
+                voce.loader, voce.firma, voce.sola_lettura = loader, firma, sola_lettura
+
+    def _voce(self, nome) -> _Voce:
+        try:
+            return self._voci[nome]
+        except KeyError:
+            raise KeyError(f"Dataset non registrato: {nome}") from None
+
+    def get(self, nome: str):
+        """
+        Restituisce il dataset condiviso, caricandolo se non è ancora in memoria o se la sua firma è cambiata.
+        Se un altro thread sta già ricaricando, restituisce subito la versione corrente;
+        al primo caricamento invece attende quello in corso invece di ripeterlo.
+        Con l'osservatore attivo, un dataset già caricato viene restituito subito: gli aggiornamenti
+        li porta il thread osservatore.
+        """
+        voce = self._voce(nome)
+        corrente = voce.istantanea
+        if corrente is not None and self.in_osservazione():
+            return corrente.valore
+        return self._aggiorna(nome, voce)
+
+    def _aggiorna(self, nome, voce):
+        firma = voce.firma() if voce.firma is not None else None
+        corrente = voce.istantanea
+        if corrente is not None and corrente.firma == firma:
+            return corrente.valore
+
+        if corrente is not None:
+            if not voce.lock.acquire(blocking=False):
+                return corrente.valore
+        else:
+            voce.lock.acquire()
+
+        try:
+            corrente = voce.istantanea
+            if corrente is not None and corrente.firma == firma:
+                return corrente.valore
+            t0 = time.perf_counter()
+            with sezione(f"registro: {nome}"):
+                valore = voce.loader()
+                if voce.sola_lettura:
+                    valore = congela(valore)
+            if corrente is not None:
+                voce.ritirate = [r for r in voce.ritirate if r() is not None] + _riferibili(corrente.valore)
+            voce.istantanea = _Istantanea(valore, firma, time.perf_counter() - t0)
+            return valore
+        finally:
+            voce.lock.release()
+
+    def caricato(self, nome: str) -> bool:
+        return self._voce(nome).istantanea is not None
+
+    def prefetch(self, *nomi):
+        """
+        Carica i dataset indicati in background (un solo caricamento per volta per dataset).
+        """
+        for nome in nomi:
+            voce = self._voce(nome)
+            if voce.future is not None and not voce.future.done():
+                continue
+            voce.future = self._pool.submit(self._get_silenzioso, nome)
+
+    def _get_silenzioso(self, nome):
+        voce = self._voce(nome)
+        try:
+            self._aggiorna(nome, voce)
+            voce.errore = None
+        except Exception as e:
+            voce.errore = str(e)
+            _log.warning("⚠️ Caricamento in background di '%s' fallito: %s", nome, e)
+
+    def riscalda(self, *nomi, attendi: bool = False) -> pd.DataFrame:
+        """
+        Riscaldamento: carica in parallelo i dataset indicati (default: tutti i registrati), ognuno una
+        sola volta per processo; chiamate successive (es. i rerun) non fanno nulla. Al termine registra
+        nel log (`logging`, logger `dmo.registry`) i tempi per dataset. Restituisce lo stato di prontezza (con `attendi=True` dopo il caricamento).
+        """
+        with self._lock:
+            richiesti = list(nomi or self._voci)
+            nomi = [n for n in richiesti if n not in self._riscaldati]
+            self._riscaldati.update(nomi)
+        if nomi:
+            t0 = time.perf_counter()
+            self.prefetch(*nomi)
+            futures = [self._voce(n).future for n in nomi]
+            stampato = threading.Lock()
+
+            def completato(_):
+                if all(f.done() for f in futures) and stampato.acquire(blocking=False):
+                    tempi = ", ".join(
+                        f"{n} {self._voce(n).istantanea.durata_s:.2f} s" if self._voce(n).istantanea is not None
+                        else f"{n} ⚠️ {self._voce(n).errore}"
+                        for n in nomi
+                    )
+                    _log.info("🔥 Dataset pronti in %.2f s (%s)", time.perf_counter() - t0, tempi)
+
+            for f in futures:
+                f.add_done_callback(completato)
+        if attendi:
+            wait([f for f in (self._voce(n).future for n in richiesti) if f is not None])
+        return self.stato()
+
+    # -------------------------
+    # Osservatore delle sorgenti
+    # -------------------------
+    def osserva(self, intervallo_s: float = None):
+        """
+        Avvia il thread osservatore (uno per processo; chiamate successive aggiornano solo l'intervallo).
+        Il controllo è per polling delle firme (nessuna dipendenza da inotify): funziona anche
+        su cartelle di rete e volumi montati. Con intervallo 0 (`DMO_OSSERVA_S=0`) non parte.
+        """
+        intervallo_s = OSSERVA_INTERVALLO_S if intervallo_s is None else intervallo_s
+        if intervallo_s <= 0:
+            return
+        with self._lock:
+            self.intervallo_s = intervallo_s
+            if self.in_osservazione():
+                return
+            self._ferma.clear()
+            self._osservatore = threading.Thread(target=self._osserva, name="registro-osservatore", daemon=True)
+            self._osservatore.start()
+
+    def _osserva(self):
+        while not self._ferma.wait(self.intervallo_s):
+            self.controlla()
+
+    def in_osservazione(self) -> bool:
+        return self._osservatore is not None and self._osservatore.is_alive()
+
+    def ferma_osservazione(self):
+        self._ferma.set()
+        if self._osservatore is not None:
+            self._osservatore.join()
+        self._osservatore = None
+
+    def controlla(self) -> list:
+        """
+        Un giro di controllo: i dataset caricati con la firma cambiata vengono ricostruiti in background
+        (vedi `prefetch`) e sostituiti in blocco quando sono pronti. Restituisce i loro nomi.
+        """
+        cambiati = []
+        for nome, voce in list(self._voci.items()):
+            ist = voce.istantanea
+            if ist is None or voce.firma is None:
+                continue
+            try:
+                firma = voce.firma()
+            except Exception as e:
+                _log.warning("⚠️ Controllo delle sorgenti di '%s' fallito: %s", nome, e)
+                continue
+            if firma != ist.firma:
+                cambiati.append(nome)
+        self.ultimo_controllo = time.time()
+        if cambiati:
+            self.prefetch(*cambiati)
+        return cambiati
+
+    def invalida(self, nome: str = None):
+        """
+        Dimentica il valore caricato (di un dataset o di tutti): verrà ricaricato alla prossima richiesta.
+        Le sessioni che lo stanno usando mantengono la loro copia finché non la rilasciano.
+        """
+        nomi = [nome] if nome is not None else list(self._voci)
+        for n in nomi:
+            voce = self._voce(n)
+            with voce.lock:
+                if voce.istantanea is not None:
+                    voce.ritirate += _riferibili(voce.istantanea.valore)
+                voce.istantanea = None
+
+    def stato(self) -> pd.DataFrame:
+        """
+        Stato dei dataset (pronto / in caricamento / errore / non caricato), durata del caricamento,
+        versioni precedenti ancora referenziate da qualche sessione.
+        """
+        righe = []
+        for nome, voce in list(self._voci.items()):
+            ist = voce.istantanea
+            valore = ist.valore if ist is not None else None
+            versione = getattr(valore, "attrs", {}).get("versione") if valore is not None else None
+            if ist is not None:
+                stato = "pronto"
+            elif voce.lock.locked() or (voce.future is not None and not voce.future.done()):
+                stato = "in caricamento"
+            elif voce.errore is not None:
+                stato = "errore"
+            else:
+                stato = "non caricato"
+            righe.append({
+                "dataset": nome,
+                "stato": stato,
+                "caricato": ist is not None,
+                "versione": versione,
+                "caricato_il": pd.Timestamp(ist.caricato_il, unit="s") if ist is not None else None,
+                "durata_s": ist.durata_s if ist is not None else None,
+                "in_aggiornamento": voce.lock.locked(),
+                "versioni_precedenti_vive": sum(r() is not None for r in voce.ritirate),
+                "errore": voce.errore,
+            })
+        return pd.DataFrame(righe)
+
+
+# Registro condiviso dal processo (sopravvive ai rerun e alle sessioni di Streamlit)
+REGISTRO = RegistroDataset()
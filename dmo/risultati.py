@@ -0,0 +1,334 @@
+import os
+import time
+import atexit
+import pickle
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from dmo.cache import ROOT_DIR, impronta_modulo, modulo_di
+
+RISULTATI_PATH = os.environ.get("DMO_RISULTATI_PATH", os.path.join(ROOT_DIR, ".cache", "risultati.sqlite"))
+RISULTATI_MAX_MB = float(os.environ.get("DMO_RISULTATI_MAX_MB", "512"))
+# Ogni quanti secondi (al massimo) le letture scrivono nel file ultimo uso e contatori accumulati
+RISULTATI_FLUSH_S = float(os.environ.get("DMO_RISULTATI_FLUSH_S", "5"))
+_BUSY_TIMEOUT_MS = 30000   # attesa massima delle scritture quando il file è occupato da un altro processo
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS risultati (
+    chiave     TEXT PRIMARY KEY,
+    funzione   TEXT NOT NULL,
+    versione   TEXT NOT NULL,
+    parametri  TEXT NOT NULL,
+    valore     BLOB NOT NULL,
+    byte       INTEGER NOT NULL,
+    creato     REAL NOT NULL,
+    usato      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS risultati_usato ON risultati (usato);
+CREATE INDEX IF NOT EXISTS risultati_funzione ON risultati (funzione, parametri, creato);
+CREATE TABLE IF NOT EXISTS contatori (
+    funzione   TEXT PRIMARY KEY,
+    hit        INTEGER NOT NULL DEFAULT 0,
+    miss       INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _parametri(parametri, versione_codice: str = "") -> str:
+    """
+    Forma canonica dei parametri (dizionario ordinato per nome) usata nella chiave, seguita
+    dalla versione del codice che calcola il risultato: cambiato il codice, i risultati vecchi
+    non corrispondono più (né come hit né per `ultimo`).
+    """
+    forma = repr(sorted((parametri or {}).items()))
+    return f"{forma}|codice={versione_codice}" if versione_codice else forma
+
+
+def _chiave(funzione: str, versione: str, parametri: str) -> str:
+    return hashlib.sha1(f"{funzione}|{versione}|{parametri}".encode("utf-8")).hexdigest()
+
+
+def _occupato(e: sqlite3.OperationalError) -> bool:
+    testo = str(e).lower()
+    return "locked" in testo or "busy" in testo
+
+
+@contextmanager
+def _transazione(conn, attendi: bool = True):
+    """
+    Transazione in scrittura (la connessione è in autocommit): un solo commit per più istruzioni.
+    Con `attendi=False` non aspetta che un altro processo rilasci il file: se è occupato
+    solleva subito `sqlite3.OperationalError` ("database is locked").
+    """
+    if not attendi:
+        conn.execute("PRAGMA busy_timeout = 0")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    finally:
+        if not attendi:
+            conn.execute(f"PRAGMA busy_timeout = {_BUSY_TIMEOUT_MS}")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# =========================
+# 🗄️ Cache dei risultati delle analisi
+# =========================
+class CacheRisultati:
+    """
+    Risultati delle analisi costose (cluster, decomposizioni, tabelle dei mercati) in un file SQLite
+    condiviso da tutti i processi, con chiave (funzione, versione del dataset, parametri).
+
+    Il file ha una dimensione massima: oltre il limite vengono eliminati i risultati usati meno
+    di recente (LRU). I contatori hit/miss per funzione sono salvati nello stesso file, quindi
+    riassumono l'attività di tutti i processi (`statistiche()`).
+
+    La chiave comprende anche la versione del codice (`versione_codice`; per `ricorda`, di default
+    l'hash del sorgente del modulo di `calcola`): dopo una modifica alle formule i risultati
+    calcolati con il codice precedente non vengono più serviti e spariscono con l'LRU.
+
+    Le letture non aprono transazioni in scrittura: ultimo uso e contatori sono accumulati in memoria
+    e scritti insieme al massimo ogni `RISULTATI_FLUSH_S` secondi (e a ogni `put`), senza attendere
+    se il file è occupato da un altro processo: in quel caso si riprova alla lettura successiva.
+    Se il file non è utilizzabile (disco pieno, sola lettura) i risultati vengono solo calcolati.
+    """
+
+    def __init__(self, path: str = None, max_mb: float = None):
+        self.path = path or RISULTATI_PATH
+        self.max_byte = int((RISULTATI_MAX_MB if max_mb is None else max_mb) * 1024 * 1024)
+        self._locale = threading.local()   # una connessione per thread
+        self._lock = threading.Lock()      # protegge gli aggiornamenti in sospeso
+        self._usati = {}                   # chiave → ultimo uso non ancora scritto
+        self._contatori = {}               # funzione → [hit, miss] non ancora scritti
+        self._ultimo_flush = time.monotonic()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._locale, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._locale.conn = conn
+        return conn
+
+    def _conta(self, funzione, esito, chiave=None):
+        with self._lock:
+            contatori = self._contatori.setdefault(funzione, [0, 0])
+            contatori[0 if esito == "hit" else 1] += 1
+            if chiave is not None:
+                self._usati[chiave] = time.time()
+
+    def _scrivi_sospesi(self, conn):
+        """
+        Scrive ultimo uso e contatori accumulati (da chiamare dentro una transazione in scrittura).
+        """
+        with self._lock:
+            usati, self._usati = self._usati, {}
+            contatori, self._contatori = self._contatori, {}
+            self._ultimo_flush = time.monotonic()
+        try:
+            conn.executemany("UPDATE risultati SET usato = MAX(usato, ?) WHERE chiave = ?",
+                             [(t, chiave) for chiave, t in usati.items()])
+            conn.executemany(
+                "INSERT INTO contatori (funzione, hit, miss) VALUES (?, ?, ?) "
+                "ON CONFLICT (funzione) DO UPDATE SET hit = hit + excluded.hit, miss = miss + excluded.miss",
+                [(funzione, hit, miss) for funzione, (hit, miss) in contatori.items()],
+            )
+        except BaseException:
+            # la transazione viene annullata: gli aggiornamenti tornano in sospeso
+            self._rimetti(usati, contatori)
+            raise
+
+    def _rimetti(self, usati, contatori):
+        with self._lock:
+            for chiave, t in usati.items():
+                self._usati[chiave] = max(t, self._usati.get(chiave, t))
+            for funzione, (hit, miss) in contatori.items():
+                voce = self._contatori.setdefault(funzione, [0, 0])
+                voce[0] += hit
+                voce[1] += miss
+
+    def flush(self, attendi: bool = True):
+        """
+        Scrive subito ultimo uso e contatori accumulati dalle letture.
+        Con `attendi=False`, se il file è occupato da un altro processo rinuncia e li lascia in sospeso.
+        """
+        with self._lock:
+            if not self._usati and not self._contatori:
+                return
+        conn = self._conn()
+        try:
+            with _transazione(conn, attendi=attendi):
+                self._scrivi_sospesi(conn)
+        except sqlite3.OperationalError as e:
+            if attendi or not _occupato(e):
+                raise
+            with self._lock:
+                self._ultimo_flush = time.monotonic()
+
+    def _flush_se_scaduto(self, forza: bool = False):
+        if not forza and time.monotonic() - self._ultimo_flush < RISULTATI_FLUSH_S:
+            return
+        try:
+            self.flush(attendi=False)
+        except sqlite3.Error as e:
+            print(f"⚠️ Statistiche della cache dei risultati non aggiornate: {e}")
+
+    # -------------------------
+    # Lettura / scrittura
+    # -------------------------
+    def get(self, funzione: str, versione: str, parametri=None, versione_codice: str = ""):
+        """
+        Restituisce (trovato, valore). Un risultato trovato diventa il più recente per l'LRU.
+
+        È una sola lettura: l'ultimo uso e il contatore hit/miss sono scritti in seguito (`flush`).
+        """
+        chiave = _chiave(funzione, versione, _parametri(parametri, versione_codice))
+        riga = self._conn().execute("SELECT valore FROM risultati WHERE chiave = ?", (chiave,)).fetchone()
+        trovato, valore = False, None
+        if riga is not None:
+            try:
+                trovato, valore = True, pickle.loads(riga[0])
+            except Exception:
+                # risultato di una versione del codice non più compatibile: si ricalcola (e `put` lo sostituisce)
+                pass
+        self._conta(funzione, "hit" if trovato else "miss", chiave if trovato else None)
+        self._flush_se_scaduto()
+        return trovato, valore
+
+    def put(self, funzione: str, versione: str, parametri, valore, versione_codice: str = ""):
+        """
+        Salva un risultato e, se serve, elimina i meno usati per restare sotto il limite.
+        I risultati più grandi dell'intero limite non vengono salvati.
+        """
+        blob = pickle.dumps(valore, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_byte:
+            return
+        parametri = _parametri(parametri, versione_codice)
+        adesso = time.time()
+        conn = self._conn()
+        with _transazione(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO risultati VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (_chiave(funzione, versione, parametri), funzione, versione, parametri,
+                 sqlite3.Binary(blob), len(blob), adesso, adesso),
+            )
+            # ultimo uso prima di sfoltire, così l'LRU vede le letture recenti
+            self._scrivi_sospesi(conn)
+            self._sfoltisci(conn)
+
+    def _sfoltisci(self, conn):
+        totale = conn.execute("SELECT COALESCE(SUM(byte), 0) FROM risultati").fetchone()[0]
+        if totale <= self.max_byte:
+            return
+        eliminare = []
+        for chiave, byte in conn.execute("SELECT chiave, byte FROM risultati ORDER BY usato"):
+            if totale <= self.max_byte:
+                break
+            eliminare.append((chiave,))
+            totale -= byte
+        conn.executemany("DELETE FROM risultati WHERE chiave = ?", eliminare)
+
+    def ricorda(self, funzione: str, versione: str, parametri, calcola, versione_codice: str = None):
+        """
+        Risultato di `calcola()` per (funzione, versione, parametri, versione del codice): dalla cache
+        se presente, altrimenti calcolato e salvato. Senza `versione_codice` si usa l'hash del sorgente
+        del modulo che definisce `calcola` (`impronta_modulo`).
+        """
+        if versione_codice is None:
+            versione_codice = impronta_modulo(modulo_di(calcola))
+        try:
+            trovato, valore = self.get(funzione, versione, parametri, versione_codice)
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache dei risultati non disponibile: {e}")
+            return calcola()
+        if trovato:
+            return valore
+
+        valore = calcola()
+        try:
+            self.put(funzione, versione, parametri, valore, versione_codice)
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            print(f"⚠️ Impossibile salvare il risultato di {funzione} in cache: {e}")
+        return valore
+
+    def ultimo(self, funzione: str, parametri=None, escludi_versione: str = None, versione_codice: str = ""):
+        """
+        Risultato più recente della stessa funzione con gli stessi parametri (e la stessa versione del
+        codice) per un'altra versione del dataset (None se non c'è), es. per un aggiornamento incrementale.
+        Non conta come hit.
+        """
+        righe = self._conn().execute(
+            "SELECT valore FROM risultati WHERE funzione = ? AND parametri = ? AND versione != ? "
+            "ORDER BY creato DESC",
+            (funzione, _parametri(parametri, versione_codice), escludi_versione or ""),
+        )
+        for (blob,) in righe:
+            try:
+                return pickle.loads(blob)
+            except Exception:
+                continue
+        return None
+
+    # -------------------------
+    # Manutenzione e statistiche
+    # -------------------------
+    def svuota(self, funzione: str = None) -> int:
+        """
+        Elimina i risultati (di una funzione o tutti) e restituisce quanti ne sono stati rimossi.
+        """
+        conn = self._conn()
+        with _transazione(conn):
+            if funzione is None:
+                return conn.execute("DELETE FROM risultati").rowcount
+            return conn.execute("DELETE FROM risultati WHERE funzione = ?", (funzione,)).rowcount
+
+    def azzera_contatori(self):
+        with self._lock:
+            self._contatori = {}
+        with _transazione(self._conn()) as conn:
+            conn.execute("DELETE FROM contatori")
+
+    def statistiche(self) -> pd.DataFrame:
+        """
+        Per funzione: risultati in cache, MB occupati, hit, miss e hit rate (%).
+        """
+        self.flush()
+        conn = self._conn()
+        voci = pd.read_sql_query(
+            "SELECT funzione, COUNT(*) AS voci, SUM(byte) / 1048576.0 AS MB FROM risultati GROUP BY funzione", conn,
+            dtype={"voci": "int64", "MB": "float64"},
+        )
+        contatori = pd.read_sql_query("SELECT funzione, hit, miss FROM contatori", conn,
+                                      dtype={"hit": "int64", "miss": "int64"})
+        stat = voci.merge(contatori, on="funzione", how="outer").fillna({"voci": 0, "MB": 0.0, "hit": 0, "miss": 0})
+        stat[["voci", "hit", "miss"]] = stat[["voci", "hit", "miss"]].astype(int)
+        richieste = stat["hit"] + stat["miss"]
+        stat["hit %"] = (stat["hit"] / richieste.where(richieste > 0) * 100).round(1)
+        return stat.sort_values("funzione", ignore_index=True)
+
+
+# Cache condivisa dal processo (e, tramite il file, da tutti i processi)
+RISULTATI = CacheRisultati()
+# Alla chiusura del processo si scrivono gli ultimi contatori (senza attendere se il file è occupato)
+atexit.register(RISULTATI._flush_se_scaduto, forza=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "svuota":
+        print(f"🧹 Risultati rimossi dalla cache: {RISULTATI.svuota(sys.argv[2] if len(sys.argv) > 2 else None)}")
+    else:
+        pd.set_option("display.width", 200)
+        print(RISULTATI.statistiche().to_string(index=False))
@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Dizionari condivisi per le dimensioni categoriche (nome → CategoricalDtype).
+# Frame diversi con la stessa dimensione riusano lo stesso oggetto `categories`.
+_DIZIONARI = {}
+_LOCK = threading.Lock()    # i loader girano anche nei thread del registro (riscaldamento, osservatore)
+
+
+def dizionario_condiviso(nome: str, valori) -> pd.CategoricalDtype:
+    """
+    Restituisce il CategoricalDtype condiviso per la dimensione `nome`,
+    estendendolo (in ordine alfabetico) se compaiono valori nuovi.
+    """
+    valori = pd.Index(pd.unique(pd.Series(valori).dropna()))
+    with _LOCK:
+        dtype = _DIZIONARI.get(nome)
+        if dtype is not None and valori.isin(dtype.categories).all():
+            return dtype
+
+        categorie = valori if dtype is None else dtype.categories.union(valori)
+        dtype = pd.CategoricalDtype(categories=sorted(categorie), ordered=False)
+        _DIZIONARI[nome] = dtype
+        return dtype
+
+
+def _intero_compatto(serie: pd.Series, dtype) -> pd.Series:
+    """
+    Converte in un intero più stretto solo se tutti i valori ci stanno.
+    """
+    info = np.iinfo(dtype)
+    if serie.empty or (serie.min() >= info.min and serie.max() <= info.max):
+        return serie.astype(dtype)
+    return serie
+
+
+# =========================
+# 🗜️ Schema compatto dei frame in formato lungo
+# =========================
+def compact_frame(df: pd.DataFrame, dimensioni=(), misure=(), anno=None) -> pd.DataFrame:
+    """
+    Restituisce una copia compatta di `df`:
+    - `dimensioni` → categoriche con dizionario condiviso;
+    - `misure` → int32;
+    - `anno` → uint16.
+    Il mese resta la categorica ordinata già prodotta dai loader: i suoi codici
+    (`df[col].cat.codes`, int8) sono il codice mese 0–11.
+    """
+    out = df.copy()
+    for col in dimensioni:
+        if col in out.columns:
+            out[col] = out[col].astype(dizionario_condiviso(col, out[col]))
+    for col in misure:
+        if col in out.columns:
+            out[col] = _intero_compatto(out[col], np.int32)
+    if anno and anno in out.columns:
+        out[anno] = _intero_compatto(out[anno], np.uint16)
+    out.attrs = dict(df.attrs)
+    return out
+
+
+def memory_report(prima: pd.DataFrame, dopo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Confronta l'occupazione di memoria (deep) colonna per colonna, con riga Totale.
+    """
+    report = pd.DataFrame({
+        "prima (byte)": prima.memory_usage(deep=True),
+        "dopo (byte)": dopo.memory_usage(deep=True),
+        "dtype prima": prima.dtypes.astype(str),
+        "dtype dopo": dopo.dtypes.astype(str),
+    })
+    report.loc["Totale", ["prima (byte)", "dopo (byte)"]] = [
+        report["prima (byte)"].sum(), report["dopo (byte)"].sum()
+    ]
+    report["risparmio %"] = (1 - report["dopo (byte)"] / report["prima (byte)"]) * 100
+    return report
@@ -0,0 +1,304 @@
+import os
+import time
+import shutil
+import hashlib
+import threading
+
+from dmo.cache import ROOT_DIR, _scrivi_atomico, _dump_json, _leggi_meta
+from dmo.registry import firma_cartella
+
+SORGENTI_DIR = os.environ.get("DMO_SORGENTI_DIR", os.path.join(ROOT_DIR, ".cache", "sorgenti"))
+# Un file modificato da meno di QUIETE_S secondi è considerato ancora in scrittura (es. copia in corso)
+QUIETE_S = float(os.environ.get("DMO_SORGENTI_QUIETE_S", "2"))
+CONSERVA = 5        # versioni pubblicate conservate (oltre alla corrente)
+PUNTATORE = "CORRENTE"
+
+_HASH_CHUNK = 1 << 20
+
+
+def _id_versione(file: dict) -> str:
+    """
+    Identificativo di una versione: hash dei (percorso relativo, sha1) ordinati.
+    """
+    h = hashlib.sha1()
+    for rel in sorted(file):
+        h.update(f"{rel}|{file[rel]['sha1']}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _elenca(cartella: str, estensioni) -> dict:
+    """
+    File della cartella (ricorsivo) con le estensioni indicate: percorso relativo → stat.
+    """
+    voci = {}
+    for radice, _, files in os.walk(cartella):
+        for f in files:
+            if not f.lower().endswith(estensioni):
+                continue
+            p = os.path.join(radice, f)
+            try:
+                voci[os.path.relpath(p, cartella).replace(os.sep, "/")] = os.stat(p)
+            except OSError:
+                continue
+    return voci
+
+
+def _copia(src: str, oggetti_dir: str):
+    """
+    Copia `src` nell'archivio degli oggetti calcolandone lo sha1 durante la lettura.
+    Restituisce (sha1, stat) o None se il file è cambiato mentre veniva letto.
+    """
+    prima = os.stat(src)
+    os.makedirs(oggetti_dir, exist_ok=True)
+    tmp = os.path.join(oggetti_dir, f".{os.getpid()}.{threading.get_ident()}.tmp")
+    h = hashlib.sha1()
+    scritti = 0
+    try:
+        with open(src, "rb") as f, open(tmp, "wb") as out:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                h.update(chunk)
+                out.write(chunk)
+                scritti += len(chunk)
+        dopo = os.stat(src)
+        if (prima.st_size, prima.st_mtime_ns) != (dopo.st_size, dopo.st_mtime_ns) or scritti != dopo.st_size:
+            return None
+        sha1 = h.hexdigest()
+        dest = os.path.join(oggetti_dir, sha1, os.path.basename(src))
+        if not os.path.exists(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp, dest)
+        return sha1, dopo
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# =========================
+# 🔒 Versione immutabile dei file sorgente
+# =========================
+class Versione:
+    """
+    Una versione pubblicata dei file sorgente di una cartella, identificata dall'hash del loro contenuto.
+
+    I file sono copie nell'archivio degli oggetti (`oggetti/<sha1>/<nome file>`) che non vengono
+    mai riscritte: chi legge una versione non vede modifiche, nemmeno se la cartella originale
+    cambia durante la lettura. Il nome del file è conservato (i parser ne ricavano l'anno).
+    """
+
+    def __init__(self, base_dir: str, versione: str, file: dict, sorgente: str = None):
+        self.base_dir = base_dir
+        self.versione = versione
+        self.file = file            # percorso relativo → {"sha1", "size", "mtime_ns"}
+        self.sorgente = sorgente
+
+    def path(self, rel: str) -> str:
+        return os.path.join(self.base_dir, "oggetti", self.file[rel]["sha1"], os.path.basename(rel))
+
+    def relativi(self) -> list:
+        return sorted(self.file)
+
+    def mappa(self) -> dict:
+        """
+        Percorso relativo → file immutabile della versione, in ordine di percorso.
+        """
+        return {rel: self.path(rel) for rel in self.relativi()}
+
+    def versione_di(self, relativi) -> str:
+        """
+        Identificativo del solo sottoinsieme di file indicato (es. le partizioni di un'area).
+        """
+        return _id_versione({rel: self.file[rel] for rel in relativi})
+
+    def __repr__(self):
+        return f"Versione({self.versione}, {len(self.file)} file)"
+
+
+class Sorgenti:
+    """
+    Versioni dei file sorgente di una cartella, pubblicate in modo atomico.
+
+    `aggiorna()` confronta dimensione e mtime dei file con la versione corrente e copia
+    nell'archivio solo quelli cambiati; se il contenuto è diverso scrive il manifest della nuova
+    versione (`versioni/<id>.json`) e poi sposta il puntatore `CORRENTE`.
+
+    Un file modificato da meno di `QUIETE_S` secondi viene copiato solo dopo la fine del periodo
+    di quiete; se nel frattempo (o durante la copia) cambia ancora è considerato a metà scrittura:
+    resta quello della versione precedente (o escluso, se è nuovo) e viene ripreso al controllo successivo.
+    """
+
+    def __init__(self, cartella: str, nome: str, base_dir: str = None, estensioni=(".txt",)):
+        chiave = hashlib.sha1(os.path.abspath(cartella).encode("utf-8")).hexdigest()[:10]
+        self.cartella = cartella
+        self.nome = nome
+        self.estensioni = tuple(estensioni)
+        self.dir = os.path.join(base_dir or SORGENTI_DIR, f"{nome}-{chiave}")
+        self.oggetti_dir = os.path.join(self.dir, "oggetti")
+        self.versioni_dir = os.path.join(self.dir, "versioni")
+        self._lock = threading.Lock()
+
+    def leggi(self, versione: str):
+        manifest = _leggi_meta(os.path.join(self.versioni_dir, f"{versione}.json"))
+        if manifest is None:
+            return None
+        return Versione(self.dir, manifest["versione"], manifest["file"], self.cartella)
+
+    def corrente(self):
+        """
+        Versione puntata da `CORRENTE`, o None se non ne è ancora stata pubblicata una.
+        """
+        try:
+            with open(os.path.join(self.dir, PUNTATORE), encoding="utf-8") as f:
+                return self.leggi(f.read().strip())
+        except OSError:
+            return None
+
+    def aggiorna(self) -> Versione:
+        """
+        Versione corrente dei file della cartella, pubblicandone una nuova se il contenuto è cambiato.
+        """
+        with self._lock:
+            corrente = self.corrente()
+            precedenti = corrente.file if corrente is not None else {}
+            elenco = _elenca(self.cartella, self.estensioni)
+
+            # Nessun file aggiunto, rimosso o toccato: la versione corrente è ancora valida
+            if corrente is not None and elenco.keys() == precedenti.keys() and all(
+                (st.st_size, st.st_mtime_ns) == (precedenti[rel]["size"], precedenti[rel]["mtime_ns"])
+                for rel, st in elenco.items()
+            ):
+                return corrente
+
+            cambiati = {rel: st for rel, st in elenco.items()
+                        if rel not in precedenti
+                        or (st.st_size, st.st_mtime_ns) != (precedenti[rel]["size"], precedenti[rel]["mtime_ns"])}
+            # File appena scritti: si attende la fine del periodo di quiete e si ricontrolla che non siano cambiati
+            attesa = max((QUIETE_S - (time.time() - st.st_mtime) for st in cambiati.values()), default=0)
+            if attesa > 0:
+                time.sleep(attesa)
+
+            file, in_scrittura = {}, []
+            for rel in sorted(elenco):
+                prec = precedenti.get(rel)
+                if rel not in cambiati:
+                    file[rel] = prec
+                    continue
+                copia = None
+                try:
+                    st = os.stat(os.path.join(self.cartella, rel))
+                    if (st.st_size, st.st_mtime_ns) == (cambiati[rel].st_size, cambiati[rel].st_mtime_ns):
+                        copia = _copia(os.path.join(self.cartella, rel), self.oggetti_dir)
+                except FileNotFoundError:
+                    pass
+                if copia is None:
+                    in_scrittura.append(rel)
+                    if prec is not None:
+                        file[rel] = prec
+                    continue
+                sha1, st = copia
+                file[rel] = {"sha1": sha1, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+            if in_scrittura:
+                print(f"⚠️ File ancora in scrittura, ripresi al prossimo controllo: {', '.join(in_scrittura)}")
+
+            # Se il contenuto non è cambiato (file solo toccati) si riscrive il manifest della stessa versione
+            # con le nuove dimensioni/mtime: il prossimo controllo torna a essere un semplice confronto di stat
+            versione = _id_versione(file)
+            manifest = {"versione": versione, "sorgente": os.path.abspath(self.cartella),
+                        "creato": time.strftime("%Y-%m-%dT%H:%M:%S"), "file": file}
+            os.makedirs(self.versioni_dir, exist_ok=True)
+            _scrivi_atomico(os.path.join(self.versioni_dir, f"{versione}.json"), lambda p: _dump_json(manifest, p))
+            if corrente is None or corrente.versione != versione:
+                _scrivi_atomico(os.path.join(self.dir, PUNTATORE), lambda p: _scrivi_testo(versione, p))
+                self.pulisci()
+            return Versione(self.dir, versione, file, self.cartella)
+
+    def pulisci(self, conserva: int = CONSERVA):
+        """
+        Elimina le versioni più vecchie (oltre la corrente e le `conserva` più recenti) e gli oggetti
+        non più referenziati. Gli oggetti scritti negli ultimi minuti restano: potrebbero appartenere
+        a una versione che un altro processo sta per pubblicare.
+        """
+        corrente = self.corrente()
+        manifest = sorted(
+            (os.path.join(self.versioni_dir, f) for f in os.listdir(self.versioni_dir) if f.endswith(".json")),
+            key=os.path.getmtime, reverse=True,
+        )
+        tenute = set(manifest[:conserva])
+        if corrente is not None:
+            tenute.add(os.path.join(self.versioni_dir, f"{corrente.versione}.json"))
+        for p in manifest:
+            if p not in tenute:
+                os.remove(p)
+
+        usati = set()
+        for p in tenute:
+            voce = _leggi_meta(p)
+            if voce is not None:
+                usati |= {f["sha1"] for f in voce["file"].values()}
+        if not os.path.isdir(self.oggetti_dir):
+            return
+        limite = time.time() - 600
+        for sha1 in os.listdir(self.oggetti_dir):
+            p = os.path.join(self.oggetti_dir, sha1)
+            if sha1 not in usati and not sha1.startswith(".") and os.path.getmtime(p) < limite:
+                shutil.rmtree(p, ignore_errors=True)
+
+
+def _scrivi_testo(testo: str, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(testo + "\n")
+
+
+# =========================
+# 🗂️ Versioni correnti per cartella
+# =========================
+_SORGENTI = {}
+_LOCK = threading.Lock()
+
+
+def _sorgenti(cartella: str, nome: str) -> Sorgenti:
+    chiave = (os.path.abspath(cartella), nome)
+    with _LOCK:
+        sorgenti = _SORGENTI.get(chiave)
+        if sorgenti is None:
+            sorgenti = _SORGENTI[chiave] = Sorgenti(cartella, nome)
+    return sorgenti
+
+
+def versione_corrente(cartella: str, nome: str):
+    """
+    Versione corrente (aggiornata se i file sono cambiati) dei file .txt di `cartella`, o None se
+    la cartella non esiste o l'archivio delle versioni non è scrivibile: in quel caso i loader
+    leggono direttamente la cartella.
+
+    Può attendere il periodo di quiete e copiare file: va chiamata dai loader e dal thread che
+    osserva le cartelle, non a ogni rerun (vedi `versione_pubblicata`).
+    """
+    if not os.path.isdir(cartella):
+        return None
+    try:
+        return _sorgenti(cartella, nome).aggiorna()
+    except OSError as e:
+        print(f"⚠️ Versioni dei file sorgente non disponibili per {cartella}: {e}")
+        return None
+
+
+def versione_pubblicata(cartella: str, nome: str):
+    """
+    Ultima versione pubblicata di `cartella`, senza controllare i file: legge solo il puntatore
+    `CORRENTE` (nessun lock, attesa o copia), quindi è adatta ai rerun. Solo se non è mai stata
+    pubblicata una versione la pubblica ora (`versione_corrente`).
+    """
+    if not os.path.isdir(cartella):
+        return None
+    versione = _sorgenti(cartella, nome).corrente()
+    return versione if versione is not None else versione_corrente(cartella, nome)
+
+
+def id_versione(cartella: str, nome: str):
+    """
+    Identificativo della versione corrente di `cartella`, da usare come firma nel registro dei dataset:
+    cambia solo se cambia il contenuto dei file. Senza versioni si ripiega sulla firma della cartella.
+    """
+    versione = versione_corrente(cartella, nome)
+    return versione.versione if versione is not None else firma_cartella(cartella)
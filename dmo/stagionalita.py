@@ -0,0 +1,212 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dmo.cache import versione_frame, _scrivi_atomico
+from dmo.cube import densifica, MESI
+from dmo.risultati import RISULTATI
+
+
+# =========================
+# 📉 Decomposizione additiva vettoriale
+# =========================
+def decomponi(X, periodo=12):
+    """
+    Decomposizione additiva (trend + stagionalità + residuo) di più serie in un'unica passata.
+    `X` è un array [serie, tempo]; il calcolo replica `statsmodels.seasonal_decompose`
+    (modello additivo, media mobile centrata 2×periodo, trend NaN ai bordi).
+    Restituisce (trend, stagionale, residuo), ciascuno con la forma di `X`.
+    """
+    X = np.asarray(X, dtype=float)
+    N, T = X.shape
+    if T < 2 * periodo:
+        raise ValueError(f"Servono almeno {2 * periodo} osservazioni per serie (ricevute {T}).")
+
+    # Media mobile centrata: pesi [0.5, 1, …, 1, 0.5] / periodo per periodo pari
+    if periodo % 2 == 0:
+        pesi = np.r_[0.5, np.ones(periodo - 1), 0.5] / periodo
+    else:
+        pesi = np.ones(periodo) / periodo
+    h = len(pesi) // 2
+    finestre = np.lib.stride_tricks.sliding_window_view(X, len(pesi), axis=1)
+    trend = np.full_like(X, np.nan)
+    trend[:, h:T - h] = finestre @ pesi
+
+    # Media per posizione nel periodo (ignorando i NaN), poi centrata a somma zero
+    detrend = X - trend
+    K = -(-T // periodo)
+    pad = np.full((N, K * periodo), np.nan)
+    pad[:, :T] = detrend
+    with np.errstate(invalid="ignore"):
+        medie = np.nanmean(pad.reshape(N, K, periodo), axis=1)
+    medie -= medie.mean(axis=1, keepdims=True)
+    stagionale = np.tile(medie, (1, K))[:, :T]
+
+    return trend, stagionale, detrend - stagionale
+
+
+# =========================
+# 🗃️ Decomposizione di tutte le entità di un dataset
+# =========================
+class DecomposizioneBatch:
+    """
+    Trend, stagionalità e residuo di ogni entità (comune, area STL, Paese) in array densi
+    [entità, anno × mese]. Ogni serie comprende tutti i mesi degli anni in cui l'entità compare;
+    le entità con gli stessi anni vengono decomposte insieme in un'unica passata 2-D.
+    I valori fuori serie (anni mancanti o serie troppo corte) sono NaN.
+    """
+
+    def __init__(self, entita, anni, mesi, osservato, trend, stagionale, residuo, versione=None):
+        self.entita = pd.Index(entita)
+        self.anni = pd.Index(anni)
+        self.mesi = list(mesi)
+        self.osservato = osservato
+        self.trend = trend
+        self.stagionale = stagionale
+        self.residuo = residuo
+        self.versione = versione
+        A, M = len(self.anni), len(self.mesi)
+        self.date = pd.to_datetime(pd.DataFrame({
+            "year": np.repeat(self.anni.to_numpy(dtype=int), M),
+            "month": np.tile(np.arange(1, M + 1), A),
+            "day": 1,
+        }))
+
+    @classmethod
+    def calcola(cls, somme, osservato, entita, anni, mesi=MESI, periodo=12, versione=None):
+        """
+        Decompone tutte le entità di un array [entità, anno, mese].
+        """
+        E, A, M = somme.shape
+        anni_presenti = osservato.any(axis=2)                                   # [E, A]
+        X = somme.reshape(E, A * M).astype(float)
+        serie = np.full((E, A * M), np.nan)
+        trend, stagionale, residuo = serie.copy(), serie.copy(), serie.copy()
+
+        schemi, gruppo = np.unique(anni_presenti, axis=0, return_inverse=True)
+        for g, schema in enumerate(schemi):
+            colonne = np.repeat(schema, M)
+            if colonne.sum() < 2 * periodo:
+                continue
+            celle = np.ix_(np.flatnonzero(gruppo.ravel() == g), np.flatnonzero(colonne))
+            serie[celle] = X[celle]
+            trend[celle], stagionale[celle], residuo[celle] = decomponi(X[celle], periodo)
+
+        return cls(entita, anni, mesi, serie, trend, stagionale, residuo, versione)
+
+    @classmethod
+    def from_frame(cls, df, col_entita, col_anno="anno", col_mese="mese", col_misura="presenze", mesi=MESI,
+                   periodo=12):
+        somme, osservato, entita, anni, mesi = densifica(df, col_entita, col_anno, col_mese, col_misura, mesi)
+        return cls.calcola(somme, osservato, entita, anni, mesi, periodo, versione=versione_frame(df))
+
+    # -------------------------
+    # Consultazione
+    # -------------------------
+    def risultato(self, entita) -> pd.DataFrame:
+        """
+        Serie osservata, trend, stagionalità e residuo di un'entità, indicizzati per data.
+        DataFrame vuoto se la serie è troppo corta per la decomposizione.
+        """
+        i = self.entita.get_loc(entita)
+        validi = ~np.isnan(self.osservato[i])
+        return pd.DataFrame({
+            "osservato": self.osservato[i, validi],
+            "trend": self.trend[i, validi],
+            "stagionale": self.stagionale[i, validi],
+            "residuo": self.residuo[i, validi],
+        }, index=pd.DatetimeIndex(self.date[validi], name="data"))
+
+    def residui(self) -> pd.DataFrame:
+        """
+        Matrice dei residui entità × data (tutte le entità), per le analisi a livello provinciale.
+        """
+        return pd.DataFrame(self.residuo, index=self.entita, columns=pd.DatetimeIndex(self.date, name="data"))
+
+    def anomalie(self, soglia=2.0) -> pd.DataFrame:
+        """
+        Mesi con residuo oltre `soglia` deviazioni standard (per entità), in formato lungo.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sigma = np.nanstd(self.residuo, axis=1, ddof=1)[:, None]
+            # Serie con residuo costante (es. solo 2 anni): deviazione standard nulla a meno di arrotondamenti
+            scala = np.nanmax(np.abs(self.residuo), axis=1, initial=0.0, where=~np.isnan(self.residuo))[:, None]
+            sigma[sigma <= 1e-9 * np.maximum(scala, 1.0)] = np.nan
+            z = self.residuo / sigma
+        e, t = np.nonzero(np.abs(np.nan_to_num(z)) > soglia)
+        return pd.DataFrame({
+            "entita": self.entita[e],
+            "data": self.date.to_numpy()[t],
+            "osservato": self.osservato[e, t],
+            "residuo": self.residuo[e, t],
+            "z": z[e, t],
+        }).sort_values(["data", "entita"], ignore_index=True)
+
+    # -------------------------
+    # Persistenza
+    # -------------------------
+    def salva(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        def scrivi(p):
+            with open(p, "wb") as f:
+                np.savez(
+                    f, entita=np.array([str(e) for e in self.entita], dtype=str), anni=self.anni.to_numpy(dtype=int),
+                    mesi=np.array(self.mesi, dtype=str), osservato=self.osservato, trend=self.trend,
+                    stagionale=self.stagionale, residuo=self.residuo, versione=np.asarray(self.versione or ""),
+                )
+
+        _scrivi_atomico(path, scrivi)
+
+    @classmethod
+    def carica(cls, path: str):
+        with np.load(path) as z:
+            return cls(z["entita"].tolist(), z["anni"].tolist(), z["mesi"].tolist(), z["osservato"], z["trend"],
+                       z["stagionale"], z["residuo"], str(z["versione"]) or None)
+
+
+# =========================
+# 🗂️ Cache per versione del dataset
+# =========================
+_DECOMPOSIZIONI = {}
+_LOCK = threading.Lock()
+
+
+def decomposizione_per_versione(df, col_entita, col_anno="anno", col_mese="mese", col_misura="presenze",
+                                mesi=MESI, periodo=12, nome="dataset") -> DecomposizioneBatch:
+    """
+    Decomposizione di tutte le entità di `df`, calcolata una sola volta per versione del dataset:
+    in memoria nel processo e nella cache dei risultati per gli altri processi.
+    """
+    versione = versione_frame(df)
+    chiave = (nome, col_entita, col_misura, periodo)
+    with _LOCK:
+        voce = _DECOMPOSIZIONI.get(chiave)
+    if voce is not None and voce.versione == versione:
+        return voce
+
+    parametri = {"nome": nome, "entita": col_entita, "misura": col_misura, "periodo": periodo}
+    dec = RISULTATI.ricorda(
+        "stagionalita.decomposizione", versione, parametri,
+        lambda: DecomposizioneBatch.from_frame(df, col_entita, col_anno, col_mese, col_misura, mesi, periodo),
+    )
+
+    with _LOCK:
+        _DECOMPOSIZIONI[chiave] = dec
+    return dec
+
+
+def decomposizione_aree(frames: dict, col_anno="anno", col_mese="mese", col_misura="presenze", mesi=MESI,
+                        periodo=12, nome="aree") -> DecomposizioneBatch:
+    """
+    Decomposizione di più dataset senza colonna entità (es. {"STL Dolomiti": df, "STL Belluno": df}):
+    ogni frame diventa un'entità della stessa passata vettoriale.
+    """
+    df = pd.concat(
+        [f[[col_anno, col_mese, col_misura]].assign(area=nome_area) for nome_area, f in frames.items()],
+        ignore_index=True,
+    )
+    df.attrs["versione"] = "-".join(versione_frame(f)[:8] for f in frames.values())
+    return decomposizione_per_versione(df, "area", col_anno, col_mese, col_misura, mesi, periodo, nome)
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from dmo.cache import ROOT_DIR
+
+TRACE_DIR = os.environ.get("DMO_TRACE_DIR", os.path.join(ROOT_DIR, ".cache", "trace"))
+TRACE_ATTIVO = os.environ.get("DMO_TRACE", "1") != "0"
+# Oltre questa dimensione il log diventa "<app>.jsonl.1" (sostituendo il precedente) e si riparte da un file vuoto
+TRACE_MAX_MB = float(os.environ.get("DMO_TRACE_MAX_MB", "5"))
+
+_BLOCCO_CODA = 1 << 16
+
+_TRACCIA_CORRENTE = contextvars.ContextVar("traccia_corrente", default=None)
+_LOCK_LOG = threading.Lock()
+
+
+# =========================
+# ⏱️ Traccia di un rerun
+# =========================
+class Traccia:
+    """
+    Tempi delle sezioni di un rerun della dashboard, annidati.
+
+    - `sezione(nome)`: context manager, le sezioni aperte al suo interno diventano figlie;
+    - `fase(nome)`: chiude la fase di primo livello corrente e ne apre una nuova
+      (per scandire lo script senza re-indentarlo);
+    - `chiudi()`: chiude tutto e accoda il rerun al log JSONL (ruotato oltre `TRACE_MAX_MB`).
+    """
+
+    def __init__(self, app: str, log_path: str = None):
+        self.app = app
+        self.log_path = log_path or os.path.join(TRACE_DIR, f"{app}.jsonl")
+        self.sezioni = []
+        self._pila = []
+        self._fase = None
+        self._t0 = time.perf_counter()
+        self._token = _TRACCIA_CORRENTE.set(self)
+        self.chiusa = False
+
+    def _apri(self, nome):
+        percorso = " › ".join([s["nome"] for s in self._pila] + [nome])
+        voce = {"sezione": percorso, "nome": nome, "livello": len(self._pila),
+                "inizio_ms": (time.perf_counter() - self._t0) * 1000, "durata_ms": None}
+        self.sezioni.append(voce)
+        self._pila.append(voce)
+        return voce
+
+    def _chiudi(self, voce):
+        voce["durata_ms"] = (time.perf_counter() - self._t0) * 1000 - voce["inizio_ms"]
+        # chiude anche eventuali figlie rimaste aperte (es. eccezioni, st.stop)
+        while self._pila:
+            if self._pila.pop() is voce:
+                break
+
+    @contextmanager
+    def sezione(self, nome: str):
+        voce = self._apri(nome)
+        try:
+            yield voce
+        finally:
+            self._chiudi(voce)
+
+    def fase(self, nome: str):
+        if self._fase is not None:
+            self._chiudi(self._fase)
+        self._fase = self._apri(nome)
+
+    def chiudi(self) -> dict:
+        """
+        Chiude la traccia e la scrive (una riga JSON per rerun). Idempotente.
+        """
+        if self.chiusa:
+            return self.record
+        while self._pila:
+            self._chiudi(self._pila[-1])
+        self.chiusa = True
+        self.record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "app": self.app,
+            "pid": os.getpid(),
+            "rerun_ms": (time.perf_counter() - self._t0) * 1000,
+            "sezioni": [{k: s[k] for k in ("sezione", "livello", "inizio_ms", "durata_ms")} for s in self.sezioni],
+        }
+        try:
+            _TRACCIA_CORRENTE.reset(self._token)
+        except ValueError:
+            _TRACCIA_CORRENTE.set(None)
+
+        if TRACE_ATTIVO:
+            try:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                with _LOCK_LOG:
+                    _ruota_se_pieno(self.log_path)
+                    with open(self.log_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(self.record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"⚠️ Impossibile scrivere il log delle prestazioni: {e}")
+        return self.record
+
+    def tabella(self) -> pd.DataFrame:
+        """
+        Sezioni del rerun corrente (durate in ms), rientrate per livello.
+        """
+        return pd.DataFrame({
+            "Sezione": [" " * s["livello"] + s["nome"] for s in self.sezioni],
+            "ms": [round(s["durata_ms"], 1) if s["durata_ms"] is not None else None for s in self.sezioni],
+        })
+
+
+def _ruota_se_pieno(path: str):
+    """
+    Se il log supera `TRACE_MAX_MB` lo sposta in "<path>.1" (al più due file per app su disco).
+    """
+    try:
+        if os.path.getsize(path) < TRACE_MAX_MB * 1024 * 1024:
+            return
+    except OSError:
+        return
+    os.replace(path, f"{path}.1")
+
+
+def traccia_corrente():
+    return _TRACCIA_CORRENTE.get()
+
+
+@contextmanager
+def sezione(nome: str):
+    """
+    Sezione della traccia attiva; senza traccia (es. script, worker) non misura nulla.
+    """
+    traccia = _TRACCIA_CORRENTE.get()
+    if traccia is None or traccia.chiusa:
+        yield None
+        return
+    with traccia.sezione(nome) as voce:
+        yield voce
+
+
+def tracciato(nome: str = None):
+    """
+    Decoratore: misura ogni chiamata della funzione come sezione della traccia attiva.
+    """
+    def decoratore(funzione):
+        etichetta = nome or f"{funzione.__module__}.{funzione.__name__}"
+
+        @wraps(funzione)
+        def wrapper(*args, **kwargs):
+            with sezione(etichetta):
+                return funzione(*args, **kwargs)
+        return wrapper
+    return decoratore
+
+
+# =========================
+# 📊 Riepilogo p50 / p95
+# =========================
+def _coda(path: str, n: int = None) -> list:
+    """
+    Ultime `n` righe del file (tutte se `n` è None), leggendo a blocchi dalla fine: il costo
+    dipende da `n`, non dalla lunghezza del file.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos, dati = f.tell(), b""
+            while pos > 0 and (n is None or dati.count(b"\n") <= n):
+                passo = min(_BLOCCO_CODA, pos)
+                pos -= passo
+                f.seek(pos)
+                dati = f.read(passo) + dati
+    except OSError:
+        return []
+    righe = dati.splitlines()
+    if pos > 0:
+        righe = righe[1:]   # la prima riga del blocco può essere incompleta
+    return righe if n is None else righe[-n:]
+
+
+def leggi_log(path: str, ultimi: int = None) -> list:
+    """
+    Record del log (gli ultimi `ultimi`), completati con quelli del file ruotato "<path>.1" se servono.
+    """
+    righe = _coda(path, ultimi)
+    if ultimi is None or len(righe) < ultimi:
+        precedenti = _coda(f"{path}.1", None if ultimi is None else ultimi - len(righe))
+        righe = precedenti + righe
+    record = []
+    for riga in righe:
+        try:
+            record.append(json.loads(riga))
+        except ValueError:
+            continue
+    return record
+
+
+def riepilogo(path: str, ultimi: int = None) -> pd.DataFrame:
+    """
+    Latenza p50 / p95 / max per sezione (e per l'intero rerun) dal log JSONL; con `ultimi`
+    si leggono solo gli ultimi record (dalla coda del file).
+    """
+    durate = {}
+    for r in leggi_log(path, ultimi):
+        durate.setdefault("(rerun)", []).append(r["rerun_ms"])
+        for s in r["sezioni"]:
+            if s["durata_ms"] is not None:
+                durate.setdefault(s["sezione"], []).append(s["durata_ms"])
+
+    righe = [{
+        "Sezione": nome,
+        "N": len(v),
+        "p50 ms": float(np.percentile(v, 50)),
+        "p95 ms": float(np.percentile(v, 95)),
+        "max ms": float(np.max(v)),
+    } for nome, v in durate.items()]
+    df = pd.DataFrame(righe, columns=["Sezione", "N", "p50 ms", "p95 ms", "max ms"])
+    return df.sort_values("p95 ms", ascending=False, ignore_index=True)
+
+
+# =========================
+# 🖥️ Pannello Streamlit
+# =========================
+def pannello_performance(st, traccia: Traccia, ultimi: int = 500, registro=None, risultati=None):
+    """
+    Pannello opzionale "Performance" nella sidebar: sezioni del rerun corrente,
+    p50/p95 degli ultimi `ultimi` rerun registrati nel log e, se indicati, lo stato del registro
+    dei dataset e gli hit/miss della cache dei risultati.
+    """
+    mostra = st.sidebar.checkbox("⏱️ Mostra pannello performance")
+    record = traccia.chiudi()
+    if not mostra:
+        return
+
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        st.markdown(f"**Rerun corrente:** {record['rerun_ms']:.0f} ms")
+        st.dataframe(traccia.tabella(), hide_index=True, use_container_width=True)
+        st.markdown(f"**Ultimi rerun** (`{os.path.basename(traccia.log_path)}`)")
+        st.dataframe(riepilogo(traccia.log_path, ultimi).round(1), hide_index=True, use_container_width=True)
+        if registro is not None:
+            st.markdown("**Dataset condivisi**")
+            st.dataframe(registro.stato(), hide_index=True, use_container_width=True)
+        if risultati is not None:
+            st.markdown("**Cache dei risultati**")
+            st.dataframe(risultati.statistiche().round(2), hide_index=True, use_container_width=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    log = sys.argv[1] if len(sys.argv) > 1 else os.path.join(TRACE_DIR, "comuni.jsonl")
+    pd.set_option("display.width", 200)
+    print(riepilogo(log).to_string(index=False, float_format=lambda v: f"{v:.1f}"))
@@ -1,6 +1,16 @@
 import os
+from functools import partial
+
 import pandas as pd
 
+from dmo.cache import load_cached
+from dmo.incremental import IncrementalStore
+from dmo.parallel import parse_files
+from dmo.schema import compact_frame
+from dmo.partizioni import Catalogo
+from dmo.sorgenti import versione_corrente, versione_pubblicata
+from dmo.tracing import tracciato
+
 # =========================
 # 📁 Utility per i percorsi
 # =========================
@@ -21,182 +31,312 @@ def _resolve_path(relative_path: str) -> str:
     return full_path
 
 
+# =========================
+# 📄 Lettura CSV con fallback di encoding
+# =========================
+def _read_csv(path: str, **kwargs) -> pd.DataFrame:
+    try:
+        return pd.read_csv(path, sep=";", encoding="utf-8", **kwargs)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, sep=";", encoding="latin1", **kwargs)
+
+
 # =========================
 # 1️⃣ CARICAMENTO DATI COMUNALI
 # =========================
-def load_dati_comunali(data_folder="dmodolomiti-turismo-veneto/dati-mensili-per-comune"):
-    data_folder = _resolve_path(data_folder)
-    frames = []
+MESI_MAP = {
+    "Gen": "Gennaio", "Feb": "Febbraio", "Mar": "Marzo", "Apr": "Aprile",
+    "Mag": "Maggio", "Giu": "Giugno", "Lug": "Luglio", "Ago": "Agosto",
+    "Set": "Settembre", "Ott": "Ottobre", "Nov": "Novembre", "Dic": "Dicembre"
+}
 
-    mesi_map = {
-        "Gen": "Gennaio", "Feb": "Febbraio", "Mar": "Marzo", "Apr": "Aprile",
-        "Mag": "Maggio", "Giu": "Giugno", "Lug": "Luglio", "Ago": "Agosto",
-        "Set": "Settembre", "Ott": "Ottobre", "Nov": "Novembre", "Dic": "Dicembre"
-    }
 
-    if not os.path.exists(data_folder):
-        print(f"❌ Cartella non trovata: {data_folder}")
-        return pd.DataFrame()
+def _parse_file_comunale(path: str):
+    """
+    Legge un file comunale in formato largo e lo restituisce in formato lungo
+    [mese, presenze, anno, comune]. Solleva un'eccezione se il file non è conforme.
+    """
+    file = os.path.basename(path)
+    df = _read_csv(path)
 
-    for file in os.listdir(data_folder):
-        if not file.lower().endswith(".txt"):
-            continue
-        path = os.path.join(data_folder, file)
+    if "Comuni" not in df.columns:
+        raise ValueError(f"File senza colonna 'Comuni': {file}")
+
+    # Estrai anno dal nome file
+    year = "".join([c for c in file if c.isdigit()])
+    anno = int(year) if year else None
+
+    # Trasforma le colonne mensili in formato lungo
+    mesi_cols = [c for c in df.columns if "Presenze" in c and any(m in c for m in MESI_MAP.keys())]
+    df_long = df.melt(
+        id_vars=["Comuni"],
+        value_vars=mesi_cols,
+        var_name="mese",
+        value_name="presenze"
+    )
+
+    df_long["mese"] = df_long["mese"].str.extract(r"^(\w{3})")[0]
+    df_long["mese"] = pd.Categorical(df_long["mese"], categories=list(MESI_MAP.keys()), ordered=True)
+
+    df_long["anno"] = anno
+    df_long["comune"] = df_long["Comuni"].str.strip()
+    df_long.drop(columns=["Comuni"], inplace=True)
+    df_long["presenze"] = pd.to_numeric(df_long["presenze"], errors="coerce").fillna(0).astype(int)
+
+    return df_long
+
+
+def _finalizza_comunali(data: pd.DataFrame) -> pd.DataFrame:
+    return data.sort_values(["anno", "comune", "mese"])
 
+
+def _carica_file(paths, parser, namespace, jobs, executor):
+    """
+    Legge i file (dalla cache colonnare) in sequenza o in parallelo.
+    Restituisce i DataFrame validi nell'ordine dei file e la lista degli errori per file.
+    """
+    risultati, errori = parse_files(
+        paths, partial(load_cached, parser=parser, namespace=namespace), jobs=jobs, executor=executor
+    )
+    return [df for df in risultati if df is not None], errori
+
+
+def _file_txt(data_folder: str, sorgenti) -> list:
+    """
+    File .txt non vuoti di `data_folder` (non ricorsivo), in ordine di nome: i file immutabili
+    della versione pubblicata `sorgenti` se c'è, altrimenti quelli della cartella.
+    """
+    if sorgenti is not None:
+        voci = [(rel, sorgenti.path(rel)) for rel in sorgenti.relativi() if "/" not in rel]
+    elif os.path.isdir(data_folder):
+        voci = [(file, os.path.join(data_folder, file)) for file in sorted(os.listdir(data_folder))
+                if file.lower().endswith(".txt")]
+    else:
+        voci = []
+
+    paths = []
+    for file, path in voci:
         if os.path.getsize(path) == 0:
             print(f"⚠️ File vuoto saltato: {file}")
             continue
+        paths.append(path)
+    return paths
 
-        try:
-            df = pd.read_csv(path, sep=";", encoding="utf-8")
-        except UnicodeDecodeError:
-            df = pd.read_csv(path, sep=";", encoding="latin1")
-        except Exception as e:
-            print(f"⚠️ Errore nella lettura di {file}: {e}")
-            continue
 
-        if "Comuni" not in df.columns:
-            print(f"⚠️ File senza colonna 'Comuni': {file}")
-            continue
+def file_comunali(data_folder="dmodolomiti-turismo-veneto/dati-mensili-per-comune") -> list:
+    """
+    File sorgente (.txt non vuoti) della versione corrente dei dati comunali, in ordine di nome.
+    """
+    data_folder = _resolve_path(data_folder)
+    return _file_txt(data_folder, versione_corrente(data_folder, "comunali"))
 
-        # Estrai anno dal nome file
-        year = "".join([c for c in file if c.isdigit()])
-        anno = int(year) if year else None
 
-        # Trasforma le colonne mensili in formato lungo
-        mesi_cols = [c for c in df.columns if "Presenze" in c and any(m in c for m in mesi_map.keys())]
-        df_long = df.melt(
-            id_vars=["Comuni"],
-            value_vars=mesi_cols,
-            var_name="mese",
-            value_name="presenze"
-        )
+@tracciato("etl.load_dati_comunali")
+def load_dati_comunali(data_folder="dmodolomiti-turismo-veneto/dati-mensili-per-comune", incremental=False,
+                       jobs=1, executor="process", compact=False):
+    """
+    Carica i dati comunali mensili in formato lungo.
+    Con `incremental=True` usa lo store consolidato e rilegge solo i file aggiunti o modificati.
+    Con `jobs` > 1 (o -1 = tutti i core) i file sono letti in parallelo; gli errori per file
+    sono raccolti in `data.attrs["errori"]`.
+    Con `compact=True` restituisce lo schema compatto (comune categorico, presenze int32, anno uint16).
+
+    I file sono letti dalla versione pubblicata corrente della cartella (`dmo.sorgenti`): un file
+    ancora in copia non viene letto a metà. `data.attrs["versione"]` è l'identificativo di quella versione.
+    """
+    data_folder = _resolve_path(data_folder)
 
-        df_long["mese"] = df_long["mese"].str.extract(r"^(\w{3})")[0]
-        df_long["mese"] = pd.Categorical(df_long["mese"], categories=list(mesi_map.keys()), ordered=True)
+    if not os.path.exists(data_folder):
+        print(f"❌ Cartella non trovata: {data_folder}")
+        return pd.DataFrame()
 
-        df_long["anno"] = anno
-        df_long["comune"] = df_long["Comuni"].str.strip()
-        df_long.drop(columns=["Comuni"], inplace=True)
-        df_long["presenze"] = pd.to_numeric(df_long["presenze"], errors="coerce").fillna(0).astype(int)
+    sorgenti = versione_corrente(data_folder, "comunali")
+    paths = _file_txt(data_folder, sorgenti)
 
-        frames.append(df_long)
+    if incremental:
+        store = IncrementalStore("comunali", data_folder, _parse_file_comunale, finalize=_finalizza_comunali)
+        data = store.refresh(paths, jobs=jobs, executor=executor)
+        errori = store.errori
+    else:
+        frames, errori = _carica_file(paths, _parse_file_comunale, "comunali", jobs, executor)
+        data = _finalizza_comunali(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame()
 
-    if not frames:
+    if data.empty:
         print("⚠️ Nessun file valido trovato.")
-        return pd.DataFrame()
+        data = pd.DataFrame()
+    elif compact:
+        data = compact_frame(data, dimensioni=["comune"], misure=["presenze"], anno="anno")
 
-    data = pd.concat(frames, ignore_index=True)
-    data = data.sort_values(["anno", "comune", "mese"])
+    data.attrs["errori"] = errori
+    if sorgenti is not None and not data.empty:
+        data.attrs["versione"] = sorgenti.versione
     return data
 
 
 # =========================
 # 2️⃣ CARICAMENTO DATI PROVINCIALI
 # =========================
-def load_provincia_belluno(data_folder="dmodolomiti-turismo-veneto/dati-provincia-annuali"):
-    data_folder = _resolve_path(data_folder)
-    frames = []
+def _parse_file_provincia(path: str):
+    """
+    Legge un file provinciale annuale e restituisce [anno, mese, arrivi, presenze].
+    Restituisce None se mancano le colonne attese.
+    """
+    df = _read_csv(path)
 
-    if not os.path.exists(data_folder):
-        return pd.DataFrame()
+    df.columns = [c.strip().lower() for c in df.columns]
+    if not {"mese", "totale arrivi", "totale presenze"}.issubset(df.columns):
+        return None
 
-    for file in os.listdir(data_folder):
-        if not file.endswith(".txt"):
-            continue
-        path = os.path.join(data_folder, file)
+    df["arrivi"] = df["totale arrivi"]
+    df["presenze"] = df["totale presenze"]
+    return df[["anno", "mese", "arrivi", "presenze"]]
 
-        try:
-            df = pd.read_csv(path, sep=";", encoding="utf-8")
-        except UnicodeDecodeError:
-            df = pd.read_csv(path, sep=";", encoding="latin1")
 
-        df.columns = [c.strip().lower() for c in df.columns]
-        if not {"mese", "totale arrivi", "totale presenze"}.issubset(df.columns):
-            continue
+@tracciato("etl.load_provincia_belluno")
+def load_provincia_belluno(data_folder="dmodolomiti-turismo-veneto/dati-provincia-annuali", incremental=False,
+                           jobs=1, executor="process"):
+    """
+    Dati mensili della Provincia di Belluno: vengono letti solo i file di Belluno,
+    anche se nella cartella ci sono altre province (vedi `load_area`).
+    """
+    catalogo = catalogo_aree({"provincia": data_folder})
+    return load_area("provincia", "belluno", catalogo=catalogo, incremental=incremental, jobs=jobs, executor=executor)
 
-        df["arrivi"] = df["totale arrivi"]
-        df["presenze"] = df["totale presenze"]
-        frames.append(df[["anno", "mese", "arrivi", "presenze"]])
 
-    if not frames:
-        return pd.DataFrame()
+# =========================
+# 3️⃣ CARICAMENTO DATI STL
+# =========================
+def _parse_file_stl(path: str):
+    """
+    Legge un file STL mensile e restituisce [anno, mese, arrivi, presenze]
+    (solo righe con mese valido). Restituisce None se il file non è conforme.
+    """
+    file = os.path.basename(path)
+    df = _read_csv(path)
+
+    # Normalizza nomi colonne
+    cols_lower = [c.strip() for c in df.columns]
+    df.columns = cols_lower
+
+    # Individua colonne (variazioni possibili)
+    col_mese = None
+    col_arrivi = None
+    col_presenze = None
+    for c in df.columns:
+        cl = c.lower()
+        if "mese" == cl or cl.startswith("mese"):
+            col_mese = c
+        if "arrivi" in cl:
+            col_arrivi = c
+        if "presenze" in cl:
+            col_presenze = c
+
+    if not (col_mese and (col_arrivi or "totale arrivi" in df.columns) and (col_presenze or "totale presenze" in df.columns)):
+        # salta file non conformi
+        return None
+
+    # rinomina colonne in standard
+    df = df.rename(columns={col_mese: "mese", col_arrivi: "arrivi", col_presenze: "presenze"})
+
+    # Some files may have a 'Totale' row: remove it
+    df["mese"] = df["mese"].astype(str).str.strip()
+    df = df[~df["mese"].str.lower().str.contains(r"^tot")]  # rimuove 'Totale','TOTALE', ecc.
+
+    # keep only valid month labels (first 3 letter codes if present)
+    df["mese"] = df["mese"].str[:3].str.capitalize()
+    mesi_validi = ["Gen","Feb","Mar","Apr","Mag","Giu","Lug","Ago","Set","Ott","Nov","Dic"]
+    df = df[df["mese"].isin(mesi_validi)]
+
+    # Estrai anno dal nome file
+    year = "".join([c for c in file if c.isdigit()])
+    df["anno"] = int(year) if year else None
 
-    return pd.concat(frames, ignore_index=True)
+    # Converti numeri
+    df["arrivi"] = pd.to_numeric(df["arrivi"], errors="coerce").fillna(0).astype(int)
+    df["presenze"] = pd.to_numeric(df["presenze"], errors="coerce").fillna(0).astype(int)
+
+    return df[["anno", "mese", "arrivi", "presenze"]]
 
 
 # =========================
-# 3️⃣ CARICAMENTO DATI STL
+# 🧩 Province e STL partizionate per area e anno
 # =========================
-def load_stl_data(base_folder="dmodolomiti-turismo-veneto/stl-presenze-arrivi"):
-    base_folder = _resolve_path(base_folder)
-    stl_dolomiti = pd.DataFrame()
-    stl_belluno = pd.DataFrame()
-
-    for tipo in ["stl-dolomiti", "stl-belluno"]:
-        folder = os.path.join(base_folder, tipo)
-        frames = []
-        if not os.path.exists(folder):
-            continue
-        for file in os.listdir(folder):
-            if not file.endswith(".txt"):
-                continue
-            path = os.path.join(folder, file)
-            try:
-                df = pd.read_csv(path, sep=";", encoding="utf-8")
-            except UnicodeDecodeError:
-                df = pd.read_csv(path, sep=";", encoding="latin1")
-            except Exception as e:
-                print(f"⚠️ Errore lettura STL {file}: {e}")
-                continue
-
-            # Normalizza nomi colonne
-            cols_lower = [c.strip() for c in df.columns]
-            df.columns = cols_lower
-
-            # Individua colonne (variazioni possibili)
-            col_mese = None
-            col_arrivi = None
-            col_presenze = None
-            for c in df.columns:
-                cl = c.lower()
-                if "mese" == cl or cl.startswith("mese"):
-                    col_mese = c
-                if "arrivi" in cl:
-                    col_arrivi = c
-                if "presenze" in cl:
-                    col_presenze = c
-
-            if not (col_mese and (col_arrivi or "totale arrivi" in df.columns) and (col_presenze or "totale presenze" in df.columns)):
-                # salta file non conformi
-                continue
-
-            # rinomina colonne in standard
-            df = df.rename(columns={col_mese: "mese", col_arrivi: "arrivi", col_presenze: "presenze"})
-
-            # Some files may have a 'Totale' row: remove it
-            df["mese"] = df["mese"].astype(str).str.strip()
-            df = df[~df["mese"].str.lower().str.contains(r"^tot")]  # rimuove 'Totale','TOTALE', ecc.
-
-            # keep only valid month labels (first 3 letter codes if present)
-            df["mese"] = df["mese"].str[:3].str.capitalize()
-            mesi_validi = ["Gen","Feb","Mar","Apr","Mag","Giu","Lug","Ago","Set","Ott","Nov","Dic"]
-            df = df[df["mese"].isin(mesi_validi)]
-
-            # Estrai anno dal nome file
-            year = "".join([c for c in file if c.isdigit()])
-            df["anno"] = int(year) if year else None
-
-            # Converti numeri
-            df["arrivi"] = pd.to_numeric(df["arrivi"], errors="coerce").fillna(0).astype(int)
-            df["presenze"] = pd.to_numeric(df["presenze"], errors="coerce").fillna(0).astype(int)
-
-            frames.append(df[["anno", "mese", "arrivi", "presenze"]])
-
-        if frames:
-            if tipo == "stl-dolomiti":
-                stl_dolomiti = pd.concat(frames, ignore_index=True)
-            else:
-                stl_belluno = pd.concat(frames, ignore_index=True)
-
-    return stl_dolomiti, stl_belluno
+CARTELLE_AREE = {"provincia": "dati-provincia-annuali", "stl": "stl-presenze-arrivi"}
+_PARSER_AREE = {"provincia": _parse_file_provincia, "stl": _parse_file_stl}
+
+
+def catalogo_aree(cartelle=None, aggiorna=True) -> Catalogo:
+    """
+    Catalogo delle partizioni (ambito, area, anno) delle cartelle provinciali e STL, sulla versione
+    pubblicata corrente di ogni cartella (`dmo.sorgenti`).
+
+    Con `aggiorna=True` (loader e controllo delle firme) pubblica prima una nuova versione se i file
+    sono cambiati; con `aggiorna=False` legge solo l'ultima versione pubblicata: è la forma da usare
+    a ogni rerun, perché non attende né copia file.
+    """
+    cartelle = CARTELLE_AREE if cartelle is None else cartelle
+    radici = {ambito: _resolve_path(c) for ambito, c in cartelle.items()}
+    versione = versione_corrente if aggiorna else versione_pubblicata
+    versioni = {ambito: versione(radice, ambito) for ambito, radice in radici.items()
+                if os.path.isdir(radice)}
+    if None in versioni.values():
+        return Catalogo.scansiona(radici)
+    return Catalogo.da_versioni(versioni, radici)
+
+
+@tracciato("etl.load_area")
+def load_area(ambito: str, area: str, anni=None, catalogo: Catalogo = None, incremental=False,
+              jobs=1, executor="process") -> pd.DataFrame:
+    """
+    Dati mensili [anno, mese, arrivi, presenze] di una provincia o di un'STL (`ambito` = "provincia" / "stl").
+    Sono letti solo i file dell'area (e degli `anni`, se indicati) selezionati dal catalogo; i file .txt
+    con un nome non riconosciuto sono segnalati in `data.attrs["errori"]`.
+    Con `incremental=True` (e tutti gli anni) usa uno store consolidato per area.
+    """
+    catalogo = catalogo_aree() if catalogo is None else catalogo
+    parser = _PARSER_AREE[ambito]
+    paths = [p.path for p in catalogo.seleziona(ambito, [area], anni)]
+
+    if incremental and anni is None:
+        sorgente = os.path.join(catalogo.radici.get(ambito, ""), area)
+        data = IncrementalStore(f"{ambito}-{area}", sorgente, parser).refresh(paths, jobs, executor)
+    else:
+        frames, errori = _carica_file(paths, parser, ambito, jobs, executor)
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        data.attrs["errori"] = errori
+
+    # i file che il catalogo non sa assegnare a un'area e un anno non vengono letti: si segnalano
+    data.attrs["errori"] = list(data.attrs.get("errori", [])) + [
+        {"file": path, "errore": "nome non riconosciuto (atteso ...-<area>-<anno>.txt), file non letto"}
+        for path in catalogo.non_riconosciuti(ambito, [area])
+    ]
+
+    versione = catalogo.versione(ambito, [area], anni)
+    if versione is not None and not data.empty:
+        data.attrs["versione"] = versione
+    return data
+
+
+@tracciato("etl.load_stl_aree")
+def load_stl_aree(base_folder="dmodolomiti-turismo-veneto/stl-presenze-arrivi", aree=None, incremental=False,
+                  jobs=1, executor="process") -> dict:
+    """
+    Dati STL per area ({"dolomiti": df, "belluno": df, ...}) per tutte le STL trovate nella cartella
+    o solo per quelle indicate in `aree`.
+    """
+    catalogo = catalogo_aree({"stl": base_folder})
+    aree = catalogo.aree("stl") if aree is None else aree
+    return {
+        area: load_area("stl", area, catalogo=catalogo, incremental=incremental, jobs=jobs, executor=executor)
+        for area in aree
+    }
+
+
+@tracciato("etl.load_stl_data")
+def load_stl_data(base_folder="dmodolomiti-turismo-veneto/stl-presenze-arrivi", incremental=False,
+                  jobs=1, executor="process"):
+    """
+    STL Dolomiti e STL Belluno (come coppia), per compatibilità: vedi `load_stl_aree` per le altre STL.
+    """
+    stl = load_stl_aree(base_folder, ["dolomiti", "belluno"], incremental, jobs, executor)
+    return stl["dolomiti"], stl["belluno"]
@@ -1,12 +1,21 @@
 import os
 import streamlit as st
-import altair as alt
 import pandas as pd
-import numpy as np
-from etl import load_data
-from sklearn.linear_model import LinearRegression
+from etl import load_data, file_paesi
+from dmo.mercati import tabelle_per_versione, classifica_presenze, migliori_mercati
+from dmo.confronto import aggiungi_variazioni
+from dmo.filtri import indice_filtri
+from dmo.tracing import Traccia, sezione, pannello_performance
+from dmo.lazy import importa_differito
+from dmo.registry import REGISTRO
+from dmo.sorgenti import id_versione
+from dmo.risultati import RISULTATI
+from dmo.artefatti import da_artefatti
 import streamlit.components.v1 as components
 
+# Altair viene importato solo quando si disegna il grafico principale
+alt = importa_differito("altair")
+
 # ---------------------------------------------------------
 # CONFIGURAZIONE BASE
 # ---------------------------------------------------------
@@ -32,77 +41,86 @@ if DATA_DIR is None:
 # ---------------------------------------------------------
 # CARICA I DATI
 # ---------------------------------------------------------
+# Tempi delle sezioni di questo rerun (pannello "Performance" in fondo alla sidebar)
+traccia = Traccia("paesi")
+traccia.fase("📥 Caricamento dati")
+# Dataset condiviso da tutte le sessioni (sola lettura), ricaricato solo se cambia il contenuto dei file.
+# Forma larga Paese × anno × mese per le analisi; il formato lungo (grafico, filtri) è una sua vista.
+# Se `python -m dmo build` l'ha precalcolata dagli stessi file, la matrice è aperta dall'archivio memory-mapped
+# degli artefatti: nessun parsing, e tutti i processi condividono le stesse pagine in sola lettura.
+REGISTRO.registra("paesi", lambda: da_artefatti(
+                      "paesi", file_paesi(DATA_DIR, "presenze-dolomiti-estero"),
+                      lambda: load_data(data_dir=DATA_DIR, prefix="presenze-dolomiti-estero", formato="largo")),
+                  firma=lambda: id_versione(DATA_DIR, "paesi"))
+# Caricamento avviato al primo rerun del processo; le modifiche ai file vengono poi rilevate da un thread
+# in background, che ricarica senza bloccare i rerun
+REGISTRO.riscalda()
+REGISTRO.osserva()
 try:
-    df_long = load_data(data_dir=DATA_DIR, prefix="presenze-dolomiti-estero")
+    matrice = REGISTRO.get("paesi")
+    df_long = matrice.lungo
 except Exception as e:
     st.error(f"❌ Errore nel caricamento dati: {e}")
     st.stop()
 
+for errore in df_long.attrs.get("errori", []):
+    st.warning(f"⚠️ File non caricato: {os.path.basename(errore['file'])} – {errore['errore']}")
+st.caption(f"Versione dati: {matrice.versione}")
+
 # ---------------------------------------------------------
 # FILTRI
 # ---------------------------------------------------------
+traccia.fase("🔎 Filtri")
 col1, col2, col3 = st.columns(3)
 with col1:
     paesi = st.multiselect(
         "🌐 Seleziona Paese/i:",
-        sorted(df_long["Paese"].unique()),
-        default=["Germania"] if "Germania" in df_long["Paese"].values else None
+        list(matrice.entita),
+        default=["Germania"] if "Germania" in matrice.entita else None
     )
 with col2:
     anni = st.multiselect(
         "📅 Seleziona Anno/i:",
-        sorted(df_long["Anno"].unique()),
-        default=sorted(df_long["Anno"].unique())[-2:]
+        list(matrice.anni),
+        default=list(matrice.anni)[-2:]
     )
 with col3:
     mesi = st.multiselect(
         "🗓️ Seleziona Mese/i:",
-        [m for m in df_long["Mese"].cat.categories if m in df_long["Mese"].unique()],
-        default=[m for m in df_long["Mese"].cat.categories if m in df_long["Mese"].unique()]
+        matrice.mesi_presenti(),
+        default=matrice.mesi_presenti()
     )
 
 # ---------------------------------------------------------
 # FILTRAGGIO
 # ---------------------------------------------------------
-df_filtered = df_long[
-    df_long["Paese"].isin(paesi)
-    & df_long["Anno"].isin(anni)
-    & df_long["Mese"].isin(mesi)
-]
+# Indice invertito Paese/Anno/Mese del dataset condiviso: costruito una volta, selezioni recenti in LRU
+indice = indice_filtri(df_long, ["Paese", "Anno", "Mese"])
+with sezione("filtro"):
+    df_filtered = indice.filtra(Paese=paesi, Anno=anni, Mese=mesi)
 
 if df_filtered.empty:
     st.warning("⚠️ Nessun dato trovato per i filtri selezionati.")
+    traccia.chiudi()
     st.stop()
 
 # ---------------------------------------------------------
 # CONFRONTO RAPIDO TRA ANNI SELEZIONATI (MESI DISPONIBILI)
 # ---------------------------------------------------------
-ultimo_anno = int(df_long["Anno"].max())
+traccia.fase("📊 Confronto rapido")
+ultimo_anno = int(matrice.anni.max())
 if ultimo_anno in anni and len(anni) >= 2 and len(paesi) > 0:
     anno_precedente = max([a for a in anni if a < ultimo_anno])
 
-    mesi_attivi = (
-        df_long[(df_long["Anno"] == ultimo_anno) & (df_long["Paese"].isin(paesi))]
-        .groupby("Mese", as_index=False)["Presenze"]
-        .sum()
-    )
-    mesi_attivi = mesi_attivi[mesi_attivi["Presenze"] > 0]["Mese"].tolist()
+    # Paesi selezionati aggregati: mesi attivi = mesi con presenze > 0 nell'ultimo anno
+    confronto = matrice.confronto(paesi, [anno_precedente, ultimo_anno], aggrega=True)
+    mesi_attivi = confronto.mesi_allineati()
 
     if len(mesi_attivi) > 0:
-        somma_ultimo = df_long[
-            (df_long["Anno"] == ultimo_anno) &
-            (df_long["Mese"].isin(mesi_attivi)) &
-            (df_long["Paese"].isin(paesi))
-        ]["Presenze"].sum()
-
-        somma_precedente = df_long[
-            (df_long["Anno"] == anno_precedente) &
-            (df_long["Mese"].isin(mesi_attivi)) &
-            (df_long["Paese"].isin(paesi))
-        ]["Presenze"].sum()
-
+        somma_precedente, somma_ultimo = (int(v) for v in confronto.totali().iloc[0])
         diff_assoluta = somma_ultimo - somma_precedente
-        diff_percentuale = (diff_assoluta / somma_precedente * 100) if somma_precedente != 0 else None
+        diff_percentuale = confronto.variazione(anno_precedente, ultimo_anno).iloc[0]
+        testo_percentuale = f"{diff_percentuale:+.2f}%" if not pd.isna(diff_percentuale) else "N/A"
 
         st.markdown("### 📊 Confronto rapido tra anni selezionati (mesi disponibili)")
         st.markdown(
@@ -114,7 +132,7 @@ if ultimo_anno in anni and len(anni) >= 2 and len(paesi) > 0:
                 <b>Presenze {anno_precedente}:</b> {somma_precedente:,.0f}<br>
                 <b>Presenze {ultimo_anno}:</b> {somma_ultimo:,.0f}<br>
                 <b>Variazione assoluta:</b> {diff_assoluta:+,}<br>
-                <b>Variazione percentuale:</b> {diff_percentuale:+.2f}% 
+                <b>Variazione percentuale:</b> {testo_percentuale} 
             </div>
             """,
             unsafe_allow_html=True,
@@ -123,35 +141,34 @@ if ultimo_anno in anni and len(anni) >= 2 and len(paesi) > 0:
 # ---------------------------------------------------------
 # GRAFICO PRINCIPALE
 # ---------------------------------------------------------
+traccia.fase("📈 Grafico principale")
 st.subheader("📈 Andamento mensile delle presenze")
-chart = (
-    alt.Chart(df_filtered)
-    .mark_line(point=True)
-    .encode(
-        x=alt.X("Mese:N", sort=df_long["Mese"].cat.categories),
-        y=alt.Y("Presenze:Q", title="Numero presenze"),
-        color=alt.Color("Anno:N", legend=alt.Legend(title="Anno")),
-        strokeDash=alt.StrokeDash("Paese:N", legend=alt.Legend(title="Paese")),
-        tooltip=["Anno", "Mese", "Paese", "Presenze"]
+with sezione("figura Altair"):
+    chart = (
+        alt.Chart(df_filtered)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("Mese:N", sort=df_long["Mese"].cat.categories),
+            y=alt.Y("Presenze:Q", title="Numero presenze"),
+            color=alt.Color("Anno:N", legend=alt.Legend(title="Anno")),
+            strokeDash=alt.StrokeDash("Paese:N", legend=alt.Legend(title="Paese")),
+            tooltip=["Anno", "Mese", "Paese", "Presenze"]
+        )
+        .properties(height=450)
     )
-    .properties(height=450)
-)
-st.altair_chart(chart, use_container_width=True)
+with sezione("render"):
+    st.altair_chart(chart, use_container_width=True)
 
 # ---------------------------------------------------------------------------
 # 📊 DIFFERENZE TRA ANNI SELEZIONATI (robusta multi-anno) TABELLA COMPARATIVA
 # ---------------------------------------------------------------------------
+traccia.fase("📊 Differenze tra anni")
 if len(anni) >= 2:
     st.subheader("📊 Differenze tra anni selezionati")
 
-    # Pivot per Mese e Paese (come in precedenza)
-    pivot = (
-        df_filtered.pivot_table(
-            index=["Mese", "Paese"], columns="Anno", values="Presenze", aggfunc="sum"
-        )
-        .fillna(0)
-        .reset_index()
-    )
+    # Tabella Mese × Paese per anno, letta direttamente dalla matrice (senza pivot del formato lungo)
+    with sezione("pivot"):
+        pivot = matrice.tabella_mesi_entita(paesi, anni, mesi)
 
     # Ordina gli anni e scegli gli ultimi due per il confronto
     anni_sorted = sorted(anni)
@@ -159,12 +176,8 @@ if len(anni) >= 2:
     anno_corr = anni_sorted[-1]
 
     # Calcolo delle differenze solo tra gli ultimi due anni selezionati
-    pivot["Differenza assoluta"] = pivot[anno_corr] - pivot[anno_prec]
-    pivot["Differenza %"] = np.where(
-        pivot[anno_prec] != 0,
-        (pivot["Differenza assoluta"] / pivot[anno_prec]) * 100,
-        np.nan
-    ).round(2)
+    aggiungi_variazioni(pivot, anno_prec, anno_corr, col_diff="Differenza assoluta", col_var="Differenza %")
+    pivot["Differenza %"] = pivot["Differenza %"].round(2)
 
     # Funzione di colorazione
     def color_diff(val):
@@ -183,17 +196,18 @@ if len(anni) >= 2:
     )
 
     # Visualizzazione
-    st.dataframe(
-        pivot.style
-        .format({
-            anno_prec: "{:,.0f}",
-            anno_corr: "{:,.0f}",
-            "Differenza assoluta": "{:+,.0f}",
-            "Differenza %": "{:+.2f} %",
-        })
-        .applymap(color_diff, subset=["Differenza assoluta", "Differenza %"]),
-        use_container_width=True,
-    )
+    with sezione("Styler"):
+        st.dataframe(
+            pivot.style
+            .format({
+                anno_prec: "{:,.0f}",
+                anno_corr: "{:,.0f}",
+                "Differenza assoluta": "{:+,.0f}",
+                "Differenza %": "{:+.2f} %",
+            })
+            .applymap(color_diff, subset=["Differenza assoluta", "Differenza %"]),
+            use_container_width=True,
+        )
 
 else:
     st.info("Seleziona almeno due anni per visualizzare il confronto delle differenze.")
@@ -201,15 +215,11 @@ else:
 # ---------------------------------------------------------
 # 🏆 CLASSIFICA DEI 10 PAESI CON PIÙ PRESENZE
 # ---------------------------------------------------------
+traccia.fase("🏆 Classifica top 10")
 st.subheader("🏆 Classifica dei 10 Paesi con più presenze")
-df_top = (
-    df_long[df_long["Anno"].isin(anni)]
-    .query("~Paese.str.contains('Totale', case=False, na=False)")
-    .groupby(["Anno", "Paese"], as_index=False)["Presenze"].sum()
-    .sort_values(["Anno", "Presenze"], ascending=[True, False])
-)
-df_top["Posizione"] = df_top.groupby("Anno")["Presenze"].rank(method="first", ascending=False).astype(int)
-df_top = df_top.groupby("Anno").head(10)
+# Classifica di tutti gli anni, per versione dei dati (precalcolata da `python -m dmo build`)
+df_top = classifica_presenze(matrice, n=10, escludi="Totale")
+df_top = df_top[df_top["Anno"].isin(anni)]
 
 for anno in sorted(df_top["Anno"].unique()):
     subset = df_top[df_top["Anno"] == anno]
@@ -232,10 +242,7 @@ for anno in sorted(df_top["Anno"].unique()):
 # ---------------------------------------------------------
 # 🔍 ANALISI PATTERN E MERCATI PROMETTENTI (mesi comparabili)
 # ---------------------------------------------------------
-from sklearn.linear_model import LinearRegression
-import numpy as np
-import altair as alt
-
+traccia.fase("🔍 Mercati promettenti")
 st.markdown("""
 ### 🔍 Analisi dei pattern e mercati promettenti
 Analizza **l’andamento delle presenze turistiche per ciascun Paese**, considerando solo i **mesi effettivamente alimentati nell’ultimo anno disponibile**.  
@@ -251,51 +258,16 @@ with st.expander("📘 Legenda indicatori di questa sezione"):
     - **Indice potenziale (0–100)** → combinazione normalizzata di trend e variazione percentuale recente.  
     """)
 
-# Filtriamo fuori i totali
-df_filtrato = df_long[~df_long["Paese"].str.contains("Totale stranieri", case=False, na=False)]
-
-# Individua l'anno e mesi effettivamente alimentati
-ultimo_anno = int(df_filtrato["Anno"].max())
-mesi_attivi_ultimo = (
-    df_filtrato[df_filtrato["Anno"] == ultimo_anno]
-    .groupby("Mese", as_index=False)["Presenze"]
-    .sum()
-)
-mesi_attivi_ultimo = mesi_attivi_ultimo[mesi_attivi_ultimo["Presenze"] > 0]["Mese"].tolist()
-
-paesi_analisi = []
-for paese, dfp in df_filtrato.groupby("Paese"):
-    dfp_filtrato = dfp[dfp["Mese"].isin(mesi_attivi_ultimo)]
-    trend_data = dfp_filtrato.groupby("Anno")["Presenze"].sum().reset_index().sort_values("Anno")
-
-    if trend_data["Anno"].nunique() >= 3:
-        X = trend_data["Anno"].values.reshape(-1, 1)
-        y = trend_data["Presenze"].values
-        model = LinearRegression().fit(X, y)
-        slope = model.coef_[0]
-        pct_growth_recent = (y[-1] - y[-2]) / y[-2] * 100 if len(y) > 1 and y[-2] != 0 else np.nan
-
-        paesi_analisi.append({
-            "Paese": paese,
-            "Trend medio (mesi attivi)": slope,
-            "Variazione % ultimo anno": pct_growth_recent,
-            "Presenze ultimo anno (mesi attivi)": y[-1],
-        })
-
-df_pattern = pd.DataFrame(paesi_analisi)
+# Indicatori di tutti i Paesi (totali esclusi) in un'unica passata vettoriale sulla matrice Paese × anno × mese
+with sezione("MotoreMercati"):
+    # Tabelle salvate nella cache dei risultati per versione dei dati (condivise tra sessioni e processi)
+    motore, df_pattern, df_patterns = tabelle_per_versione(matrice, escludi="Totale stranieri")
+    ultimo_anno = motore.ultimo_anno
+    mesi_attivi_ultimo = motore.mesi_attivi
 
 if not df_pattern.empty:
-    df_pattern["Indice potenziale"] = (
-        (df_pattern["Trend medio (mesi attivi)"].rank(pct=True) * 0.5) +
-        (df_pattern["Variazione % ultimo anno"].rank(pct=True) * 0.5)
-    ) * 100
-
-    df_pattern = df_pattern.sort_values("Indice potenziale", ascending=False)
-
     # 🔹 Rimuoviamo le voci "Altri Paesi" dalla Top10 principale
-    df_reali = df_pattern[~df_pattern["Paese"].str.contains("Altri", case=False, na=False)]
-    top10_reali = df_reali.head(10)
-    altri = df_pattern[df_pattern["Paese"].str.contains("Altri", case=False, na=False)].head(5)
+    top10_reali, altri = migliori_mercati(df_pattern, n=10)
 
     st.markdown(f"""
 #### 📊 Valutazione quantitativa dei mercati
@@ -326,6 +298,7 @@ else:
 # ---------------------------------------------------------
 # 🤖 ANALISI AUTOMATICA DEI PATTERN TURISTICI
 # ---------------------------------------------------------
+traccia.fase("🤖 Pattern turistici")
 st.markdown("### 🤖 Analisi automatica dei pattern turistici")
 
 # 📘 Legenda - Classificazione dei pattern (nuova)
@@ -342,49 +315,6 @@ with st.expander("📘 Legenda - Classificazione dei pattern turistici"):
         - 🆕 *Nuovo mercato*: presenza recente o non ancora consolidata.
     """)
 
-df_filtrato = df_filtrato.copy()
-pattern_results = []
-
-for paese, dfp in df_filtrato.groupby("Paese"):
-    dfp = dfp[dfp["Mese"].isin(mesi_attivi_ultimo)]
-    if dfp["Anno"].nunique() < 3:
-        continue
-
-    by_year = dfp.groupby("Anno")["Presenze"].sum().reset_index().sort_values("Anno")
-
-    X = by_year["Anno"].values.reshape(-1, 1)
-    y = by_year["Presenze"].values
-    model = LinearRegression().fit(X, y)
-    slope = model.coef_[0]
-    cagr = ((by_year["Presenze"].iloc[-1] / by_year["Presenze"].iloc[0]) ** (1 / (len(by_year) - 1)) - 1) * 100 if len(by_year) > 1 else np.nan
-
-    stagionalita_rel = dfp.groupby(["Anno", "Mese"])["Presenze"].sum().groupby("Anno").apply(lambda x: (x.std() / x.mean()) * 100).mean()
-
-    diff = by_year["Presenze"].diff()
-    anni_crescita = (diff > 0).sum()
-    anni_totali = len(by_year)
-    ratio_crescita = anni_crescita / max(anni_totali - 1, 1)
-
-    if slope > 0 and ratio_crescita > 0.7:
-        categoria = "📈 Crescita costante"
-    elif slope > 0 and ratio_crescita <= 0.7:
-        categoria = "🔁 Ciclico / variabile"
-    elif slope < 0:
-        categoria = "📉 In calo o stagnante"
-    else:
-        categoria = "🆕 Nuovo mercato"
-
-    pattern_results.append({
-        "Paese": paese,
-        "Trend medio": slope,
-        "Crescita % media annua (CAGR)": cagr,
-        "Indice di stagionalità (%)": stagionalita_rel,
-        "Continuità crescita": f"{ratio_crescita*100:.1f}%",
-        "Pattern rilevato": categoria
-    })
-
-df_patterns = pd.DataFrame(pattern_results)
-
 if not df_patterns.empty:
     df_patterns = df_patterns[~df_patterns["Paese"].str.contains("Totale stranieri", case=False, na=False)]
 
@@ -438,3 +368,8 @@ else:
 # ---------------------------------------------------------
 st.markdown("---")
 st.caption("© 2025 Dashboard Fondazione D.M.O. Dolomiti Bellunesi - Per uso interno - Tutti i diritti riservati.")
+
+# ---------------------------------------------------------
+# ⏱️ PERFORMANCE
+# ---------------------------------------------------------
+pannello_performance(st, traccia, registro=REGISTRO, risultati=RISULTATI)
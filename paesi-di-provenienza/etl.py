@@ -1,82 +1,201 @@
+import io
+import numpy as np
 import pandas as pd
 import os
+import sys
 import glob
+import fnmatch
 
-def load_data(data_dir="dati-paesi-di-provenienza", prefix="presenze-dolomiti-estero"):
+# Rende importabile il pacchetto condiviso `dmo` (cartella madre del repository).
+# Aggiunto in coda a sys.path, così `etl` continua a risolversi in questo file.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from dmo.incremental import IncrementalStore
+from dmo.parallel import parse_files
+from dmo.schema import compact_frame
+from dmo.largo import MatriceMensile
+from dmo.sorgenti import versione_corrente
+from dmo.tracing import tracciato
+
+MESI_ORDINE = [
+    "Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio", "Giugno",
+    "Luglio", "Agosto", "Settembre", "Ottobre", "Novembre", "Dicembre"
+]
+
+
+def _leggi_tabella_paesi(file: str):
+    """
+    Legge il file come blocco: (intestazioni, etichette dei mesi, celle mesi × Paesi come testo).
+
+    Layout: riga ";;;…;TOTALE" (saltata), riga con MESE e i Paesi, una riga per mese.
+    Le righe sono poche e larghe: si separano i campi direttamente, senza costruire un DataFrame
+    con una colonna per Paese. Con campi tra virgolette si usa il parser C di pandas.
+    """
+    with open(file, encoding="utf-8") as f:
+        testo = f.read()
+
+    if '"' in testo:
+        df = pd.read_csv(io.StringIO(testo), sep=";", skiprows=1, header=0, engine="c", dtype=str,
+                         keep_default_na=False)
+        return list(df.columns), df.iloc[:, 0].tolist(), df.iloc[:, 1:].to_numpy(dtype=object)
+
+    righe = [r for r in testo.splitlines()[1:] if r.strip()]
+    if not righe:
+        raise ValueError("File vuoto o senza intestazione")
+    intestazioni = [c if c.strip() else f"Unnamed: {i}" for i, c in enumerate(righe[0].split(";"))]
+    n = len(intestazioni)
+
+    celle = []
+    for numero, riga in enumerate(righe[1:], start=3):
+        campi = riga.split(";")
+        if len(campi) > n:
+            raise ValueError(f"Riga {numero}: attesi {n} campi, trovati {len(campi)}")
+        celle.append(campi + [""] * (n - len(campi)))
+    blocco = np.array(celle, dtype=object).reshape(len(celle), n)
+    return intestazioni, blocco[:, 0].tolist(), blocco[:, 1:]
+
+
+def _blocco_paesi(file: str):
+    """
+    Legge un singolo file annuale in forma larga: (anno, Paesi, codici dei mesi, valori [mesi × Paesi]).
+    I codici sono le posizioni in `MESI_ORDINE` (-1 = riga non valida).
+    Solleva un'eccezione se il file non è leggibile.
+
+    I numeri sono convertiti in una sola passata sull'intero blocco (celle vuote ";;" o non numeriche → 0);
+    etichette di Paesi e mesi vengono ripulite una sola volta, non riga per riga dopo il melt.
+    """
+    # Estrae l’anno dal nome file
+    year = int(os.path.basename(file).split("-")[-1].split(".")[0])
+
+    intestazioni, etichette_mesi, celle = _leggi_tabella_paesi(file)
+
+    # Colonna dei mesi: quella che contiene la parola "MESE" (o la prima)
+    i_mese = next((i for i, c in enumerate(intestazioni) if "MESE" in c.upper()), 0)
+    if i_mese != 0:
+        blocco = np.column_stack([np.array(etichette_mesi, dtype=object), celle])
+        etichette_mesi = blocco[:, i_mese].tolist()
+        celle = np.delete(blocco, i_mese, axis=1)
+    colonne_paesi = [c for i, c in enumerate(intestazioni) if i != i_mese]
+
+    # --- Valori: matrice mesi × Paesi ---
+    n_mesi, n_paesi = celle.shape
+    valori = pd.to_numeric(pd.Series(celle.ravel(order="F"), dtype=object).str.strip(), errors="coerce")
+    valori = valori.fillna(0).to_numpy().astype(np.int64).reshape(n_mesi, n_paesi, order="F")
+
+    # 🔧 Pulizia etichette (una volta per colonna / per riga del file)
+    paesi = pd.Index(colonne_paesi, dtype=object).str.replace(" Paese", "", regex=False).str.strip()
+    mesi = pd.Index(etichette_mesi, dtype=object).str.replace(r"^\d+", "", regex=True).str.strip()
+    codici_mesi = pd.Categorical(mesi, categories=MESI_ORDINE, ordered=True).codes
+    return year, paesi.to_numpy(dtype=object), codici_mesi, valori
+
+
+def _parse_file_paesi(file: str):
+    """
+    Legge un singolo file annuale e lo restituisce in formato lungo [Mese, Anno, Paese, Presenze].
+    Solleva un'eccezione se il file non è leggibile.
+    """
+    year, paesi, codici_mesi, valori = _blocco_paesi(file)
+    n_mesi, n_paesi = valori.shape
+
+    # --- Formato lungo nello stesso ordine del melt (Paese per Paese, mesi in ordine di file) ---
+    df_long = pd.DataFrame({
+        "Mese": pd.Categorical.from_codes(np.tile(codici_mesi, n_paesi), categories=MESI_ORDINE, ordered=True),
+        "Anno": np.full(n_mesi * n_paesi, year, dtype=np.int64),
+        "Paese": np.repeat(paesi, n_mesi),
+        "Presenze": valori.ravel(order="F"),
+    })
+
+    # --- Rimuove righe vuote o non valide ---
+    return df_long[df_long["Mese"].notna() & df_long["Paese"].notna()]
+
+
+def _selezione_paesi(data_dir, prefix):
+    """
+    Versione pubblicata corrente della cartella (None se non disponibile) e i suoi file `<prefix>-*.txt`.
+    """
+    sorgenti = versione_corrente(data_dir, "paesi")
+    if sorgenti is None:
+        return None, sorted(glob.glob(os.path.join(data_dir, f"{prefix}-*.txt")))
+    return sorgenti, [rel for rel in sorgenti.relativi() if fnmatch.fnmatchcase(rel, f"{prefix}-*.txt")]
+
+
+def file_paesi(data_dir="dati-paesi-di-provenienza", prefix="presenze-dolomiti-estero") -> list:
+    """
+    File sorgente `<prefix>-<anno>.txt` della versione corrente della cartella, in ordine di nome.
+    """
+    sorgenti, file = _selezione_paesi(data_dir, prefix)
+    return file if sorgenti is None else [sorgenti.path(rel) for rel in file]
+
+
+@tracciato("etl.load_data")
+def load_data(data_dir="dati-paesi-di-provenienza", prefix="presenze-dolomiti-estero", incremental=False,
+              jobs=1, executor="process", compact=False, formato="lungo"):
     """
     Carica i file di presenze turistiche in formato:
     presenze-dolomiti-estero-2023.txt, presenze-dolomiti-estero-2024.txt, ecc.
     Restituisce un DataFrame in formato lungo: [Anno, Mese, Paese, Presenze]
+
+    Con `incremental=True` usa lo store consolidato e rilegge solo i file aggiunti o modificati.
+    Con `jobs` > 1 (o -1 = tutti i core) i file sono letti in parallelo; gli errori per file
+    sono raccolti in `df_long.attrs["errori"]`.
+    Con `compact=True` restituisce lo schema compatto (Paese categorico, Presenze int32, Anno uint16).
+
+    Con `formato="largo"` restituisce una `MatriceMensile` [Paese, Anno, Mese]: i blocchi annuali
+    sono impilati così come sono letti, senza melt, e il formato lungo è la sua vista `.lungo`.
+
+    I file sono letti dalla versione pubblicata corrente della cartella (`dmo.sorgenti`);
+    `attrs["versione"]` è l'identificativo del contenuto dei file letti.
     """
+    if formato not in ("lungo", "largo"):
+        raise ValueError(f"Formato non supportato: {formato}")
 
     # --- Controllo cartella ---
     if not os.path.exists(data_dir):
         raise FileNotFoundError(f"La cartella '{data_dir}' non esiste.")
 
-    # --- Cerca tutti i file corrispondenti ---
-    pattern = os.path.join(data_dir, f"{prefix}-*.txt")
-    all_files = sorted(glob.glob(pattern))
+    # --- Cerca tutti i file corrispondenti (nella versione pubblicata corrente della cartella) ---
+    sorgenti, file = _selezione_paesi(data_dir, prefix)
+    all_files = file if sorgenti is None else [sorgenti.path(rel) for rel in file]
+    versione = sorgenti.versione_di(file) if sorgenti is not None else None
 
     if not all_files:
         raise FileNotFoundError(f"Nessun file trovato in '{data_dir}' con prefisso '{prefix}-'.")
 
-    df_list = []
-
     # --- Lettura dei file ---
-    for file in all_files:
-        try:
-            # Estrae l’anno dal nome file
-            year = int(os.path.basename(file).split("-")[-1].split(".")[0])
-
-            # Legge il file: separatore ";" e header alla seconda riga (header=1)
-            df = pd.read_csv(file, sep=";", header=1, engine="python")
-
-            # Rinomina la prima colonna in "Mese"
-            # Trova automaticamente la colonna che contiene la parola "MESE"
-            col_mese = next((c for c in df.columns if "MESE" in c.upper()), df.columns[0])
-            df.rename(columns={col_mese: "Mese"}, inplace=True)
-            df["Anno"] = year
-
-            df_list.append(df)
-        except Exception as e:
-            print(f"⚠️ Errore nel file {file}: {e}")
-
-    if not df_list:
-        raise ValueError("Nessun file valido caricato — controlla il formato dei file.")
-
-    # --- Combina tutti i DataFrame ---
-    df = pd.concat(df_list, ignore_index=True)
-
-    # --- Trasforma da formato largo a lungo ---
-    df_long = df.melt(id_vars=["Mese", "Anno"], var_name="Paese", value_name="Presenze")
-
-    # --- Pulizia e conversione ---
-    df_long["Presenze"] = pd.to_numeric(df_long["Presenze"], errors="coerce").fillna(0).astype(int)
-
-    # 🔧 Pulizia nomi Paesi
-    df_long["Paese"] = (
-        df_long["Paese"]
-        .astype(str)
-        .str.replace(" Paese", "", regex=False)
-        .str.strip()
-    )
-
-    # 🔧 Pulizia nomi Mesi (rimuove numeri iniziali tipo "01Gennaio")
-    df_long["Mese"] = (
-        df_long["Mese"]
-        .astype(str)
-        .str.replace(r"^\d+", "", regex=True)
-        .str.strip()
-    )
-
-    # --- Ordina i mesi in ordine cronologico ---
-    mesi_ordine = [
-        "Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio", "Giugno",
-        "Luglio", "Agosto", "Settembre", "Ottobre", "Novembre", "Dicembre"
-    ]
-    df_long["Mese"] = pd.Categorical(df_long["Mese"], categories=mesi_ordine, ordered=True)
-
-    # --- Rimuove righe vuote o non valide ---
-    df_long = df_long[df_long["Mese"].notna() & df_long["Paese"].notna()]
-
+    if formato == "largo" and not incremental:
+        blocchi, errori = parse_files(all_files, _blocco_paesi, jobs=jobs, executor=executor)
+        blocchi = [b for b in blocchi if b is not None]
+        if not blocchi:
+            dettaglio = "; ".join(f"{os.path.basename(e['file'])}: {e['errore']}" for e in errori)
+            raise ValueError(f"Nessun file valido caricato — controlla il formato dei file. {dettaglio}".strip())
+        matrice = MatriceMensile.da_blocchi(blocchi, MESI_ORDINE)
+        matrice.attrs["errori"] = errori
+        if versione is not None:
+            matrice.attrs["versione"] = versione
+        return matrice
+
+    if incremental:
+        store = IncrementalStore(prefix, data_dir, _parse_file_paesi)
+        df_long = store.refresh(all_files, jobs=jobs, executor=executor)
+        errori = store.errori
+    else:
+        df_list, errori = parse_files(all_files, _parse_file_paesi, jobs=jobs, executor=executor)
+        df_list = [df for df in df_list if df is not None]
+        df_long = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame()
+
+    if df_long.empty:
+        dettaglio = "; ".join(f"{os.path.basename(e['file'])}: {e['errore']}" for e in errori)
+        raise ValueError(f"Nessun file valido caricato — controlla il formato dei file. {dettaglio}".strip())
+
+    if compact:
+        df_long = compact_frame(df_long, dimensioni=["Paese"], misure=["Presenze"], anno="Anno")
+
+    df_long.attrs["errori"] = errori
+    if versione is not None:
+        df_long.attrs["versione"] = versione
+    if formato == "largo":
+        return MatriceMensile.da_frame(df_long, mesi=MESI_ORDINE)
     return df_long
+
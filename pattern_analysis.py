@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from statsmodels.tsa.seasonal import seasonal_decompose
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+
+from dmo.lazy import importa_differito
+from dmo.stagionalita import decomposizione_per_versione
+from dmo.clustering import profili_per_versione, cluster_per_versione, sweep_k
+
+# Librerie grafiche caricate solo quando una sezione disegna un grafico
+plt = importa_differito("matplotlib.pyplot")
+sns = importa_differito("seaborn")
 
 # =========================
 # 1️⃣ Analisi stagionale (trend + stagionalità + residuo)
@@ -13,26 +16,60 @@ def analisi_stagionale(df, comune):
     """
     Mostra la decomposizione stagionale (trend, stagionalità, residuo)
     per un Comune selezionato.
+    La decomposizione di tutti i Comuni è calcolata una sola volta per versione del dataset:
+    cambiare Comune è una semplice consultazione.
     """
-    ordine_mesi = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu",
-                   "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
-
-    df_comune = df[df["Comune"] == comune].groupby(["anno", "mese"])["presenze"].sum().reset_index()
-    df_comune["mese_num"] = df_comune["mese"].apply(lambda x: ordine_mesi.index(x) + 1)
-    df_comune["data"] = pd.to_datetime(df_comune["anno"].astype(str) + "-" + df_comune["mese_num"].astype(str) + "-01")
-    df_comune = df_comune.sort_values("data").set_index("data")
+    dec = decomposizione_per_versione(df, col_entita="Comune", nome="comuni")
+    if comune not in dec.entita:
+        st.warning(f"Nessun dato disponibile per {comune}.")
+        return
 
-    if len(df_comune) < 24:
+    risultato = dec.risultato(comune)
+    if len(risultato) < 24:
         st.warning("Servono almeno 24 punti temporali (2 anni di dati completi) per una decomposizione significativa.")
         return
 
-    result = seasonal_decompose(df_comune["presenze"], model="additive", period=12)
-
-    fig = result.plot()
+    fig, axes = plt.subplots(4, 1, sharex=True)
+    risultato["osservato"].plot(ax=axes[0])
+    axes[0].set_ylabel("presenze")
+    risultato["trend"].plot(ax=axes[1])
+    axes[1].set_ylabel("Trend")
+    risultato["stagionale"].plot(ax=axes[2])
+    axes[2].set_ylabel("Seasonal")
+    axes[3].plot(risultato.index, risultato["residuo"], marker="o", linestyle="none")
+    axes[3].axhline(0, color="#000000", zorder=-3)
+    axes[3].set_ylabel("Resid")
     fig.set_size_inches(10, 6)
+    fig.tight_layout()
     st.pyplot(fig)
 
 
+def analisi_residui_provincia(df, soglia=2.0):
+    """
+    Residui della decomposizione per tutti i Comuni della provincia:
+    andamento del residuo complessivo e mesi anomali (|residuo| oltre `soglia` deviazioni standard).
+    """
+    dec = decomposizione_per_versione(df, col_entita="Comune", nome="comuni")
+    residui = dec.residui()
+
+    totale = residui.sum(axis=0, min_count=1).dropna()
+    if totale.empty:
+        st.warning("Servono almeno 24 punti temporali (2 anni di dati completi) per una decomposizione significativa.")
+        return
+
+    fig, ax = plt.subplots(figsize=(10, 4))
+    totale.plot(ax=ax, marker="o")
+    ax.axhline(0, color="#000000", zorder=-3)
+    ax.set_title("Residuo complessivo della provincia (somma dei Comuni)")
+    ax.set_xlabel("Data")
+    ax.set_ylabel("Presenze")
+    st.pyplot(fig)
+
+    anomalie = dec.anomalie(soglia).rename(columns={"entita": "Comune"})
+    st.subheader(f"🚨 Mesi anomali (|residuo| > {soglia:g} deviazioni standard)")
+    st.dataframe(anomalie)
+
+
 # =========================
 # 2️⃣ Seasonal subseries plot (pattern mensili tra anni)
 # =========================
@@ -61,25 +98,19 @@ def seasonal_subseries_plot(df, comune):
 # =========================
 # 3️⃣ Clustering Comuni per pattern stagionale
 # =========================
-def clustering_comuni(df, n_clusters=4):
+def clustering_comuni(df, n_clusters=4, metodo="kmeans"):
     """
     Raggruppa i Comuni in base alla loro stagionalità media (profilo mensile delle presenze).
+    Profili e cluster sono calcolati una sola volta per versione del dataset.
     """
-    ordine_mesi = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu",
-                   "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
-
-    pivot = df.pivot_table(index="Comune", columns="mese", values="presenze", aggfunc="mean").fillna(0)
-    pivot = pivot[ordine_mesi]
+    profili = profili_per_versione(df, col_entita="Comune")
+    pivot = profili.profili.copy()
 
     if len(pivot) < n_clusters:
         st.warning("Numero di cluster troppo alto rispetto al numero di Comuni disponibili.")
         return
 
-    scaler = StandardScaler()
-    X = scaler.fit_transform(pivot)
-
-    model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    pivot["Cluster"] = model.fit_predict(X)
+    pivot["Cluster"] = cluster_per_versione(df, n_clusters, col_entita="Comune", metodo=metodo).cluster
 
     st.subheader("🧩 Comuni raggruppati per pattern stagionale")
     st.dataframe(pivot.reset_index()[["Comune", "Cluster"]])
@@ -92,3 +123,25 @@ def clustering_comuni(df, n_clusters=4):
     ax.set_xlabel("Mese")
     ax.set_ylabel("Presenze (standardizzate)")
     st.pyplot(fig)
+
+
+def scelta_numero_cluster(df, ks=range(2, 9), jobs=-1):
+    """
+    Inerzia (metodo del gomito) e silhouette per diversi numeri di cluster.
+    """
+    sweep = sweep_k(profili_per_versione(df, col_entita="Comune"), ks, jobs=jobs)
+    if sweep.empty:
+        st.warning("Numero di Comuni insufficiente per confrontare più numeri di cluster.")
+        return
+
+    st.subheader("🔍 Scelta del numero di cluster")
+    st.dataframe(sweep)
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
+    ax1.plot(sweep["k"], sweep["inerzia"], marker="o")
+    ax1.set_title("Inerzia")
+    ax1.set_xlabel("Numero di cluster")
+    ax2.plot(sweep["k"], sweep["silhouette"], marker="o")
+    ax2.set_title("Silhouette")
+    ax2.set_xlabel("Numero di cluster")
+    st.pyplot(fig)
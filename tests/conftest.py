@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+# Le cartelle di lavoro (cache, risultati, trace, artefatti, sorgenti) sono lette all'import dei moduli:
+# i test le puntano su una cartella temporanea prima di importare `dmo`, così non toccano `.cache`
+_TMP = tempfile.mkdtemp(prefix="dmo-test-")
+os.environ.setdefault("DMO_CACHE_DIR", os.path.join(_TMP, "etl"))
+os.environ.setdefault("DMO_STORE_DIR", os.path.join(_TMP, "store"))
+os.environ.setdefault("DMO_RISULTATI_PATH", os.path.join(_TMP, "risultati.sqlite"))
+os.environ.setdefault("DMO_TRACE_DIR", os.path.join(_TMP, "trace"))
+os.environ.setdefault("DMO_ARTEFATTI_DIR", os.path.join(_TMP, "artefatti"))
+os.environ.setdefault("DMO_SORGENTI_DIR", os.path.join(_TMP, "sorgenti"))
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
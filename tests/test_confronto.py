@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dmo.cube import MESI, Cubo
+from dmo.confronto import ConfrontoAnni, aggiungi_variazioni
+
+
+@pytest.fixture
+def df_comuni():
+    """
+    Presenze comunali in formato lungo; il 2024 è alimentato fino a luglio e ha un mese a 0 per un comune.
+    """
+    rng = np.random.default_rng(3)
+    righe = []
+    for comune in ["Cortina d'Ampezzo", "Auronzo di Cadore", "Belluno"]:
+        for anno in [2022, 2023, 2024]:
+            for i, mese in enumerate(MESI):
+                if anno == 2024 and i >= 7:
+                    continue
+                valore = 0 if (comune == "Belluno" and anno == 2024 and mese == "Mar") else int(rng.integers(1, 9000))
+                righe.append((comune, anno, mese, valore))
+    return pd.DataFrame(righe, columns=["comune", "anno", "mese", "presenze"])
+
+
+def _variazione_baseline(df_com, anno_prev, anno_recent):
+    """
+    Variazione % di un comune come nella dashboard: solo i mesi con valore > 0 nell'anno più recente.
+    """
+    recenti = df_com[df_com["anno"] == anno_recent][["mese", "presenze"]].dropna(subset=["presenze"])
+    recenti = recenti[recenti["presenze"] > 0]["mese"].unique().tolist()
+    mesi_disponibili = [m for m in MESI if m in recenti]
+    prev_val = df_com.loc[(df_com["anno"] == anno_prev) & df_com["mese"].isin(mesi_disponibili), "presenze"].sum()
+    recent_val = df_com.loc[(df_com["anno"] == anno_recent) & df_com["mese"].isin(mesi_disponibili), "presenze"].sum()
+    var_pct = (recent_val - prev_val) / prev_val * 100 if prev_val else float("nan")
+    return mesi_disponibili, recent_val - prev_val, var_pct
+
+
+@pytest.mark.parametrize("anni", [(2022, 2023), (2022, 2024), (2023, 2024)])
+def test_variazione_come_baseline(df_comuni, anni):
+    anno_prev, anno_recent = anni
+    df = df_comuni[df_comuni["anno"].isin(anni)]
+    confronto = ConfrontoAnni.da_frame(df, "anno", "mese", "presenze", col_entita="comune")
+    dal_cubo = ConfrontoAnni.da_cubo(Cubo.from_frame(df_comuni), anni=list(anni))
+
+    for comune in df["comune"].unique():
+        mesi, differenza, variazione = _variazione_baseline(df[df["comune"] == comune], anno_prev, anno_recent)
+        for c in (confronto, dal_cubo):
+            assert c.mesi_allineati(comune) == mesi
+            assert c.differenza(anno_prev)[comune] == differenza
+            assert c.variazione(anno_prev)[comune] == pytest.approx(variazione)
+
+
+def test_tabella_tutte_le_coppie(df_comuni):
+    confronto = ConfrontoAnni.da_frame(df_comuni, "anno", "mese", "presenze", col_entita="comune")
+    tabella = confronto.tabella()
+    assert len(tabella) == 3 * 3
+    for riga in tabella.itertuples():
+        df_com = df_comuni[df_comuni["comune"] == riga.entita]
+        # tutte le coppie sono sui mesi allineati all'anno di riferimento (2024)
+        per_anno = df_com[df_com["mese"].isin(confronto.mesi_allineati(riga.entita))].groupby("anno")["presenze"].sum()
+        assert riga.totale_base == per_anno[riga.anno_base]
+        assert riga.totale == per_anno[riga.anno]
+        if riga.anno == 2024:
+            _, differenza, variazione = _variazione_baseline(df_com, riga.anno_base, 2024)
+            assert riga.differenza == differenza
+            assert riga.variazione_pct == pytest.approx(variazione)
+
+
+def test_aggiungi_variazioni_come_baseline(df_comuni):
+    tabella = (
+        df_comuni.groupby(["anno", "mese"])["presenze"].sum().reset_index()
+        .pivot_table(index="mese", columns="anno", values="presenze", fill_value=0)
+        .reindex(MESI)
+    )
+    attesa = tabella.copy()
+    attesa["Differenza"] = attesa[2024] - attesa[2023]
+    attesa["Variazione %"] = (attesa["Differenza"] / attesa[2023].replace(0, pd.NA)) * 100
+
+    risultato = aggiungi_variazioni(tabella, 2023, 2024)
+    assert risultato is tabella
+    np.testing.assert_array_equal(risultato["Differenza"], attesa["Differenza"])
+    np.testing.assert_allclose(risultato["Variazione %"], attesa["Variazione %"].astype(float))
+
+
+def test_aggiungi_variazioni_tipi():
+    interi = pd.DataFrame({2023: np.array([10, 0, 5], dtype=np.int32), 2024: np.array([12, 3, 0], dtype=np.int32)})
+    aggiungi_variazioni(interi, 2023, 2024)
+    assert interi["Differenza"].dtype == np.int32
+    assert list(interi["Differenza"]) == [2, 3, -5]
+    np.testing.assert_allclose(interi["Variazione %"], [20.0, np.nan, -100.0])
+
+    senza_segno = pd.DataFrame({"a": np.array([5], dtype=np.uint32), "b": np.array([3], dtype=np.uint32)})
+    aggiungi_variazioni(senza_segno, "a", "b")
+    assert senza_segno["Differenza"].dtype == np.int64 and senza_segno["Differenza"][0] == -2
+
+    mancanti = pd.DataFrame({"a": [1.0, np.nan], "b": [2.0, 4.0]})
+    aggiungi_variazioni(mancanti, "a", "b")
+    np.testing.assert_allclose(mancanti["Differenza"], [1.0, np.nan])
+    np.testing.assert_allclose(mancanti["Variazione %"], [100.0, np.nan])
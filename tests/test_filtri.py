@@ -0,0 +1,74 @@
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dmo import filtri
+from dmo.cube import MESI
+from dmo.filtri import IndiceFiltri, indice_filtri
+
+
+@pytest.fixture
+def df():
+    """
+    Frame comunale non ordinato, con il mese categorico e qualche comune mancante (NaN).
+    """
+    rng = np.random.default_rng(5)
+    n = 2000
+    comuni = np.array(["Belluno", "Feltre", "Cortina d'Ampezzo", "Agordo", None], dtype=object)
+    return pd.DataFrame({
+        "anno": rng.choice([2021, 2022, 2023, 2024], n),
+        "comune": rng.choice(comuni, n),
+        "mese": pd.Categorical(rng.choice(MESI, n), categories=MESI, ordered=True),
+        "presenze": rng.integers(0, 1000, n),
+    })
+
+
+def _baseline(df, anni=None, comuni=None, mesi=None):
+    maschera = pd.Series(True, index=df.index)
+    if anni is not None:
+        maschera &= df["anno"].isin(anni)
+    if comuni is not None:
+        maschera &= df["comune"].isin(comuni)
+    if mesi is not None:
+        maschera &= df["mese"].isin(mesi)
+    return df[maschera]
+
+
+@pytest.mark.parametrize("selezione", [
+    {},
+    {"anni": [2022]},
+    {"comuni": ["Belluno", "Agordo"], "mesi": ["Gen", "Dic"]},
+    {"anni": [2021, 2024], "comuni": ["Feltre"], "mesi": MESI},
+    {"anni": [2030]},
+    {"comuni": ["Inesistente"], "mesi": ["Gen"]},
+    {"anni": [], "comuni": ["Belluno"]},
+])
+def test_filtra_come_isin(df, selezione):
+    indice = IndiceFiltri(df, ["anno", "comune", "mese"])
+    risultato = indice.filtra(anno=selezione.get("anni"), comune=selezione.get("comuni"), mese=selezione.get("mesi"))
+    pd.testing.assert_frame_equal(risultato, _baseline(df, **selezione))
+
+
+def test_righe_memorizzate_in_sola_lettura(df):
+    indice = IndiceFiltri(df, ["anno", "comune"], max_memo=2)
+    righe = indice.righe(anno=[2022], comune=["Belluno"])
+    # stessa selezione in un altro ordine → stessa voce della LRU
+    assert indice.righe(comune=["Belluno"], anno=[2022]) is righe
+    assert not righe.flags.writeable
+    indice.righe(anno=[2021])
+    indice.righe(anno=[2023])
+    assert len(indice._memo) == 2
+
+
+def test_indice_per_frame(df):
+    df = df.copy()      # il fixture resta referenziato da pytest: la copia no
+    indice = indice_filtri(df, ["anno", "comune"])
+    assert indice_filtri(df, ["anno", "comune"]) is indice
+    assert indice_filtri(df, ["anno", "mese"]) is not indice
+
+    chiave = id(df)
+    del df, indice
+    gc.collect()
+    assert chiave not in filtri._INDICI
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dmo.largo import MatriceMensile
+from dmo.mercati import MESI_ESTESI
+
+
+@pytest.fixture
+def df_long():
+    """
+    Presenze per Paese in formato lungo, con celle mancanti (non solo a 0) sparse su tutti gli assi.
+    """
+    rng = np.random.default_rng(19)
+    righe = [
+        (mese, anno, paese, int(rng.integers(0, 20000)))
+        for paese in ["Germania", "Austria", "Paesi Bassi", "Totale stranieri"]
+        for anno in [2022, 2023, 2024]
+        for mese in MESI_ESTESI
+    ]
+    df = pd.DataFrame(righe, columns=["Mese", "Anno", "Paese", "Presenze"])
+    df = df.sample(frac=0.8, random_state=1).sort_index().reset_index(drop=True)
+    df["Mese"] = pd.Categorical(df["Mese"], categories=MESI_ESTESI, ordered=True)
+    return df
+
+
+@pytest.mark.parametrize("selezione", [
+    {},
+    {"anni": [2023, 2024]},
+    {"paesi": ["Germania", "Paesi Bassi"], "mesi": ["Gennaio", "Luglio", "Agosto"]},
+    {"paesi": ["Austria"], "anni": [2022], "mesi": ["Dicembre"]},
+])
+def test_tabella_mesi_entita_come_pivot(df_long, selezione):
+    anni, paesi, mesi = selezione.get("anni"), selezione.get("paesi"), selezione.get("mesi")
+    filtrato = df_long[
+        df_long["Anno"].isin(anni or df_long["Anno"].unique())
+        & df_long["Paese"].isin(paesi or df_long["Paese"].unique())
+        & df_long["Mese"].isin(mesi or MESI_ESTESI)
+    ]
+    attesa = (
+        filtrato.pivot_table(index=["Mese", "Paese"], columns="Anno", values="Presenze", aggfunc="sum",
+                             observed=False)
+        .fillna(0)
+        .reset_index()
+    )
+
+    matrice = MatriceMensile.da_frame(df_long)
+    tabella = matrice.tabella_mesi_entita(paesi, anni, mesi)
+    pd.testing.assert_frame_equal(tabella, attesa, check_dtype=False, check_categorical=False)
+    assert all(tabella[anno].dtype == np.int64 for anno in tabella.columns[2:])
+
+
+def test_totali_anno_come_groupby(df_long):
+    attesa = (
+        df_long[~df_long["Paese"].str.contains("Totale", case=False, na=False)]
+        .groupby(["Anno", "Paese"], as_index=False)["Presenze"].sum()
+    )
+    totali = MatriceMensile.da_frame(df_long).totali_anno(escludi="Totale")
+    pd.testing.assert_frame_equal(totali, attesa, check_dtype=False)
+
+
+def test_lungo_ricostruisce_il_frame(df_long):
+    lungo = MatriceMensile.da_frame(df_long).lungo
+    attesa = df_long.sort_values(["Anno", "Paese", "Mese"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(lungo[attesa.columns], attesa, check_dtype=False)
+
+
+def test_archivio_memory_mapped(df_long, tmp_path):
+    matrice = MatriceMensile.da_frame(df_long)
+    matrice.salva(str(tmp_path / "paesi"))
+    caricata = MatriceMensile.carica(str(tmp_path / "paesi"))
+
+    # vista senza copia sul file memory-mapped, nel tipo dell'archivio
+    assert caricata.valori.dtype == np.int32 and not caricata.valori.flags.owndata
+    assert isinstance(caricata.valori.base, np.memmap)
+    assert caricata.versione == matrice.versione
+    pd.testing.assert_frame_equal(caricata.tabella_mesi_entita(), matrice.tabella_mesi_entita())
+    pd.testing.assert_frame_equal(caricata.totali_anno(), matrice.totali_anno(), check_dtype=False)
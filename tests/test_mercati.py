@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from dmo.largo import MatriceMensile
+from dmo.mercati import MESI_ESTESI, MotoreMercati, tabelle_per_versione, migliori_mercati
+
+
+@pytest.fixture
+def df_long():
+    """
+    Presenze per Paese × anno × mese con buchi: anni mancanti per alcuni Paesi, un Paese con due soli
+    anni e l'ultimo anno alimentato solo fino ad agosto (come l'anno in corso nei file).
+    """
+    rng = np.random.default_rng(7)
+    paesi = ["Germania", "Austria", "Francia", "Altri Paesi d'Europa", "Giappone", "Totale stranieri"]
+    righe = []
+    for paese in paesi:
+        anni = [2019, 2020, 2021, 2022, 2023, 2024]
+        if paese == "Francia":
+            anni = [2019, 2021, 2022, 2024]
+        if paese == "Giappone":
+            anni = [2023, 2024]
+        for anno in anni:
+            for i, mese in enumerate(MESI_ESTESI):
+                if anno == 2024 and i >= 8:
+                    continue
+                righe.append((paese, anno, mese, int(rng.integers(0, 5000))))
+    df = pd.DataFrame(righe, columns=["Paese", "Anno", "Mese", "Presenze"])
+    df["Mese"] = pd.Categorical(df["Mese"], categories=MESI_ESTESI, ordered=True)
+    return df
+
+
+def _baseline(df_long):
+    """
+    Le due tabelle come le calcolava la dashboard: un groupby per Paese e una LinearRegression per Paese.
+    """
+    df = df_long[~df_long["Paese"].str.contains("Totale stranieri", case=False, na=False)]
+    ultimo_anno = int(df["Anno"].max())
+    attivi = df[df["Anno"] == ultimo_anno].groupby("Mese", observed=False, as_index=False)["Presenze"].sum()
+    attivi = attivi[attivi["Presenze"] > 0]["Mese"].tolist()
+
+    potenziale, pattern = [], []
+    for paese, dfp in df.groupby("Paese"):
+        dfp = dfp[dfp["Mese"].isin(attivi)]
+        if dfp["Anno"].nunique() < 3:
+            continue
+        by_year = dfp.groupby("Anno")["Presenze"].sum().reset_index().sort_values("Anno")
+        y = by_year["Presenze"].values
+        slope = LinearRegression().fit(by_year["Anno"].values.reshape(-1, 1), y).coef_[0]
+        potenziale.append({
+            "Paese": paese,
+            "Trend medio (mesi attivi)": slope,
+            "Variazione % ultimo anno": (y[-1] - y[-2]) / y[-2] * 100 if y[-2] != 0 else np.nan,
+            "Presenze ultimo anno (mesi attivi)": y[-1],
+        })
+        cagr = ((y[-1] / y[0]) ** (1 / (len(y) - 1)) - 1) * 100
+        stagionalita = (
+            dfp.groupby(["Anno", "Mese"], observed=False)["Presenze"].sum()
+            .groupby("Anno").apply(lambda x: (x.std() / x.mean()) * 100).mean()
+        )
+        ratio = (by_year["Presenze"].diff() > 0).sum() / max(len(by_year) - 1, 1)
+        pattern.append({
+            "Paese": paese,
+            "Trend medio": slope,
+            "Crescita % media annua (CAGR)": cagr,
+            "Indice di stagionalità (%)": stagionalita,
+            "Continuità crescita": f"{ratio*100:.1f}%",
+        })
+
+    potenziale = pd.DataFrame(potenziale)
+    potenziale["Indice potenziale"] = (
+        (potenziale["Trend medio (mesi attivi)"].rank(pct=True) * 0.5) +
+        (potenziale["Variazione % ultimo anno"].rank(pct=True) * 0.5)
+    ) * 100
+    return potenziale.sort_values("Indice potenziale", ascending=False), pd.DataFrame(pattern), attivi
+
+
+def test_tabelle_come_baseline(df_long):
+    attesa_potenziale, attesa_pattern, attivi = _baseline(df_long)
+    motore, potenziale, pattern = tabelle_per_versione(MatriceMensile.da_frame(df_long))
+
+    assert motore.mesi_attivi == attivi
+    assert list(potenziale["Paese"]) == list(attesa_potenziale["Paese"])
+    pd.testing.assert_frame_equal(potenziale.reset_index(drop=True), attesa_potenziale.reset_index(drop=True),
+                                  check_dtype=False)
+    pd.testing.assert_frame_equal(pattern.drop(columns="Pattern rilevato"), attesa_pattern, check_dtype=False)
+
+
+def test_migliori_mercati_separa_gli_aggregati(df_long):
+    _, potenziale, _ = tabelle_per_versione(MatriceMensile.da_frame(df_long))
+    reali, altri = migliori_mercati(potenziale, n=2)
+    assert len(reali) == 2 and not reali["Paese"].str.contains("Altri").any()
+    assert list(altri["Paese"]) == ["Altri Paesi d'Europa"]
+
+
+@pytest.mark.parametrize("forma", [(0, 0, 12), (3, 0, 12), (0, 4, 12), (2, 2, 12)])
+def test_matrice_vuota_da_tabelle_vuote(forma):
+    E, A, M = forma
+    motore = MotoreMercati(np.zeros(forma, dtype=np.int64), np.zeros(forma, dtype=bool),
+                           [f"P{i}" for i in range(E)], list(range(2020, 2020 + A)))
+    potenziale = motore.tabella_potenziale()
+    assert potenziale.empty and "Indice potenziale" in potenziale.columns
+    assert motore.tabella_pattern().empty
+    reali, altri = migliori_mercati(potenziale)
+    assert reali.empty and altri.empty
+
+
+def test_tutti_i_paesi_esclusi(df_long):
+    matrice = MatriceMensile.da_frame(df_long[df_long["Paese"] == "Totale stranieri"])
+    motore, potenziale, pattern = tabelle_per_versione(matrice)
+    assert len(motore.paesi) == 0 and motore.mesi_attivi == []
+    assert potenziale.empty and pattern.empty
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dmo.cube import MESI, Cubo
+from dmo.periodi import IndicePeriodi, etichetta_periodo
+
+
+@pytest.fixture
+def df_comuni():
+    """
+    Presenze comunali con un anno mancante (2023): la linea del tempo deve restare continua.
+    """
+    rng = np.random.default_rng(11)
+    righe = [
+        (comune, anno, mese, int(rng.integers(0, 7000)))
+        for comune in ["Cortina d'Ampezzo", "Livinallongo", "Belluno"]
+        for anno in [2021, 2022, 2024]
+        for mese in MESI
+    ]
+    return pd.DataFrame(righe, columns=["comune", "anno", "mese", "presenze"])
+
+
+def _mesi_periodo(anno, mese_da, mese_a):
+    """
+    Coppie (anno, mese) del periodo che termina nell'anno `anno`, a cavallo d'anno se `mese_da` segue `mese_a`.
+    """
+    i, j = MESI.index(mese_da), MESI.index(mese_a)
+    if i <= j:
+        return [(anno, m) for m in MESI[i:j + 1]]
+    return [(anno - 1, m) for m in MESI[i:]] + [(anno, m) for m in MESI[:j + 1]]
+
+
+def _totali_baseline(df, entita, mese_da, mese_a, anni):
+    """
+    Filtro sulle righe e groupby per ogni anno di fine periodo; NaN se il periodo inizia prima dei dati.
+    """
+    tabella = pd.DataFrame(np.nan, index=pd.Index(entita), columns=pd.Index(anni))
+    for anno in anni:
+        coppie = _mesi_periodo(anno, mese_da, mese_a)
+        if coppie[0][0] < df["anno"].min() or coppie[-1][0] > df["anno"].max():
+            continue
+        chiavi = pd.MultiIndex.from_frame(df[["anno", "mese"]])
+        righe = df[chiavi.isin(coppie) & df["comune"].isin(entita)]
+        tabella[anno] = righe.groupby("comune")["presenze"].sum().reindex(entita, fill_value=0).astype(float)
+    return tabella
+
+
+@pytest.mark.parametrize("periodo", [("Gen", "Dic"), ("Giu", "Set"), ("Dic", "Mar"), ("Nov", "Apr"), ("Mag", "Mag")])
+def test_totali_periodo_come_baseline(df_comuni, periodo):
+    indice = IndicePeriodi.from_cubo(Cubo.from_frame(df_comuni))
+    entita = ["Belluno", "Cortina d'Ampezzo"]
+    anni = [2021, 2022, 2023, 2024]
+
+    risultato = indice.totali_periodo(entita, *periodo, anni=anni)
+    pd.testing.assert_frame_equal(risultato, _totali_baseline(df_comuni, entita, *periodo, anni), check_names=False)
+
+
+def test_totali_periodo_tutte_le_entita(df_comuni):
+    indice = IndicePeriodi.from_cubo(Cubo.from_frame(df_comuni))
+    totale = indice.totali_periodo(None, "Dic", "Mar")
+    assert list(totale.index) == ["Totale"]
+    attesa = _totali_baseline(df_comuni, sorted(df_comuni["comune"].unique()), "Dic", "Mar", [2021, 2022, 2024])
+    np.testing.assert_allclose(totale.iloc[0].to_numpy(), attesa.sum(min_count=1).to_numpy())
+
+
+def test_totale_ytd_e_mesi(df_comuni):
+    indice = IndicePeriodi.from_cubo(Cubo.from_frame(df_comuni))
+    belluno = df_comuni[df_comuni["comune"] == "Belluno"]
+
+    def somma(anno, mesi):
+        return int(belluno[(belluno["anno"] == anno) & belluno["mese"].isin(mesi)]["presenze"].sum())
+
+    assert indice.totale("Belluno", (2021, "Nov"), (2022, "Feb")) == somma(2021, ["Nov", "Dic"]) + somma(2022, ["Gen", "Feb"])
+    assert indice.ytd("Belluno", 2024, "Giu") == somma(2024, MESI[:6])
+    assert indice.totale_mesi("Belluno", 2022, ["Gen", "Feb", "Lug", "Dic"]) == somma(2022, ["Gen", "Feb", "Lug", "Dic"])
+    # l'anno mancante vale 0, non sposta i mesi degli anni successivi
+    assert indice.totale("Belluno", (2023, "Gen"), (2023, "Dic")) == 0
+    assert indice.totale("Belluno", (2022, "Dic"), (2024, "Gen")) == somma(2022, ["Dic"]) + somma(2024, ["Gen"])
+
+
+def test_indice_vuoto():
+    indice = IndicePeriodi(np.zeros((0, 0, 12), dtype=np.int64), [], [])
+    assert indice.totali_periodo(None, "Gen", "Dic").empty
+
+
+def test_etichetta_periodo():
+    assert etichetta_periodo(2025, "Gen", "Mar") == "2025"
+    assert etichetta_periodo(2025, "Dic", "Mar") == "2024/25"
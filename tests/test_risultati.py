@@ -0,0 +1,92 @@
+import time
+import sqlite3
+
+import pytest
+
+from dmo import risultati
+from dmo.risultati import CacheRisultati
+
+_BLOB = 100_000     # circa 100 kB per risultato: con max_mb=0.25 ne stanno due
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # nessun flush automatico durante il test: ultimo uso e contatori restano in sospeso fino a `flush`/`put`
+    monkeypatch.setattr(risultati, "RISULTATI_FLUSH_S", 3600)
+    return CacheRisultati(str(tmp_path / "risultati.sqlite"), max_mb=0.25)
+
+
+def _chiavi(cache):
+    return {r[0] for r in cache._conn().execute("SELECT versione FROM risultati")}
+
+
+def test_ricorda_calcola_una_volta(cache):
+    chiamate = []
+
+    def calcola():
+        chiamate.append(1)
+        return {"valore": len(chiamate)}
+
+    assert cache.ricorda("f", "v1", {"k": 4}, calcola) == {"valore": 1}
+    assert cache.ricorda("f", "v1", {"k": 4}, calcola) == {"valore": 1}
+    assert len(chiamate) == 1
+    # altra versione dei dati, altri parametri o altro codice → nuovo calcolo
+    cache.ricorda("f", "v2", {"k": 4}, calcola)
+    cache.ricorda("f", "v1", {"k": 5}, calcola)
+    cache.ricorda("f", "v1", {"k": 4}, calcola, versione_codice="altro")
+    assert len(chiamate) == 4
+    assert cache.ultimo("f", {"k": 4}, escludi_versione="v2", versione_codice=risultati.impronta_modulo(__name__)) \
+        == {"valore": 1}
+
+
+def test_lru_elimina_i_meno_usati(cache):
+    cache.put("f", "a", None, bytes(_BLOB))
+    time.sleep(0.01)
+    cache.put("f", "b", None, bytes(_BLOB))
+    time.sleep(0.01)
+    # la lettura di "a" è solo in sospeso, ma il `put` successivo la scrive prima di sfoltire
+    assert cache.get("f", "a")[0]
+    time.sleep(0.01)
+    cache.put("f", "c", None, bytes(_BLOB))
+
+    assert _chiavi(cache) == {"a", "c"}
+    totale = cache._conn().execute("SELECT SUM(byte) FROM risultati").fetchone()[0]
+    assert totale <= cache.max_byte
+
+
+def test_risultato_oltre_il_limite_non_salvato(cache):
+    cache.put("f", "enorme", None, bytes(int(cache.max_byte) + 1))
+    assert _chiavi(cache) == set()
+
+
+def test_contatori_scritti_solo_al_flush(cache):
+    cache.put("f", "v1", None, 1)
+    for _ in range(3):
+        cache.get("f", "v1")
+    cache.get("f", "v2")
+
+    altro_processo = CacheRisultati(cache.path)
+    stat = altro_processo.statistiche().set_index("funzione")
+    assert (stat.loc["f", "hit"], stat.loc["f", "miss"]) == (0, 0)
+
+    cache.flush()
+    stat = altro_processo.statistiche().set_index("funzione")
+    assert (stat.loc["f", "hit"], stat.loc["f", "miss"]) == (3, 1)
+
+
+def test_flush_senza_attesa_con_file_occupato(cache):
+    cache.put("f", "v1", None, 1)
+    cache.get("f", "v1")
+
+    occupante = sqlite3.connect(cache.path, isolation_level=None)
+    occupante.execute("BEGIN IMMEDIATE")
+    try:
+        cache.flush(attendi=False)      # non aspetta e non solleva: gli aggiornamenti restano in sospeso
+        assert cache._contatori == {"f": [1, 0]}
+    finally:
+        occupante.execute("ROLLBACK")
+        occupante.close()
+
+    cache.flush(attendi=False)
+    assert cache._contatori == {}
+    assert cache.statistiche().set_index("funzione").loc["f", "hit"] == 1
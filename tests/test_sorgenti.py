@@ -0,0 +1,128 @@
+import os
+import threading
+
+import pytest
+
+from dmo import sorgenti
+from dmo.sorgenti import Sorgenti, PUNTATORE
+
+
+@pytest.fixture
+def cartella(tmp_path, monkeypatch):
+    monkeypatch.setattr(sorgenti, "QUIETE_S", 0)
+    cartella = tmp_path / "dati"
+    cartella.mkdir()
+    _scrivi(cartella, 0)
+    return cartella
+
+
+def _scrivi(cartella, generazione, nomi=("stl-dolomiti-2023.txt", "stl-dolomiti-2024.txt")):
+    for nome in nomi:
+        (cartella / nome).write_text(f"{nome};{generazione}\n", encoding="utf-8")
+
+
+def _contenuti(versione) -> dict:
+    contenuti = {}
+    for rel, path in versione.mappa().items():
+        with open(path, encoding="utf-8") as f:
+            contenuti[rel] = f.read()
+    return contenuti
+
+
+def test_versione_immutabile(cartella, tmp_path):
+    s = Sorgenti(str(cartella), "stl", base_dir=str(tmp_path / "sorgenti"))
+    prima = s.aggiorna()
+    assert _contenuti(prima) == {"stl-dolomiti-2023.txt": "stl-dolomiti-2023.txt;0\n",
+                                 "stl-dolomiti-2024.txt": "stl-dolomiti-2024.txt;0\n"}
+
+    _scrivi(cartella, 1, nomi=["stl-dolomiti-2024.txt"])
+    os.utime(cartella / "stl-dolomiti-2024.txt", ns=(1, 10**18))   # mtime certamente diverso
+    dopo = s.aggiorna()
+
+    assert dopo.versione != prima.versione
+    assert s.corrente().versione == dopo.versione
+    # la versione precedente resta leggibile e invariata; il file non cambiato è lo stesso oggetto
+    assert _contenuti(s.leggi(prima.versione))["stl-dolomiti-2024.txt"] == "stl-dolomiti-2024.txt;0\n"
+    assert _contenuti(dopo)["stl-dolomiti-2024.txt"] == "stl-dolomiti-2024.txt;1\n"
+    assert dopo.path("stl-dolomiti-2023.txt") == prima.path("stl-dolomiti-2023.txt")
+
+
+def test_file_solo_toccati_stessa_versione(cartella, tmp_path):
+    s = Sorgenti(str(cartella), "stl", base_dir=str(tmp_path / "sorgenti"))
+    prima = s.aggiorna()
+    os.utime(cartella / "stl-dolomiti-2023.txt", ns=(1, 10**18))
+    assert s.aggiorna().versione == prima.versione
+    # il manifest è stato aggiornato con il nuovo mtime: il controllo successivo non ricopia nulla
+    assert s.aggiorna().file["stl-dolomiti-2023.txt"]["mtime_ns"] == 10**18
+
+
+def test_file_in_scrittura_resta_quello_precedente(cartella, tmp_path, monkeypatch):
+    s = Sorgenti(str(cartella), "stl", base_dir=str(tmp_path / "sorgenti"))
+    prima = s.aggiorna()
+
+    _scrivi(cartella, 1)
+    (cartella / "stl-dolomiti-2025.txt").write_text("nuovo\n", encoding="utf-8")
+    copia = sorgenti._copia
+    # la copia rileva un file cambiato durante la lettura → None
+    monkeypatch.setattr(sorgenti, "_copia",
+                        lambda src, dest: None if src.endswith(("2024.txt", "2025.txt")) else copia(src, dest))
+    dopo = s.aggiorna()
+
+    assert dopo.file["stl-dolomiti-2024.txt"] == prima.file["stl-dolomiti-2024.txt"]
+    assert "stl-dolomiti-2025.txt" not in dopo.file
+    assert _contenuti(dopo)["stl-dolomiti-2023.txt"] == "stl-dolomiti-2023.txt;1\n"
+
+    monkeypatch.setattr(sorgenti, "_copia", copia)
+    ripresa = s.aggiorna()
+    assert _contenuti(ripresa) == {"stl-dolomiti-2023.txt": "stl-dolomiti-2023.txt;1\n",
+                                   "stl-dolomiti-2024.txt": "stl-dolomiti-2024.txt;1\n",
+                                   "stl-dolomiti-2025.txt": "nuovo\n"}
+
+
+def test_lettori_vedono_solo_versioni_complete(cartella, tmp_path):
+    """
+    Mentre un thread riscrive i file e pubblica nuove versioni, chi legge la versione corrente
+    trova sempre tutti i file della stessa generazione.
+    """
+    s = Sorgenti(str(cartella), "stl", base_dir=str(tmp_path / "sorgenti"))
+    s.aggiorna()
+    fine = threading.Event()
+    letture, errori = [], []
+
+    def lettore():
+        lettore_s = Sorgenti(str(cartella), "stl", base_dir=str(tmp_path / "sorgenti"))
+        while not fine.is_set():
+            try:
+                generazioni = {c.split(";")[1] for c in _contenuti(lettore_s.corrente()).values()}
+            except Exception as e:      # qualunque errore di lettura fa fallire il test
+                errori.append(e)
+                return
+            letture.append(generazioni)
+
+    thread = threading.Thread(target=lettore)
+    thread.start()
+    try:
+        for generazione in range(1, 30):
+            _scrivi(cartella, generazione)
+            for nome in os.listdir(cartella):
+                os.utime(cartella / nome, ns=(1, generazione * 10**9))
+            s.aggiorna()
+    finally:
+        fine.set()
+        thread.join()
+
+    assert not errori
+    assert letture and all(len(g) == 1 for g in letture)
+    with open(os.path.join(s.dir, PUNTATORE), encoding="utf-8") as f:
+        assert f.read().strip() == s.corrente().versione
+
+
+def test_pulisci_conserva_le_versioni_recenti(cartella, tmp_path):
+    s = Sorgenti(str(cartella), "stl", base_dir=str(tmp_path / "sorgenti"))
+    for generazione in range(sorgenti.CONSERVA + 4):
+        _scrivi(cartella, generazione)
+        for i, nome in enumerate(os.listdir(cartella)):
+            os.utime(cartella / nome, ns=(1, (generazione + 1) * 10**9 + i))
+        s.aggiorna()
+    assert len(os.listdir(s.versioni_dir)) <= sorgenti.CONSERVA + 1
+    assert os.path.exists(os.path.join(s.versioni_dir, f"{s.corrente().versione}.json"))